@@ -0,0 +1,353 @@
+"""
+SQLite store for rosters, availability and schedules
+
+Optional: keeps every period's roster and solved schedule in one SQLite
+file instead of loose CSVs and exports. Rosters are imported from the
+usual roster CSV format; availability is kept as one shift bitmask per
+person and day, and assignments as one row per shift worked, indexed by
+person, weekday and start time.
+
+    python schedule_store.py store.db import roster.csv --week 1
+    python schedule_store.py store.db periods
+    python schedule_store.py store.db worked "Jane Doe" --day Thursday --from 12:00
+    python schedule_store.py store.db owed
+
+The headless runner fills it with --store (see scheduler_headless.py); hours
+owed from earlier periods then come from the store.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from array import array
+from datetime import datetime
+
+from scheduling_engine import DAY_NAMES, DAYS, Person, ShiftTable, load_roster_csv, parse_qualifications
+
+# Weekday of each scheduled day: 'Thursday (Week 2)' -> 3
+WEEKDAYS = list(dict.fromkeys(name.split()[0] for name in DAY_NAMES))
+DAY_WEEKDAYS = [WEEKDAYS.index(name.split()[0]) for name in DAY_NAMES]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS people (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS periods (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL,
+    week INTEGER NOT NULL,
+    shift_codes TEXT NOT NULL,
+    solved_at TEXT,
+    UNIQUE (label, week)
+);
+CREATE TABLE IF NOT EXISTS roster (
+    period_id INTEGER NOT NULL REFERENCES periods (id) ON DELETE CASCADE,
+    person_id INTEGER NOT NULL REFERENCES people (id),
+    position INTEGER NOT NULL,
+    agreed_hours NUMERIC NOT NULL,
+    max_hours NUMERIC NOT NULL,
+    preferred_hours NUMERIC NOT NULL,
+    qualifications TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (period_id, person_id)
+);
+CREATE INDEX IF NOT EXISTS roster_person ON roster (person_id);
+CREATE TABLE IF NOT EXISTS availability (
+    period_id INTEGER NOT NULL REFERENCES periods (id) ON DELETE CASCADE,
+    person_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    mask INTEGER NOT NULL,
+    PRIMARY KEY (period_id, person_id, day)
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    period_id INTEGER NOT NULL REFERENCES periods (id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (period_id, name)
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    period_id INTEGER NOT NULL REFERENCES periods (id) ON DELETE CASCADE,
+    person_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    weekday INTEGER NOT NULL,
+    shift TEXT NOT NULL,
+    start_minute INTEGER NOT NULL,
+    end_minute INTEGER NOT NULL,
+    hours REAL NOT NULL,
+    PRIMARY KEY (period_id, person_id, day, shift)
+);
+CREATE INDEX IF NOT EXISTS assignments_person ON assignments (person_id, weekday, start_minute);
+"""
+
+
+class ScheduleStore:
+    """
+    Rosters and schedules of many periods in one SQLite file
+
+    A period is one 2-week schedule, identified by a label (e.g. the roster
+    name) and its first week. Importing a period again replaces it. Use one
+    store per process: the worker processes of a season each open their own.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def person_ids(self, names):
+        """{name: id}, adding anyone who isn't in the store yet"""
+        names = list(names)
+        with self.connection:
+            self.connection.executemany("INSERT OR IGNORE INTO people (name) VALUES (?)",
+                                        ((name,) for name in names))
+        ids = {}
+        for name, person_id in self.connection.execute("SELECT name, id FROM people"):
+            ids[name] = person_id
+        return {name: ids[name] for name in names}
+
+    def add_period(self, label, week, shift_table, people):
+        """Store a period's roster (replacing an earlier one with the same label and week); returns its id"""
+        ids = self.person_ids(person.name for person in people)
+        with self.connection:
+            self.connection.execute("DELETE FROM periods WHERE label = ? AND week = ?", (label, week))
+            period_id = self.connection.execute(
+                "INSERT INTO periods (label, week, shift_codes) VALUES (?, ?, ?)",
+                (label, week, json.dumps(shift_table.codes))).lastrowid
+            self.connection.executemany(
+                "INSERT INTO roster (period_id, person_id, position, agreed_hours, max_hours, preferred_hours, "
+                "qualifications) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                ((period_id, ids[person.name], position, person.agreed_hours, person.max_hours,
+                  person.preferred_hours, "; ".join(sorted(person.qualifications)))
+                 for position, person in enumerate(people)))
+            self.connection.executemany(
+                "INSERT INTO availability (period_id, person_id, day, mask) VALUES (?, ?, ?, ?)",
+                ((period_id, ids[person.name], day_idx, mask)
+                 for person in people for day_idx, mask in enumerate(person.availability) if mask))
+        return period_id
+
+    def import_roster_csv(self, file_path, label, week, shift_table):
+        """Bulk import a roster CSV as a period; returns its id"""
+        return self.add_period(label, week, shift_table, load_roster_csv(file_path, shift_table))
+
+    def period(self, period_id):
+        row = self.connection.execute("SELECT label, week, shift_codes, solved_at FROM periods WHERE id = ?",
+                                      (period_id,)).fetchone()
+        if row is None:
+            raise KeyError(f"No period {period_id} in the store")
+        return {'id': period_id, 'label': row[0], 'week': row[1], 'shift_codes': json.loads(row[2]),
+                'solved_at': row[3]}
+
+    def find_period(self, label, week):
+        """Id of the period with this label and week, or None"""
+        row = self.connection.execute("SELECT id FROM periods WHERE label = ? AND week = ?",
+                                      (label, week)).fetchone()
+        return row[0] if row else None
+
+    def periods(self):
+        """Every period with its roster size and scheduled hours, by week"""
+        rows = self.connection.execute("""
+            SELECT p.id, p.label, p.week, p.solved_at,
+                   (SELECT COUNT(*) FROM roster r WHERE r.period_id = p.id),
+                   (SELECT COALESCE(SUM(a.hours), 0) FROM assignments a WHERE a.period_id = p.id)
+            FROM periods p ORDER BY p.week, p.label""")
+        return [{'id': row[0], 'label': row[1], 'week': row[2], 'solved_at': row[3], 'people': row[4],
+                 'scheduled_hours': row[5]} for row in rows]
+
+    def roster_names(self, period_id):
+        return [row[0] for row in self.connection.execute(
+            "SELECT x.name FROM roster r JOIN people x ON x.id = r.person_id WHERE r.period_id = ? "
+            "ORDER BY r.position", (period_id,))]
+
+    def load_roster(self, period_id, shift_table):
+        """
+        A period's roster as Person objects, in the imported order
+
+        The availability masks are mapped onto shift_table's bits by shift
+        code. Raises ValueError if the period used shifts shift_table doesn't have.
+        """
+        period = self.period(period_id)
+        missing = [code for code in period['shift_codes'] if code not in shift_table.bits]
+        if missing:
+            raise ValueError(f"{period['label']} week {period['week']} uses shifts that aren't defined: "
+                             f"{', '.join(missing)}")
+        bits = [shift_table.bits[code] for code in period['shift_codes']]
+        same_bits = bits == [1 << idx for idx in range(len(bits))]
+
+        people = []
+        positions = {}
+        for person_id, name, agreed, max_hours, preferred, qualifications in self.connection.execute(
+                "SELECT r.person_id, x.name, r.agreed_hours, r.max_hours, r.preferred_hours, r.qualifications "
+                "FROM roster r JOIN people x ON x.id = r.person_id WHERE r.period_id = ? ORDER BY r.position",
+                (period_id,)):
+            positions[person_id] = len(people)
+            people.append(Person(name, agreed, max_hours, preferred, array('I', [0] * len(DAYS)), len(people),
+                                 parse_qualifications(qualifications)))
+        for person_id, day_idx, mask in self.connection.execute(
+                "SELECT person_id, day, mask FROM availability WHERE period_id = ?", (period_id,)):
+            if not same_bits:
+                mask = sum(bit for idx, bit in enumerate(bits) if mask & (1 << idx))
+            people[positions[person_id]].availability[day_idx] = mask
+        return people
+
+    def save_schedule(self, period_id, engine):
+        """Store a solved engine's assignments and parameters for a period (replacing earlier ones)"""
+        shift_table = engine.shift_table
+        ids = self.person_ids(person.name for person in engine.people)
+        day_count = len(engine.day_names)
+        rows = []
+        for person in engine.people:
+            base = person.id * day_count
+            for day_idx in range(day_count):
+                mask = engine.assigned_shifts[base + day_idx]
+                if not mask:
+                    continue
+                for shift_idx in shift_table.mask_indices(mask):
+                    code = shift_table.codes[shift_idx]
+                    start, end = shift_table.intervals[code]
+                    rows.append((period_id, ids[person.name], day_idx, DAY_WEEKDAYS[day_idx], code, start, end,
+                                 shift_table.definitions[code]['hours']))
+        parameters = dict(engine.parameters, desks_per_day=dict(engine.desks_per_day))
+
+        with self.connection:
+            self.connection.execute("DELETE FROM assignments WHERE period_id = ?", (period_id,))
+            self.connection.execute("DELETE FROM parameters WHERE period_id = ?", (period_id,))
+            self.connection.executemany(
+                "INSERT INTO assignments (period_id, person_id, day, weekday, shift, start_minute, end_minute, "
+                "hours) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.connection.executemany("INSERT INTO parameters (period_id, name, value) VALUES (?, ?, ?)",
+                                        ((period_id, name, json.dumps(value)) for name, value in parameters.items()))
+            self.connection.execute("UPDATE periods SET solved_at = ? WHERE id = ?",
+                                    (datetime.now().isoformat(timespec='seconds'), period_id))
+
+    def parameters(self, period_id):
+        """Solve parameters stored with a period's schedule"""
+        return {name: json.loads(value) for name, value in self.connection.execute(
+            "SELECT name, value FROM parameters WHERE period_id = ?", (period_id,))}
+
+    def worked(self, name, weekday=None, start_from=None, start_before=None):
+        """
+        Periods where someone worked, optionally only on one weekday and in
+        shifts starting in a time window
+
+        weekday: 'Thursday' or 0-3; start_from / start_before: 'H:MM'. So
+        worked('Jane Doe', 'Thursday', '12:00') is every period with a
+        Thursday afternoon shift. Returns [{'label', 'week', 'shifts': [(day name,
+        shift code)], 'hours'}] by week.
+        """
+        conditions = ["x.name = ?"]
+        values = [name]
+        if weekday is not None:
+            if isinstance(weekday, str):
+                matches = [idx for idx, day in enumerate(WEEKDAYS) if day.lower() == weekday.strip().lower()]
+                if not matches:
+                    raise ValueError(f"Unknown weekday '{weekday}' (use {', '.join(WEEKDAYS)})")
+                weekday = matches[0]
+            conditions.append("a.weekday = ?")
+            values.append(int(weekday))
+        if start_from is not None:
+            conditions.append("a.start_minute >= ?")
+            values.append(ShiftTable.parse_time(start_from))
+        if start_before is not None:
+            conditions.append("a.start_minute < ?")
+            values.append(ShiftTable.parse_time(start_before))
+
+        periods = {}
+        for period_id, label, week, day_idx, code, hours in self.connection.execute(
+                "SELECT p.id, p.label, p.week, a.day, a.shift, a.hours FROM assignments a "
+                "JOIN people x ON x.id = a.person_id JOIN periods p ON p.id = a.period_id "
+                f"WHERE {' AND '.join(conditions)} ORDER BY p.week, p.label, a.day, a.start_minute", values):
+            entry = periods.setdefault(period_id, {'label': label, 'week': week, 'shifts': [], 'hours': 0})
+            entry['shifts'].append((DAY_NAMES[day_idx], code))
+            entry['hours'] += hours
+        return list(periods.values())
+
+    def hours_owed(self, period_id=None, before_week=None):
+        """
+        Preferred minus scheduled hours per person, summed over solved periods
+
+        With a period_id: only the people on that period's roster, and only
+        the periods before its week (what carries over into it). With
+        before_week: only the periods before that week, for a roster that
+        isn't stored yet. Positive is owed, negative is ahead. {name: hours}
+        """
+        conditions = ["p.solved_at IS NOT NULL"]
+        values = []
+        if before_week is not None:
+            conditions.append("p.week < ?")
+            values.append(before_week)
+        if period_id is not None:
+            conditions.append("p.week < (SELECT week FROM periods WHERE id = ?)")
+            conditions.append("r.person_id IN (SELECT person_id FROM roster WHERE period_id = ?)")
+            values += [period_id, period_id]
+        rows = self.connection.execute(f"""
+            SELECT x.name, SUM(r.preferred_hours - COALESCE(s.hours, 0))
+            FROM roster r
+            JOIN periods p ON p.id = r.period_id
+            JOIN people x ON x.id = r.person_id
+            LEFT JOIN (SELECT period_id, person_id, SUM(hours) AS hours FROM assignments
+                       GROUP BY period_id, person_id) s
+                ON s.period_id = r.period_id AND s.person_id = r.person_id
+            WHERE {' AND '.join(conditions)}
+            GROUP BY x.name""", values)
+        return {name: hours for name, hours in rows}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="B2.0 roster and schedule store (SQLite)")
+    parser.add_argument('store', help="Store file (created if it doesn't exist)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser('import', help="Import a roster CSV as a period")
+    import_parser.add_argument('roster', help="Roster CSV file")
+    import_parser.add_argument('--week', type=int, required=True, help="First week of the period")
+    import_parser.add_argument('--label', help="Period label (default: the roster file name)")
+    import_parser.add_argument('--shifts', help="Shift definitions file (default: shifts.json)")
+    commands.add_parser('periods', help="List the stored periods")
+    worked_parser = commands.add_parser('worked', help="Periods where someone worked")
+    worked_parser.add_argument('name', help="Person's name as in the roster")
+    worked_parser.add_argument('--day', help="Only this weekday, e.g. Thursday")
+    worked_parser.add_argument('--from', dest='start_from', metavar='H:MM', help="Only shifts starting at or after")
+    worked_parser.add_argument('--until', dest='start_before', metavar='H:MM', help="Only shifts starting before")
+    commands.add_parser('owed', help="Hours owed (or ahead) per person over all solved periods")
+    args = parser.parse_args(argv)
+
+    try:
+        with ScheduleStore(args.store) as store:
+            if args.command == 'import':
+                shift_table = ShiftTable.load(args.shifts) if args.shifts else ShiftTable.load()
+                label = args.label or os.path.splitext(os.path.basename(args.roster))[0]
+                period_id = store.import_roster_csv(args.roster, label, args.week, shift_table)
+                print(f"{label} week {args.week}: {len(store.roster_names(period_id))} people imported")
+            elif args.command == 'periods':
+                for period in store.periods():
+                    state = f"{period['scheduled_hours']:.1f}h scheduled" if period['solved_at'] else "not solved"
+                    print(f"{period['label']} week {period['week']}: {period['people']} people, {state}")
+            elif args.command == 'worked':
+                periods = store.worked(args.name, args.day, args.start_from, args.start_before)
+                for period in periods:
+                    shifts = ", ".join(f"{day} {code}" for day, code in period['shifts'])
+                    print(f"{period['label']} week {period['week']}: {period['hours']:.1f}h ({shifts})")
+                print(f"{len(periods)} period(s)")
+            else:
+                owed = store.hours_owed()
+                for name, hours in sorted(owed.items(), key=lambda item: -item[1]):
+                    if hours:
+                        print(f"{name}: {hours:+.1f}h")
+    except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,19 @@
-import csv
+import time
+IMPORT_STARTED = time.perf_counter()  # For the startup report
+
+import argparse
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from datetime import datetime, timedelta
-from collections import defaultdict
-import copy
-import random
-from PIL import Image, ImageDraw, ImageFont
-import io
+import json
+import os
+
+from scheduling_engine import (
+    DAYS, DAY_NAMES, DEFAULT_SHIFT_CONFIG, SHIFT_CONFIG_FILE, UNMET_LIMITS,
+    DecisionTrace, Objective, ScheduleEngine, ShiftTable, SolverStats,
+    diff_schedules, format_violations, get_first_monday,
+    load_roster_csv, parse_desk_types, parse_min_staff, write_diff_csv
+)
 
 class ToolTip:
     """Create a tooltip for a given widget"""
@@ -39,7 +46,209 @@ class ToolTip:
             self.tooltip_window.destroy()
             self.tooltip_window = None
 
+class TimelineView:
+    """
+    The whole schedule on one zoomable canvas
+
+    Days are columns side by side (one lane per desk) and time runs down.
+    Block positions are computed once per schedule in unzoomed coordinates;
+    a redraw only creates canvas items for the days and blocks inside the
+    visible area, so the item count depends on the window size rather than
+    on the number of days or desks. Ctrl+wheel zooms around the cursor and
+    dragging pans.
+    """
+    LANE_WIDTH = 70
+    DAY_GAP = 20
+    HEADER_HEIGHT = 30
+    TIME_AXIS_WIDTH = 90
+    PIXELS_PER_HOUR = 60
+    MIN_ZOOM = 0.25
+    MAX_ZOOM = 4.0
+
+    def __init__(self, tool, parent, width=900, height=560):
+        self.tool = tool
+        self.colors = tool.colors
+        self.zoom = 1.0
+        self.redraw_pending = False
+
+        frame = tk.Frame(parent, bg=self.colors['bg_dark'])
+        frame.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(frame, width=width, height=height, bg=self.colors['bg_dark'],
+                                highlightthickness=1, highlightbackground=self.colors['border'])
+        x_scrollbar = ttk.Scrollbar(frame, orient="horizontal", command=self.canvas.xview)
+        y_scrollbar = ttk.Scrollbar(frame, orient="vertical", command=self.canvas.yview)
+        # Any change of the visible area (scrollbars, panning, zooming) triggers a redraw
+        self.canvas.configure(
+            xscrollcommand=lambda *args: (x_scrollbar.set(*args), self.request_redraw()),
+            yscrollcommand=lambda *args: (y_scrollbar.set(*args), self.request_redraw()))
+        self.canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        y_scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        x_scrollbar.grid(row=1, column=0, sticky=(tk.W, tk.E))
+
+        self.canvas.bind('<Configure>', lambda e: self.request_redraw())
+        self.canvas.bind('<ButtonPress-1>', lambda e: self.canvas.scan_mark(e.x, e.y))
+        self.canvas.bind('<B1-Motion>', lambda e: self.canvas.scan_dragto(e.x, e.y, gain=1))
+        self.canvas.bind('<Control-MouseWheel>', lambda e: self.zoom_at(e, 1.25 if e.delta > 0 else 0.8))
+        self.canvas.bind('<Control-Button-4>', lambda e: self.zoom_at(e, 1.25))
+        self.canvas.bind('<Control-Button-5>', lambda e: self.zoom_at(e, 0.8))
+
+        self.layout()
+        self.update_scrollregion()
+
+    def layout(self):
+        """Compute day columns and blocks in unzoomed coordinates"""
+        tool = self.tool
+        heights = tool.shift_table.row_heights(self.PIXELS_PER_HOUR)
+        self.shift_tops = {}
+        y = self.HEADER_HEIGHT
+        for code in tool.timeslot_codes:
+            self.shift_tops[code] = y
+            y += heights[code]
+        self.shift_heights = heights
+        self.height = y + 10
+
+        # Columns: {'day', 'desks', 'x1', 'x2', 'fill', 'blocks': [(x1, y1, x2, y2, color, name, times)]}
+        self.columns = []
+        x = self.TIME_AXIS_WIDTH
+        for day_idx, day in enumerate(tool.day_names):
+            desks = tool.desks_per_day[day]
+            width = max(desks, 1) * self.LANE_WIDTH
+            shift_fill = tool.engine.index.shift_fill[day_idx]
+            column = {'day': day, 'desks': desks, 'x1': x, 'x2': x + width, 'blocks': [],
+                      'fill': {code: shift_fill[idx] for idx, code in enumerate(tool.timeslot_codes)}}
+            for person_name, shifts, lane in tool.assign_lanes(day, desks):
+                color = tool.person_colors.get(person_name, self.colors['accent'])
+                display_name = tool.get_display_name(person_name)
+                for block in tool.shift_table.group_blocks(shifts):
+                    y1 = self.shift_tops[block[0]]
+                    y2 = self.shift_tops[block[-1]] + heights[block[-1]]
+                    x1 = x + lane * self.LANE_WIDTH
+                    times = (f"{tool.shift_definitions[block[0]]['start']}-"
+                             f"{tool.shift_definitions[block[-1]]['end']}")
+                    column['blocks'].append((x1 + 2, y1 + 2, x1 + self.LANE_WIDTH - 2, y2 - 2,
+                                             color, display_name, times))
+            self.columns.append(column)
+            x += width + self.DAY_GAP
+        self.width = x
+
+    def update_scrollregion(self):
+        self.canvas.configure(scrollregion=(0, 0, self.width * self.zoom, self.height * self.zoom))
+
+    def zoom_at(self, event, factor):
+        """Zoom keeping the point under the cursor in place"""
+        new_zoom = min(self.MAX_ZOOM, max(self.MIN_ZOOM, self.zoom * factor))
+        if new_zoom == self.zoom:
+            return "break"
+        world_x = self.canvas.canvasx(event.x) / self.zoom
+        world_y = self.canvas.canvasy(event.y) / self.zoom
+        self.zoom = new_zoom
+        self.update_scrollregion()
+        self.canvas.xview_moveto(max(0, world_x * new_zoom - event.x) / (self.width * new_zoom))
+        self.canvas.yview_moveto(max(0, world_y * new_zoom - event.y) / (self.height * new_zoom))
+        self.request_redraw()
+        return "break"  # Don't also scroll the main window
+
+    def request_redraw(self):
+        """Coalesce redraw requests into one per idle cycle"""
+        if not self.redraw_pending:
+            self.redraw_pending = True
+            self.canvas.after_idle(self.redraw)
+
+    def redraw(self):
+        self.redraw_pending = False
+        canvas = self.canvas
+        canvas.delete("all")
+        zoom = self.zoom
+
+        # Visible area in unzoomed coordinates
+        left = canvas.canvasx(0)
+        top = canvas.canvasy(0)
+        view_x1 = left / zoom
+        view_y1 = top / zoom
+        view_x2 = canvas.canvasx(canvas.winfo_width()) / zoom
+        view_y2 = canvas.canvasy(canvas.winfo_height()) / zoom
+
+        font_size = max(6, min(12, int(9 * zoom)))
+        name_font = ("Consolas", font_size, "bold")
+        small_font = ("Consolas", max(6, font_size - 1))
+
+        for column in self.columns:
+            if column['x2'] < view_x1 or column['x1'] > view_x2:
+                continue
+            x1, x2 = column['x1'] * zoom, column['x2'] * zoom
+
+            # Shift rows and understaffing warnings
+            for code in self.tool.timeslot_codes:
+                y1 = self.shift_tops[code] * zoom
+                y2 = (self.shift_tops[code] + self.shift_heights[code]) * zoom
+                canvas.create_rectangle(x1, y1, x2, y2, outline=self.colors['border'])
+                if column['fill'][code] < column['desks']:
+                    canvas.create_text(x2 - 4, y1 + 2, anchor=tk.NE, font=small_font,
+                                       text=f"⚠{column['fill'][code]}/{column['desks']}",
+                                       fill=self.colors['error'])
+
+            for bx1, by1, bx2, by2, color, name, times in column['blocks']:
+                if bx2 < view_x1 or bx1 > view_x2 or by2 < view_y1 or by1 > view_y2:
+                    continue
+                canvas.create_rectangle(bx1 * zoom, by1 * zoom, bx2 * zoom, by2 * zoom,
+                                        fill=color, outline=self.colors['border'], width=2)
+                # Only label blocks big enough to read
+                if (bx2 - bx1) * zoom >= 40 and (by2 - by1) * zoom >= 2.5 * font_size:
+                    center_x = (bx1 + bx2) / 2 * zoom
+                    canvas.create_text(center_x, by1 * zoom + font_size + 2, text=name,
+                                       font=name_font, fill=self.colors['bg_dark'],
+                                       width=(bx2 - bx1) * zoom - 4)
+                    if (by2 - by1) * zoom >= 4 * font_size:
+                        canvas.create_text(center_x, by1 * zoom + 2.5 * font_size + 4, text=times,
+                                           font=small_font, fill=self.colors['bg_dark'])
+
+            # Day header pinned to the top of the view
+            header_y2 = top + self.HEADER_HEIGHT * zoom
+            canvas.create_rectangle(x1, top, x2, header_y2, fill=self.colors['bg_medium'],
+                                    outline=self.colors['border'])
+            canvas.create_text((x1 + x2) / 2, (top + header_y2) / 2, text=column['day'],
+                               font=name_font, fill=self.colors['text_primary'], width=x2 - x1 - 4)
+
+        # Time axis pinned to the left of the view
+        canvas.create_rectangle(left, top, left + self.TIME_AXIS_WIDTH * zoom, view_y2 * zoom,
+                                fill=self.colors['bg_dark'], outline="")
+        for code in self.tool.timeslot_codes:
+            info = self.tool.shift_definitions[code]
+            canvas.create_text(left + 5, self.shift_tops[code] * zoom + 2, anchor=tk.NW,
+                               text=f"{info['start']}-{info['end']}", font=small_font,
+                               fill=self.colors['text_muted'])
+
 class SchedulingTool:
+    # Hours tracker columns: (column id, heading, width)
+    HOURS_COLUMNS = [
+        ('name', "Name", 170),
+        ('week1', "Week 1", 70),
+        ('week2', "Week 2", 70),
+        ('total', "Total", 70),
+        ('preferred', "Preferred", 80),
+        ('agreed', "Agreed", 70),
+        ('max', "Max", 60),
+        ('deficit', "Deficit", 70),
+        ('limit', "Limited by", 210)
+    ]
+    # Hours tracker filters on a row (name, week1, week2, total, preferred, agreed, max, deficit, limit)
+    HOURS_FILTERS = {
+        "All": lambda row: True,
+        "Below agreed": lambda row: row[3] < row[5],
+        "Below preferred": lambda row: row[3] < row[4],
+        "At preferred": lambda row: row[3] >= row[4]
+    }
+
+    # Shown on the drop target when a dragged shift can't go there (see ScheduleEngine.check_move)
+    MOVE_REASONS = {
+        'availability': "not available",
+        'overlap': "overlaps a shift",
+        'desk_capacity': "no desk free",
+        'desk_type': "no desk for them",
+        'max_hours': "over max hours",
+        'weekly_variance': "week too full"
+    }
+
     def __init__(self, root):
         self.root = root
         self.root.title("B2.0 Scheduling Tool")
@@ -75,30 +284,25 @@ class SchedulingTool:
         self.root.configure(bg=self.colors['bg_dark'])
 
         # Data structures
-        self.people = []  # List of person dictionaries
+        self.people = []  # List of Person records (see scheduling_engine.Person)
         self.schedule = {}  # {day: {person_name: {'start': slot_idx, 'end': slot_idx, 'hours': float}}}
-        self.hours_scheduled = {}  # {person_name: hours}
+        self.hours_scheduled = []  # Hours per person id
+        self.engine = None  # ScheduleEngine of the last generation
         self.person_colors = {}  # {person_name: color}
 
-        # Timeslots (fixed shift times)
-        # Shifts: 9:30-12:30 (3h), 10:30-12:30 (2h), 13:00-15:30 (2.5h), 13:00-17:00 (4h)
-        self.timeslots = [
-            "9:30", "10:30", "12:30", "13:00", "15:30", "17:00"
-        ]
-        self.timeslot_codes = ["0930", "1030", "1300", "1300F"]  # Start time of each shift
-        self.shift_definitions = {
-            "0930": {"start": "9:30", "end": "12:30", "hours": 3.0},
-            "1030": {"start": "10:30", "end": "12:30", "hours": 2.0},
-            "1300": {"start": "13:00", "end": "15:30", "hours": 2.5},
-            "1300F": {"start": "13:00", "end": "17:00", "hours": 4.0}
-        }
+        # Shifts are loaded from shifts.json (intervals compiled to bitmasks)
+        # Default: 9:30-12:30 (3h), 10:30-12:30 (2h), 13:00-15:30 (2.5h), 13:00-17:00 (4h)
+        self.shift_config_path = SHIFT_CONFIG_FILE
+        try:
+            shift_table = ShiftTable.load(self.shift_config_path)
+        except Exception as e:
+            print(f"Could not load shift config: {e}")
+            shift_table = ShiftTable(DEFAULT_SHIFT_CONFIG)
+        self.set_shift_table(shift_table)
 
         # 2 weeks = 8 days (Mon-Thu, Week 1 and Week 2)
-        self.days = ["M1", "TU1", "W1", "TH1", "M2", "TU2", "W2", "TH2"]
-        self.day_names = [
-            "Monday (Week 1)", "Tuesday (Week 1)", "Wednesday (Week 1)", "Thursday (Week 1)",
-            "Monday (Week 2)", "Tuesday (Week 2)", "Wednesday (Week 2)", "Thursday (Week 2)"
-        ]
+        self.days = DAYS
+        self.day_names = DAY_NAMES
 
         # Configuration variables
         self.csv_file_path = None
@@ -112,20 +316,58 @@ class SchedulingTool:
         self.desks_tu2 = tk.StringVar(value="8")
         self.desks_w2 = tk.StringVar(value="8")
         self.desks_th2 = tk.StringVar(value="8")
+        self.desk_types_text = tk.StringVar(value="")  # Typed desks per day, e.g. "intake:2, helpdesk:1"
+        self.min_staff_text = tk.StringVar(value="")  # Minimum people per shift, e.g. "1300F:2, TH1 1300F:3"
+        self.objective_text = tk.StringVar(value="")  # Objective weights that differ from the defaults
         self.rigidity = tk.IntVar(value=50)  # Slider 0-100 for shift preference rigidity
         self.weekly_variance = tk.DoubleVar(value=1.0)  # Slider 0-2 (0.5h increments) for weekly hour variance tolerance
         self.total_hours_target = tk.StringVar(value="270")  # 2 weeks = 135*2
+        self.collect_stats = tk.BooleanVar(value=False)  # Enable solver/render instrumentation
+        self.match_first_shifts = tk.BooleanVar(value=False)  # Phase 1 by bipartite matching instead of greedy
+
+        # Hours tracker state: rows, name search, deficit filter and sort (column, descending)
+        self.hours_rows = []
+        self.hours_search = tk.StringVar()
+        self.hours_filter = tk.StringVar(value="All")
+        self.hours_sort = ('deficit', True)
+
+        # Schedule view: 'days' (one block per day) or 'timeline' (one zoomable canvas)
+        self.schedule_view = tk.StringVar(value='days')
+
+        # Day grid editing: {day_idx: {'canvas', 'redraw', 'blocks'}} and the block being dragged
+        self.day_views = {}
+        self.block_drag = None
+
+        # Comparison with a saved schedule: the saved schedule, the diff and the
+        # overlay drawn from it ({day: {'new': {person_name: {codes}}, 'removed': [(person_name, codes)]}})
+        self.diff_base = None
+        self.schedule_diff = None
+        self.diff_overlay = {}
+
+        # Instrumentation (disabled unless collect_stats is checked)
+        self.stats = SolverStats()
 
         self.setup_styles()
         self.setup_ui()
 
+        # Undo/redo of manual edits
+        self.root.bind('<Control-z>', lambda event: self.step_history('undo'))
+        self.root.bind('<Control-y>', lambda event: self.step_history('redo'))
+        self.root.bind('<Control-Z>', lambda event: self.step_history('redo'))
+
+    def set_shift_table(self, shift_table):
+        """Use a compiled shift table for parsing, solving and drawing"""
+        self.shift_table = shift_table
+        self.timeslot_codes = shift_table.codes  # Shift codes in display order
+        self.shift_definitions = shift_table.definitions  # {code: {'start', 'end', 'hours'}}
+
     def get_display_name(self, full_name):
         """Get display name: first name only, or first name + last initial if duplicate"""
         parts = full_name.split()
         first_name = parts[0] if parts else full_name
 
         # Check if there are other people with the same first name
-        same_first_name = [p for p in self.people if p['name'].split()[0] == first_name]
+        same_first_name = [p for p in self.people if p.name.split()[0] == first_name]
 
         if len(same_first_name) > 1 and len(parts) > 1:
             # Add last initial
@@ -183,6 +425,23 @@ class SchedulingTool:
                  background=[('selected', self.colors['bg_light'])],
                  foreground=[('selected', self.colors['accent'])])
 
+        # Hours tracker table
+        style.configure('Hours.Treeview',
+                       background=self.colors['bg_dark'],
+                       fieldbackground=self.colors['bg_dark'],
+                       foreground=self.colors['text_primary'],
+                       bordercolor=self.colors['border'],
+                       rowheight=24,
+                       font=("Consolas", 10))
+        style.configure('Hours.Treeview.Heading',
+                       background=self.colors['bg_medium'],
+                       foreground=self.colors['text_secondary'],
+                       font=("Consolas", 10, "bold"))
+        style.map('Hours.Treeview',
+                 background=[('selected', self.colors['bg_light'])])
+        style.map('Hours.Treeview.Heading',
+                 background=[('active', self.colors['bg_light'])])
+
     def setup_ui(self):
         # Configure grid weights for root
         self.root.columnconfigure(0, weight=1)
@@ -229,12 +488,12 @@ class SchedulingTool:
         config_container.grid(row=0, column=0, sticky=tk.W, pady=(10, 10), padx=10)
 
         # Canvas for rounded border (increased size to fit all inputs including 2 weeks and variance slider)
-        canvas = tk.Canvas(config_container, width=700, height=480,
+        canvas = tk.Canvas(config_container, width=700, height=715,
                           bg=self.colors['bg_dark'], highlightthickness=0)
         canvas.pack()
 
         # Draw rounded rectangle border
-        self.draw_rounded_rect(canvas, 2, 2, 698, 478, 10,
+        self.draw_rounded_rect(canvas, 2, 2, 698, 713, 10,
                               fill=self.colors['bg_dark'],
                               outline=self.colors['border'], width=2)
 
@@ -263,6 +522,23 @@ class SchedulingTool:
                               cursor="hand2")
         browse_btn.grid(row=row_y, column=3, padx=5)
 
+        # Shift definitions file
+        row_y += 1
+        tk.Label(config_frame, text="Shift File:",
+                bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                font=("Consolas", 9)).grid(row=row_y, column=0, sticky=tk.W, padx=5, pady=3)
+        self.shift_file_label = tk.Label(config_frame,
+                                         text=f"{os.path.basename(self.shift_config_path)} ({len(self.timeslot_codes)} shifts)",
+                                         fg=self.colors['success'], bg=self.colors['bg_dark'],
+                                         font=("Consolas", 9))
+        self.shift_file_label.grid(row=row_y, column=1, columnspan=2, sticky=tk.W, padx=5)
+
+        shift_browse_btn = tk.Button(config_frame, text="Browse", command=self.load_shift_config,
+                                     bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                                     font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                                     cursor="hand2")
+        shift_browse_btn.grid(row=row_y, column=3, padx=5)
+
         # Week number and Total hours target in same row
         row_y += 1
         tk.Label(config_frame, text="Week Number:",
@@ -391,8 +667,54 @@ class SchedulingTool:
                     insertbackground=self.colors['text_primary'],
                     font=("Consolas", 9), relief=tk.FLAT).grid(row=grid_row, column=grid_col+1, sticky=tk.W, padx=5)
 
-        # Generate and Export buttons
+        # Typed desks (part of each day's desks)
         row_y += 2
+        tk.Label(config_frame, text="Typed desks:",
+                bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                font=("Consolas", 9)).grid(row=row_y, column=0, sticky=tk.W, padx=5, pady=3)
+        desk_types_entry = tk.Entry(config_frame, textvariable=self.desk_types_text, width=28,
+                                    bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                                    insertbackground=self.colors['text_primary'],
+                                    font=("Consolas", 9), relief=tk.FLAT)
+        desk_types_entry.grid(row=row_y, column=1, columnspan=3, sticky=tk.W, padx=5)
+        ToolTip(desk_types_entry, "Desks per day that need a qualified person, e.g. intake:2, helpdesk:1\n"
+                                  "They count towards the desks above; the rest are open to everyone.\n"
+                                  "Qualifications come from the roster's 'qualifications' column")
+
+        # Minimum staffing per shift
+        row_y += 1
+        tk.Label(config_frame, text="Min staffing:",
+                bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                font=("Consolas", 9)).grid(row=row_y, column=0, sticky=tk.W, padx=5, pady=3)
+        min_staff_entry = tk.Entry(config_frame, textvariable=self.min_staff_text, width=28,
+                                   bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                                   insertbackground=self.colors['text_primary'],
+                                   font=("Consolas", 9), relief=tk.FLAT)
+        min_staff_entry.grid(row=row_y, column=1, columnspan=3, sticky=tk.W, padx=5)
+        ToolTip(min_staff_entry, "Minimum people per shift, e.g. 1300F:2 (every day)\n"
+                                 "or TH1 1300F:3 (one day, using the roster's day codes).\n"
+                                 "These shifts are filled first, most understaffed first")
+
+        # Objective weights (how the solver scores a possible shift)
+        row_y += 1
+        tk.Label(config_frame, text="Objective:",
+                bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                font=("Consolas", 9)).grid(row=row_y, column=0, sticky=tk.W, padx=5, pady=3)
+        objective_entry = tk.Entry(config_frame, textvariable=self.objective_text, width=28,
+                                   bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                                   insertbackground=self.colors['text_primary'],
+                                   font=("Consolas", 9), relief=tk.FLAT)
+        objective_entry.grid(row=row_y, column=1, columnspan=3, sticky=tk.W, padx=5)
+        ToolTip(objective_entry, "Weights of the shift score, e.g. consecutive_days:2, weekly_evenness:1\n"
+                                 "fill_balance (5): spread people over the shifts\n"
+                                 "shift_length (2): prefer longer shifts\n"
+                                 "preference_closeness (0): end close to preferred hours\n"
+                                 "weekly_evenness (0): same hours in both weeks\n"
+                                 "consecutive_days (0): avoid working days in a row\n"
+                                 "Empty: the defaults in brackets")
+
+        # Generate and Export buttons
+        row_y += 1
         gen_btn = tk.Button(config_frame, text="Generate Schedule", command=self.generate_schedule,
                            bg=self.colors['accent'], fg=self.colors['text_primary'],
                            font=("Consolas", 10, "bold"), relief=tk.FLAT,
@@ -413,6 +735,60 @@ class SchedulingTool:
                                    padx=12, pady=5, cursor="hand2")
         export_csv_btn.grid(row=row_y, column=2, columnspan=2, pady=5, sticky=tk.W, padx=(15, 0))
 
+        row_y += 1
+        export_ics_btn = tk.Button(config_frame, text="Export Calendars (.ics)", command=self.export_ics,
+                                   bg=self.colors['success'], fg=self.colors['text_primary'],
+                                   font=("Consolas", 9, "bold"), relief=tk.FLAT,
+                                   padx=12, pady=5, cursor="hand2")
+        export_ics_btn.grid(row=row_y, column=0, columnspan=2, pady=5, sticky=tk.W)
+
+        match_check = tk.Checkbutton(config_frame, text="Match first shifts",
+                                     variable=self.match_first_shifts,
+                                     bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                                     selectcolor=self.colors['bg_light'],
+                                     activebackground=self.colors['bg_dark'],
+                                     activeforeground=self.colors['text_primary'],
+                                     font=("Consolas", 9), highlightthickness=0)
+        match_check.grid(row=row_y, column=2, columnspan=2, pady=5, sticky=tk.W, padx=(15, 0))
+        ToolTip(match_check, "Hand out everyone's first shift with a maximum matching\n"
+                             "instead of in CSV order, so as many people as possible\nget at least one shift")
+        ToolTip(export_ics_btn, "One calendar file per person with their shifts,\nfor importing into Outlook/Google Calendar")
+
+        # Save/load a schedule (JSON) to keep working on it later
+        row_y += 1
+        save_btn = tk.Button(config_frame, text="Save Schedule", command=self.save_schedule,
+                             bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                             font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                             cursor="hand2")
+        save_btn.grid(row=row_y, column=0, columnspan=2, pady=5, sticky=tk.W)
+
+        open_btn = tk.Button(config_frame, text="Load Schedule", command=self.load_schedule,
+                             bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                             font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                             cursor="hand2")
+        open_btn.grid(row=row_y, column=2, columnspan=2, pady=5, sticky=tk.W, padx=(15, 0))
+        ToolTip(open_btn, "Open a saved schedule for the loaded roster.\nIt is checked against availability, desks\nand hour limits when it's loaded")
+
+        # Instrumentation toggle and stats panel
+        row_y += 1
+        stats_check = tk.Checkbutton(config_frame, text="Collect stats and trace",
+                                     variable=self.collect_stats,
+                                     bg=self.colors['bg_dark'], fg=self.colors['text_primary'],
+                                     selectcolor=self.colors['bg_light'],
+                                     activebackground=self.colors['bg_dark'],
+                                     activeforeground=self.colors['text_primary'],
+                                     font=("Consolas", 9), highlightthickness=0)
+        stats_check.grid(row=row_y, column=0, columnspan=2, pady=5, sticky=tk.W)
+
+        stats_btn = tk.Button(config_frame, text="Show Stats", command=self.show_stats_panel,
+                              bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                              font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                              cursor="hand2")
+        stats_btn.grid(row=row_y, column=2, columnspan=2, pady=5, sticky=tk.W, padx=(15, 0))
+
+        ToolTip(stats_check, "Record time per solver phase, candidate counts\nand render/export times for the next generation,\n"
+                             "and the solver's decisions per person\n(double-click someone in the hours table)")
+
         # Hover effects for buttons
         def on_enter(e, btn, color):
             btn['bg'] = color
@@ -421,12 +797,22 @@ class SchedulingTool:
 
         browse_btn.bind("<Enter>", lambda e: on_enter(e, browse_btn, self.colors['bg_medium']))
         browse_btn.bind("<Leave>", lambda e: on_leave(e, browse_btn, self.colors['bg_light']))
+        shift_browse_btn.bind("<Enter>", lambda e: on_enter(e, shift_browse_btn, self.colors['bg_medium']))
+        shift_browse_btn.bind("<Leave>", lambda e: on_leave(e, shift_browse_btn, self.colors['bg_light']))
         gen_btn.bind("<Enter>", lambda e: on_enter(e, gen_btn, self.colors['accent_hover']))
         gen_btn.bind("<Leave>", lambda e: on_leave(e, gen_btn, self.colors['accent']))
         export_png_btn.bind("<Enter>", lambda e: on_enter(e, export_png_btn, '#6ec57e'))
         export_png_btn.bind("<Leave>", lambda e: on_leave(e, export_png_btn, self.colors['success']))
         export_csv_btn.bind("<Enter>", lambda e: on_enter(e, export_csv_btn, '#6ec57e'))
         export_csv_btn.bind("<Leave>", lambda e: on_leave(e, export_csv_btn, self.colors['success']))
+        export_ics_btn.bind("<Enter>", lambda e: on_enter(e, export_ics_btn, '#6ec57e'))
+        export_ics_btn.bind("<Leave>", lambda e: on_leave(e, export_ics_btn, self.colors['success']))
+        save_btn.bind("<Enter>", lambda e: on_enter(e, save_btn, self.colors['bg_medium']))
+        save_btn.bind("<Leave>", lambda e: on_leave(e, save_btn, self.colors['bg_light']))
+        open_btn.bind("<Enter>", lambda e: on_enter(e, open_btn, self.colors['bg_medium']))
+        open_btn.bind("<Leave>", lambda e: on_leave(e, open_btn, self.colors['bg_light']))
+        stats_btn.bind("<Enter>", lambda e: on_enter(e, stats_btn, self.colors['bg_medium']))
+        stats_btn.bind("<Leave>", lambda e: on_leave(e, stats_btn, self.colors['bg_light']))
 
 
     def setup_display_section(self, parent):
@@ -450,30 +836,29 @@ class SchedulingTool:
         # Placeholder will be replaced when schedule is generated
         self.schedule_content_window = None
 
-        # Hours section (right side)
-        hours_container = tk.Frame(display_container, bg=self.colors['bg_dark'])
-        hours_container.grid(row=0, column=1, sticky=(tk.W, tk.N))
+        # Hours section (right side), built with the first schedule (see setup_hours_panel)
+        self.hours_container = tk.Frame(display_container, bg=self.colors['bg_dark'])
+        self.hours_container.grid(row=0, column=1, sticky=(tk.W, tk.N))
+        self.hours_frame = None
+
+        # Show placeholder initially
+        self.show_placeholder(self.schedule_frame, "Load CSV and Generate Schedule")
 
+        # Initial sizing
+        self.update_schedule_canvas_size()
+
+    def setup_hours_panel(self):
+        """Create the hours panel the first time there is something to show"""
         # Create canvas border for hours (will resize based on content)
-        self.hours_canvas_border = tk.Canvas(hours_container,
+        self.hours_canvas_border = tk.Canvas(self.hours_container,
                                             bg=self.colors['bg_dark'],
                                             highlightthickness=0)
         self.hours_canvas_border.pack()
 
         # Create frame for hours content directly (no scrolling)
         self.hours_frame = tk.Frame(self.hours_canvas_border, bg=self.colors['bg_dark'])
-
-        # Placeholder will be replaced when schedule is generated
         self.hours_content_window = None
 
-        # Show placeholder initially
-        self.show_placeholder(self.schedule_frame, "Load CSV and Generate Schedule")
-        self.show_placeholder(self.hours_frame, "Hours Tracker")
-
-        # Initial sizing
-        self.update_schedule_canvas_size()
-        self.update_hours_canvas_size()
-
     def update_schedule_canvas_size(self):
         """Update schedule canvas size based on content"""
         self.schedule_frame.update_idletasks()
@@ -544,19 +929,72 @@ class SchedulingTool:
                               pady=50)
         placeholder.pack(expand=True)
 
+    def show_stats_panel(self):
+        """Show collected solver/render statistics in a small window"""
+        if not self.stats.enabled:
+            messagebox.showinfo("Stats", "Enable 'Collect stats and trace' and generate a schedule first")
+            return
+
+        panel = tk.Toplevel(self.root)
+        panel.title("Solver Stats")
+        panel.configure(bg=self.colors['bg_dark'])
+
+        container = tk.Frame(panel, bg=self.colors['bg_dark'])
+        container.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+
+        data = self.stats.to_dict()
+        sections = [
+            ("Timings", [(name, f"{entry['seconds'] * 1000:.1f} ms ({entry['calls']}x)")
+                         for name, entry in sorted(data['timings'].items())]),
+            ("Counters", [(name, str(count)) for name, count in sorted(data['counters'].items())]),
+            ("Rejected candidates", [(name, str(count)) for name, count in sorted(data['rejections'].items())])
+        ]
+
+        current_row = 0
+        for title, rows in sections:
+            tk.Label(container, text=title,
+                    font=("Consolas", 11, "bold"),
+                    fg=self.colors['accent'],
+                    bg=self.colors['bg_dark']).grid(row=current_row, column=0, columnspan=2,
+                                                    sticky=tk.W, pady=(5, 5))
+            current_row += 1
+            if not rows:
+                rows = [("(none)", "")]
+            for name, value in rows:
+                tk.Label(container, text=name, font=("Consolas", 9),
+                        fg=self.colors['text_primary'],
+                        bg=self.colors['bg_dark']).grid(row=current_row, column=0, sticky=tk.W, padx=(10, 15))
+                tk.Label(container, text=value, font=("Consolas", 9),
+                        fg=self.colors['text_secondary'],
+                        bg=self.colors['bg_dark']).grid(row=current_row, column=1, sticky=tk.E)
+                current_row += 1
+
+        tk.Button(container, text="Save JSON", command=self.save_stats_json,
+                 bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                 font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                 cursor="hand2").grid(row=current_row, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+
+    def save_stats_json(self):
+        """Dump collected statistics to a JSON file"""
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".json",
+            filetypes=[("JSON files", "*.json")],
+            initialfile="B2.0 solver stats.json"
+        )
+
+        if not file_path:
+            return
+
+        try:
+            self.stats.dump_json(file_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save stats: {str(e)}")
+
     def get_week_display_text(self):
         """Get formatted week display text for 2 weeks"""
         try:
             week_num = int(self.week_number.get())
-            year = datetime.now().year
-
-            # Get the first day of the year
-            jan_1 = datetime(year, 1, 1)
-            # Find the first Monday
-            days_to_monday = (7 - jan_1.weekday()) % 7
-            if days_to_monday == 0 and jan_1.weekday() != 0:
-                days_to_monday = 7
-            first_monday = jan_1 + timedelta(days=days_to_monday)
+            first_monday = get_first_monday(datetime.now().year)
 
             # Calculate the start of the requested week and the next week
             week1_start = first_monday + timedelta(weeks=week_num - 1)
@@ -576,14 +1014,6 @@ class SchedulingTool:
             # Get week info for filename and dates
             week_num = int(self.week_number.get())
             filename = f"B2.0 Schedule week {week_num}.csv"
-            year = datetime.now().year
-
-            # Calculate dates for each day
-            jan_1 = datetime(year, 1, 1)
-            days_to_monday = (7 - jan_1.weekday()) % 7
-            if days_to_monday == 0 and jan_1.weekday() != 0:
-                days_to_monday = 7
-            first_monday = jan_1 + timedelta(days=days_to_monday)
 
             # Ask user where to save
             file_path = filedialog.asksaveasfilename(
@@ -595,73 +1025,119 @@ class SchedulingTool:
             if not file_path:
                 return
 
+            started = self.stats.start()
+
             # Create CSV with new format
             with open(file_path, 'w', newline='') as f:
-                writer = csv.writer(f)
-
-                # Write header
-                writer.writerow(['Date', 'Person', 'Shift Hours', 'Hours'])
-
-                # Process each day
-                for day_idx, day in enumerate(self.day_names):
-                    if day in self.schedule and self.schedule[day]:
-                        # Calculate the actual date for this day
-                        # Week 1 days: 0-3, Week 2 days: 4-7
-                        week_offset = (week_num - 1) * 7
-                        if day_idx < 4:
-                            # Week 1 (Mon-Thu)
-                            day_offset = day_idx
-                        else:
-                            # Week 2 (Mon-Thu of next week)
-                            day_offset = day_idx + 3  # Skip Fri, Sat, Sun
-
-                        current_date = first_monday + timedelta(weeks=(week_num - 1), days=day_offset)
-                        date_str = current_date.strftime('%A %d %b').lower()
-
-                        # Get all people scheduled this day, sorted by name
-                        people_this_day = sorted(self.schedule[day].items())
-
-                        # Write first person with date
-                        if people_this_day:
-                            first_person = True
-                            for person_name, person_data in people_this_day:
-                                shifts = person_data['shifts']
-                                hours = person_data['hours']
-
-                                # Format shift times
-                                morning_shifts = [s for s in shifts if s in ['0930', '1030']]
-                                afternoon_shifts = [s for s in shifts if s in ['1300', '1300F']]
-
-                                shift_parts = []
-                                if morning_shifts:
-                                    start = self.shift_definitions[morning_shifts[0]]['start']
-                                    end = self.shift_definitions[morning_shifts[-1]]['end']
-                                    shift_parts.append(f"{start}-{end}")
-
-                                if afternoon_shifts:
-                                    start = self.shift_definitions[afternoon_shifts[0]]['start']
-                                    end = self.shift_definitions[afternoon_shifts[-1]]['end']
-                                    shift_parts.append(f"{start}-{end}")
-
-                                shifts_str = ', '.join(shift_parts)
-
-                                # Format hours as hours:minutes
-                                hours_int = int(hours)
-                                minutes = int((hours - hours_int) * 60)
-                                hours_str = f"{hours_int}:{minutes:02d}"
-
-                                # Write row (date only for first person)
-                                if first_person:
-                                    writer.writerow([date_str, person_name, shifts_str, hours_str])
-                                    first_person = False
-                                else:
-                                    writer.writerow(['', person_name, shifts_str, hours_str])
+                self.engine.write_csv(f, week_num)
+
+            self.stats.stop('export_csv', started)
 
             messagebox.showinfo("Success", f"Schedule exported to:\n{file_path}")
 
         except Exception as e:
             messagebox.showerror("Error", f"Failed to export CSV: {str(e)}")
 
+    def export_ics(self):
+        """Export one .ics calendar per person into a chosen folder"""
+        if not self.schedule_generated:
+            messagebox.showwarning("Warning", "Please generate a schedule first")
+            return
+
+        try:
+            week_num = int(self.week_number.get())
+
+            directory = filedialog.askdirectory(title="Choose a folder for the calendar files")
+            if not directory:
+                return
+            output_dir = os.path.join(directory, f"B2.0 Schedule week {week_num} calendars")
+
+            started = self.stats.start()
+            paths = self.engine.write_ics_files(output_dir, week_num)
+            self.stats.stop('export_ics', started)
+
+            messagebox.showinfo("Success", f"Exported {len(paths)} calendars to:\n{output_dir}")
+
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to export calendars: {str(e)}")
+
+    def save_schedule(self):
+        """Save the schedule with its desks and parameters as JSON"""
+        if not self.schedule_generated:
+            messagebox.showwarning("Warning", "Please generate a schedule first")
+            return
+
+        try:
+            week_num = int(self.week_number.get())
+            file_path = filedialog.asksaveasfilename(
+                defaultextension=".json",
+                filetypes=[("JSON files", "*.json")],
+                initialfile=f"B2.0 Schedule week {week_num}.json"
+            )
+            if not file_path:
+                return
+
+            with open(file_path, 'w') as f:
+                json.dump(self.engine.to_dict(), f, indent=2)
+
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save schedule: {str(e)}")
+
+    def load_schedule(self):
+        """Load a saved (or hand-edited) schedule for the current roster and check it"""
+        if not self.people:
+            messagebox.showerror("Error", "Please load the roster CSV for this schedule first")
+            return
+
+        file_path = filedialog.askopenfilename(
+            title="Select Schedule File",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        try:
+            with open(file_path) as f:
+                data = json.load(f)
+            engine = ScheduleEngine(self.people, self.shift_table, self.stats)
+            violations = engine.load_schedule(data)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load schedule: {str(e)}")
+            return
+
+        # Show the saved setup in the config fields
+        desk_vars = [self.desks_m1, self.desks_tu1, self.desks_w1, self.desks_th1,
+                     self.desks_m2, self.desks_tu2, self.desks_w2, self.desks_th2]
+        for day, var in zip(self.day_names, desk_vars):
+            var.set(str(engine.desks_per_day[day]))
+        parameters = engine.parameters
+        if 'rigidity' in parameters:
+            self.rigidity.set(parameters['rigidity'])
+        if 'weekly_variance' in parameters:
+            self.weekly_variance.set(parameters['weekly_variance'])
+        if 'total_hours_target' in parameters:
+            self.total_hours_target.set(str(parameters['total_hours_target']))
+        self.desk_types_text.set(", ".join(f"{name}:{count}" for name, count in engine.desk_types.items()))
+        self.min_staff_text.set(", ".join(f"{key}:{count}" for key, count in engine.min_staff.items()))
+        self.objective_text.set(", ".join(f"{term}:{weight:g}"
+                                          for term, weight in engine.objective.changed_weights().items()))
+
+        self.desks_per_day = dict(engine.desks_per_day)
+        self.engine = engine
+        self.schedule = engine.schedule
+        self.hours_scheduled = engine.hours_scheduled
+        self.schedule_generated = True
+        self.generate_person_colors()
+        self.update_schedule_diff()
+        self.display_schedule()
+        self.display_hours()
+
+        if violations:
+            messagebox.showwarning(
+                "Schedule Problems",
+                f"{len(violations)} problem(s) in {os.path.basename(file_path)}:\n\n"
+                f"{format_violations(violations, limit=20)}")
+
     def export_schedule(self):
         """Export the schedule and hours tracker as PNG"""
         if not self.schedule_generated:
@@ -693,7 +1169,9 @@ class SchedulingTool:
                 return
 
             # Create image programmatically
+            started = self.stats.start()
             self.create_export_image(file_path, week_text)
+            self.stats.stop('export_png', started)
 
             messagebox.showinfo("Success", f"Schedule exported to:\n{file_path}")
 
@@ -707,6 +1185,9 @@ class SchedulingTool:
         img_height = 1400
 
         # Create image with dark background
+        # PIL is only needed for this export, so it's imported on first use
+        from PIL import Image, ImageDraw, ImageFont
+
         img = Image.new('RGB', (img_width, img_height), color='#2a2a2a')
         draw = ImageDraw.Draw(img)
 
@@ -741,8 +1222,12 @@ class SchedulingTool:
         day_width = 350
         day_height = 300
 
-        # Shift heights for drawing (proportional to hours)
-        shift_heights = {"0930": 90, "1030": 60, "1300": 75, "1300F": 120}
+        # Shift heights for drawing (proportional to hours, scaled to fit the day box)
+        shift_heights = self.shift_table.row_heights()
+        available_height = day_height - 50
+        if sum(shift_heights.values()) > available_height:
+            scale = available_height / sum(shift_heights.values())
+            shift_heights = {code: int(height * scale) for code, height in shift_heights.items()}
 
         # Draw 2x4 grid of days (2 columns, 4 rows for 8 days)
         for day_idx, day in enumerate(self.day_names):
@@ -767,12 +1252,9 @@ class SchedulingTool:
             time_x = x + 10
             content_start_y = y + 40
 
-            # Count shift capacity
-            shift_counts = {code: 0 for code in self.timeslot_codes}
-            if day in self.schedule:
-                for person_name, person_data in self.schedule[day].items():
-                    for shift_code in person_data['shifts']:
-                        shift_counts[shift_code] += 1
+            # Shift fill comes from the engine's running totals
+            shift_fill = self.engine.index.shift_fill[day_idx]
+            shift_counts = {code: shift_fill[idx] for idx, code in enumerate(self.timeslot_codes)}
 
             # Draw shift times and warnings
             y_offset = content_start_y
@@ -796,35 +1278,7 @@ class SchedulingTool:
                 available_width = day_width - (blocks_start_x - x) - 10
                 block_width = available_width // desks if desks > 0 else available_width
 
-                # Track lane assignments
-                shift_lanes = {code: [] for code in self.timeslot_codes}
-
-                people_shifts = list(self.schedule[day].items())
-                people_shifts.sort(key=lambda x: x[1]['shifts'])
-
-                for person_name, person_data in people_shifts:
-                    shifts = person_data['shifts']
-
-                    # Find a lane that's free for all required shifts
-                    assigned_lane = None
-                    for lane_idx in range(desks):
-                        lane_is_free = all(
-                            lane_idx >= len(shift_lanes[shift_code]) or
-                            shift_lanes[shift_code][lane_idx] is None
-                            for shift_code in shifts
-                        )
-
-                        if lane_is_free:
-                            assigned_lane = lane_idx
-                            for shift_code in shifts:
-                                while len(shift_lanes[shift_code]) <= lane_idx:
-                                    shift_lanes[shift_code].append(None)
-                                shift_lanes[shift_code][lane_idx] = person_name
-                            break
-
-                    if assigned_lane is None:
-                        assigned_lane = 0
-
+                for person_name, shifts, assigned_lane in self.assign_lanes(day, desks):
                     # Draw blocks for each shift
                     y_offset = content_start_y
                     for shift_code in self.timeslot_codes:
@@ -893,14 +1347,14 @@ class SchedulingTool:
                  fill=border, width=2)
 
         # Draw people data
-        sorted_people = sorted(self.people, key=lambda p: p['name'])
+        sorted_people = sorted(self.people, key=lambda p: p.name)
         row_height = 25
         data_y = header_y + 35
 
         for idx, person in enumerate(sorted_people):
             y = data_y + (idx * row_height)
-            name = person['name']
-            scheduled = self.hours_scheduled[name]
+            name = person.name
+            scheduled = self.hours_scheduled[person.id]
 
             # Draw person color indicator
             person_color = self.person_colors.get(name, accent)
@@ -930,31 +1384,29 @@ class SchedulingTool:
                 messagebox.showerror("Error", f"Failed to load CSV: {str(e)}")
                 self.file_label.config(text="Error loading file", fg=self.colors['error'])
 
-    def parse_csv(self):
-        self.people = []
-
-        with open(self.csv_file_path, 'r') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                person = {
-                    'name': row['name'],
-                    # Hours are now for 2 weeks instead of 1 week
-                    'agreed_hours': int(row['agreed hours per 2 weeks']),
-                    'max_hours': int(row['max hours per 2 weeks']),
-                    'preferred_hours': int(row['preferred hours per 2 weeks']),
-                    'availability': {}
-                }
+    def load_shift_config(self):
+        file_path = filedialog.askopenfilename(
+            title="Select Shift File",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
 
-                # Parse availability columns for each day and shift
-                for day_code in self.days:
-                    person['availability'][day_code] = {}
-                    for slot_code in self.timeslot_codes:
-                        col_name = f"{day_code}{slot_code}"
-                        if col_name in row:
-                            # Store availability by shift code
-                            person['availability'][day_code][slot_code] = row[col_name].lower() in ['true', '1', 'yes']
+        if file_path:
+            try:
+                self.set_shift_table(ShiftTable.load(file_path))
+                self.shift_config_path = file_path
+                self.shift_file_label.config(
+                    text=f"{os.path.basename(file_path)} ({len(self.timeslot_codes)} shifts)",
+                    fg=self.colors['success'])
+
+                # Availability columns depend on the shift codes
+                if self.csv_file_path:
+                    self.parse_csv()
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to load shift file: {str(e)}")
+                self.shift_file_label.config(text="Error loading file", fg=self.colors['error'])
 
-                self.people.append(person)
+    def parse_csv(self):
+        self.people = load_roster_csv(self.csv_file_path, self.shift_table)
 
         messagebox.showinfo("Success", f"Loaded {len(self.people)} people from CSV")
 
@@ -967,10 +1419,11 @@ class SchedulingTool:
             '#7a8fa3', '#8b9eb8', '#a37d9e', '#b88ba3'
         ]
 
+        import random
         random.shuffle(palette)
 
         for i, person in enumerate(self.people):
-            self.person_colors[person['name']] = palette[i % len(palette)]
+            self.person_colors[person.name] = palette[i % len(palette)]
 
     def generate_schedule(self):
         if not self.people:
@@ -995,388 +1448,75 @@ class SchedulingTool:
         except ValueError:
             messagebox.showerror("Error", "Please enter valid numbers for all configuration fields")
             return
+        try:
+            desk_types = parse_desk_types(self.desk_types_text.get())
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid typed desks: {e}")
+            return
+        try:
+            min_staff = parse_min_staff(self.min_staff_text.get(), self.shift_table)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid minimum staffing: {e}")
+            return
+        try:
+            objective = Objective.parse(self.objective_text.get()).changed_weights()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid objective: {e}")
+            return
 
-        # Generate colors for people
-        self.generate_person_colors()
-
-        # Initialize schedule and hours
-        # Schedule: {day: {person_name: {'shifts': [shift_codes], 'hours': float}} }
-        self.schedule = {day: {} for day in self.day_names}
-        self.hours_scheduled = {person['name']: 0 for person in self.people}
+        # Reset instrumentation for this generation
+        self.stats.enabled = bool(self.collect_stats.get())
+        self.stats.reset()
+        engine = ScheduleEngine(self.people, self.shift_table, self.stats,
+                                DecisionTrace(enabled=self.stats.enabled))
+
+        # Pre-solve feasibility check: stop early if the target can't be reached
+        started = self.stats.start()
+        report = engine.analyze_feasibility(self.desks_per_day, weekly_variance, total_hours_target)
+        self.stats.stop('feasibility_check', started)
+        if not report['feasible']:
+            proceed = messagebox.askyesno(
+                "Target Not Reachable",
+                f"The total hours target can't be met with this roster and desk setup.\n\n"
+                f"{engine.format_feasibility_report(report)}\n\n"
+                f"Generate a best-effort schedule anyway?")
+            if not proceed:
+                return
 
-        # Track hours per week for variance checking
-        self.week1_hours = {person['name']: 0 for person in self.people}
-        self.week2_hours = {person['name']: 0 for person in self.people}
+        # Minimum staffing that no schedule can reach
+        shortfalls = engine.analyze_staffing(self.desks_per_day, min_staff)
+        if shortfalls:
+            proceed = messagebox.askyesno(
+                "Minimum Staffing Not Reachable",
+                f"These shifts can't get their minimum staffing:\n\n"
+                f"{engine.format_staffing_report(shortfalls)}\n\n"
+                f"Generate a schedule anyway (filling them as far as possible)?")
+            if not proceed:
+                return
 
-        # For algorithm: track shifts per shift code per day: {day: {shift_code: [people]}}
-        self.temp_schedule = {day: {code: [] for code in self.timeslot_codes} for day in self.day_names}
+        # Generate colors for people
+        self.generate_person_colors()
 
         # Run scheduling algorithm with per-day desks, rigidity, weekly variance, and target hours
-        self.run_scheduling_algorithm(self.desks_per_day, rigidity, weekly_variance, total_hours_target)
-
-        # Convert temp_schedule to person-centric schedule
-        self.convert_to_person_schedule()
+        # Schedule: {day: {person_name: {'shifts': [shift_codes], 'hours': float}} }
+        phase1 = 'matching' if self.match_first_shifts.get() else 'greedy'
+        engine.solve(self.desks_per_day, rigidity, weekly_variance, total_hours_target, phase1, desk_types,
+                     min_staff, objective)
+        self.engine = engine
+        self.schedule = engine.schedule
+        self.hours_scheduled = engine.hours_scheduled
 
         # Mark as generated
         self.schedule_generated = True
 
-        # Display results
+        # Display results (highlighting changes if a saved schedule is being compared)
+        self.update_schedule_diff()
         self.display_schedule()
         self.display_hours()
 
-    def convert_to_person_schedule(self):
-        """Convert shift-code-based schedule to person-based schedule with shift grouping"""
-        for day in self.day_names:
-            person_shifts = {}
-
-            # Find all shifts for each person
-            for person in self.people:
-                person_name = person['name']
-                shifts_assigned = []
-
-                # Find all shift codes this person is scheduled for
-                for shift_code in self.timeslot_codes:
-                    if person_name in self.temp_schedule[day][shift_code]:
-                        shifts_assigned.append(shift_code)
-
-                # If person has shifts, create entry
-                if shifts_assigned:
-                    # Calculate total hours
-                    total_hours = sum(self.shift_definitions[code]['hours'] for code in shifts_assigned)
-
-                    person_shifts[person_name] = {
-                        'shifts': shifts_assigned,
-                        'hours': total_hours
-                    }
-
-            self.schedule[day] = person_shifts
-
-    def run_scheduling_algorithm(self, desks_per_day, rigidity, weekly_variance, total_hours_target):
-        """
-        Priority-Based Scheduling Algorithm with Fixed Shifts:
-
-        HARD CONSTRAINTS:
-        1. Never exceed desk capacity per shift (ABSOLUTE HARD LIMIT)
-        2. Never schedule someone for over their max hours (ABSOLUTE HARD LIMIT)
-        3. Weekly variance limit: |week_hours - preferred/2| <= weekly_variance (per week)
-        4. Prevent conflicting shift assignments (overlapping time slots)
-
-        PRIORITIES:
-        1. Schedule everyone with nonzero preferred hours
-        2. Get everyone to their preferred hours (can exceed total target for this)
-        3. Try to meet or exceed total hours target
-        4. Respect rigidity parameter for shift combinations
-        5. Prefer longer shifts when possible
-        """
-
-        # Track shift filling for balance
-        shift_counts = {day: {code: 0 for code in self.timeslot_codes} for day in self.day_names}
-
-        # Get people with nonzero preferred hours
-        people_to_schedule = [p for p in self.people if p['preferred_hours'] > 0]
-
-        # Phase 1: Give everyone at least one shift combination
-        for person in people_to_schedule:
-            if self.hours_scheduled[person['name']] == 0:
-                shift_combo = self.find_best_available_shift_combo(
-                    person, desks_per_day, rigidity, shift_counts, 'initial', weekly_variance)
-                if shift_combo:
-                    self.assign_shift_combo_to_person(person, shift_combo, shift_counts)
-
-        # Phase 2: AGGRESSIVELY fill everyone to their preferred hours
-        max_iterations = 100
-        iteration = 0
-
-        while iteration < max_iterations:
-            iteration += 1
-            progress_made = False
-
-            # Sort by distance from preferred hours (furthest first)
-            for person in sorted(people_to_schedule,
-                               key=lambda p: p['preferred_hours'] - self.hours_scheduled[p['name']],
-                               reverse=True):
-
-                # Try to get closer to preferred hours
-                if self.hours_scheduled[person['name']] < person['preferred_hours']:
-                    shift_combo = self.find_best_available_shift_combo(
-                        person, desks_per_day, rigidity, shift_counts, 'preferred', weekly_variance)
-                    if shift_combo:
-                        self.assign_shift_combo_to_person(person, shift_combo, shift_counts)
-                        progress_made = True
-
-            if not progress_made:
-                break
-
-        # Phase 3: If still under target, use agreed hours tier
-        total_scheduled = sum(self.hours_scheduled.values())
-
-        if total_scheduled < total_hours_target:
-            iteration = 0
-            while total_scheduled < total_hours_target and iteration < max_iterations:
-                iteration += 1
-                progress_made = False
-
-                for person in sorted(people_to_schedule,
-                                   key=lambda p: p['agreed_hours'] - self.hours_scheduled[p['name']],
-                                   reverse=True):
-
-                    if self.hours_scheduled[person['name']] < person['agreed_hours']:
-                        shift_combo = self.find_best_available_shift_combo(
-                            person, desks_per_day, rigidity, shift_counts, 'agreed', weekly_variance)
-                        if shift_combo:
-                            self.assign_shift_combo_to_person(person, shift_combo, shift_counts)
-                            total_scheduled = sum(self.hours_scheduled.values())
-                            progress_made = True
-
-                            if total_scheduled >= total_hours_target:
-                                break
-
-                if not progress_made or total_scheduled >= total_hours_target:
-                    break
-
-        # Phase 4: If still under target, use max hours tier
-        if total_scheduled < total_hours_target:
-            iteration = 0
-            while total_scheduled < total_hours_target and iteration < max_iterations:
-                iteration += 1
-                progress_made = False
-
-                for person in sorted(people_to_schedule,
-                                   key=lambda p: p['max_hours'] - self.hours_scheduled[p['name']],
-                                   reverse=True):
-
-                    if self.hours_scheduled[person['name']] < person['max_hours']:
-                        shift_combo = self.find_best_available_shift_combo(
-                            person, desks_per_day, rigidity, shift_counts, 'max', weekly_variance)
-                        if shift_combo:
-                            self.assign_shift_combo_to_person(person, shift_combo, shift_counts)
-                            total_scheduled = sum(self.hours_scheduled.values())
-                            progress_made = True
-
-                            if total_scheduled >= total_hours_target:
-                                break
-
-                if not progress_made or total_scheduled >= total_hours_target:
-                    break
-
-    def find_best_available_shift_combo(self, person, desks_per_day, rigidity, shift_counts, mode, weekly_variance):
-        """
-        Find the best available shift combination for a person based on rigidity
-
-        Shift combinations by rigidity level:
-        - High (70-100): Prefer longer single shifts (0930 or 1300F)
-        - Medium (30-70): Allow mid-length shifts (1030, 1300, 1300F)
-        - Low (0-30): Allow any shift, including shorter ones
-
-        Weekly variance: Enforce weekly hour distribution constraint
-
-        Note: Shifts can overlap (0930 overlaps with 1030, 1300F contains 1300),
-        so conflicts must be prevented
-        """
-        best_combo = None
-        best_score = float('inf')
-
-        # Determine hours budget based on mode
-        current_hours = self.hours_scheduled[person['name']]
-        if mode == 'preferred' or mode == 'initial':
-            hours_budget = person['preferred_hours'] - current_hours
-        elif mode == 'agreed':
-            hours_budget = person['agreed_hours'] - current_hours
-        elif mode == 'max':
-            hours_budget = person['max_hours'] - current_hours
-        else:
-            hours_budget = person['max_hours'] - current_hours
-
-        # Never exceed max hours
-        hours_budget = min(hours_budget, person['max_hours'] - current_hours)
-
-        if hours_budget <= 0:
-            return None
-
-        # Define possible shift combinations by rigidity
-        # Note: 0930 overlaps with 1030, 1300F overlaps with 1300
-        if rigidity >= 70:
-            # High rigidity: Prefer longest shifts and full day combinations
-            combo_priorities = [
-                ['0930', '1300F'],  # Full day: morning + long afternoon (7h)
-                ['1300F'],          # Long afternoon only (4h)
-                ['0930'],           # Full morning (3h)
-                ['1030', '1300F'],  # Late morning + long afternoon (6h)
-                ['1300'],           # Regular afternoon (2.5h)
-                ['1030'],           # Late morning (2h)
-            ]
-        elif rigidity >= 30:
-            # Medium rigidity: Allow various combinations
-            combo_priorities = [
-                ['0930', '1300F'],  # Full day: morning + long afternoon (7h)
-                ['1030', '1300F'],  # Late morning + long afternoon (6h)
-                ['0930', '1300'],   # Morning + regular afternoon (5.5h)
-                ['1300F'],          # Long afternoon only (4h)
-                ['0930'],           # Full morning (3h)
-                ['1030', '1300'],   # Late morning + regular afternoon (4.5h)
-                ['1300'],           # Regular afternoon (2.5h)
-                ['1030'],           # Late morning (2h)
-            ]
-        else:
-            # Low rigidity: Allow all valid combinations, prioritize longer shifts
-            combo_priorities = [
-                ['0930', '1300F'],  # Full day: morning + long afternoon (7h)
-                ['1030', '1300F'],  # Late morning + long afternoon (6h)
-                ['0930', '1300'],   # Morning + regular afternoon (5.5h)
-                ['1030', '1300'],   # Late morning + regular afternoon (4.5h)
-                ['1300F'],          # Long afternoon only (4h)
-                ['0930'],           # Full morning (3h)
-                ['1300'],           # Regular afternoon (2.5h)
-                ['1030'],           # Late morning (2h)
-            ]
-
-        # Try each day
-        for day_idx, day in enumerate(self.day_names):
-            day_code = self.days[day_idx]
-            desks = desks_per_day[day]
-
-            # Check if person is already scheduled on this day
-            person_already_scheduled = any(
-                person['name'] in self.temp_schedule[day][code]
-                for code in self.timeslot_codes
-            )
-            # Allow multiple shifts per day only in later phases
-            if person_already_scheduled and mode == 'initial':
-                continue
-
-            # Try each shift combination in priority order
-            for shift_codes in combo_priorities:
-                # Calculate total hours for this combination
-                combo_hours = sum(self.shift_definitions[code]['hours'] for code in shift_codes)
-
-                # Check if within budget
-                if combo_hours > hours_budget:
-                    continue
-
-                # Check if person is available for all shifts in combo
-                all_available = True
-                for shift_code in shift_codes:
-                    if not person['availability'].get(day_code, {}).get(shift_code, False):
-                        all_available = False
-                        break
-
-                if not all_available:
-                    continue
-
-                # Check if person already in any of these shifts (prevent duplicates)
-                already_in_shifts = any(
-                    person['name'] in self.temp_schedule[day][code]
-                    for code in shift_codes
-                )
-                if already_in_shifts:
-                    continue
-
-                # Check for conflicting overlapping shifts
-                # Morning shifts (0930 and 1030) overlap - can't have both
-                # Afternoon shifts (1300 and 1300F) overlap - can't have both
-                has_conflict = False
-                for shift_code in shift_codes:
-                    if shift_code == '0930':
-                        # Check if person already has 1030
-                        if person['name'] in self.temp_schedule[day]['1030']:
-                            has_conflict = True
-                            break
-                    elif shift_code == '1030':
-                        # Check if person already has 0930
-                        if person['name'] in self.temp_schedule[day]['0930']:
-                            has_conflict = True
-                            break
-                    elif shift_code == '1300':
-                        # Check if person already has 1300F
-                        if person['name'] in self.temp_schedule[day]['1300F']:
-                            has_conflict = True
-                            break
-                    elif shift_code == '1300F':
-                        # Check if person already has 1300
-                        if person['name'] in self.temp_schedule[day]['1300']:
-                            has_conflict = True
-                            break
-
-                if has_conflict:
-                    continue
-
-                # Check if all shifts have desk capacity
-                all_have_room = all(
-                    len(self.temp_schedule[day][code]) < desks
-                    for code in shift_codes
-                )
-                if not all_have_room:
-                    continue
-
-                # Check weekly variance constraint
-                # Determine which week this day belongs to
-                # Week 1: days 0-3 (Monday-Thursday Week 1)
-                # Week 2: days 4-7 (Monday-Thursday Week 2)
-                week_idx = self.day_names.index(day)
-                is_week1 = week_idx < 4
-
-                # Get current week hours for this person
-                current_week_hours = self.week1_hours[person['name']] if is_week1 else self.week2_hours[person['name']]
-
-                # Calculate what total would be with this combo
-                potential_week_hours = current_week_hours + combo_hours
-
-                # Weekly target is half of preferred (preferred is for 2 weeks)
-                weekly_target = person['preferred_hours'] / 2
-
-                # Check if this would violate weekly variance constraint
-                # Allow deviation up to weekly_variance hours from the weekly target
-                if potential_week_hours > weekly_target + weekly_variance:
-                    # This combo would violate weekly variance, skip it
-                    continue
-
-                # Calculate score - prefer balanced distribution and longer shifts
-                total_fill = sum(shift_counts[day][code] for code in shift_codes)
-                avg_fill = total_fill / len(shift_codes) if shift_codes else 0
-
-                # Prefer longer combinations (lower score is better)
-                length_bonus = -combo_hours * 2  # Prefer longer shifts
-
-                # Balance score
-                score = avg_fill * 5 + length_bonus
-
-                if score < best_score:
-                    best_score = score
-                    best_combo = {
-                        'day': day,
-                        'shifts': shift_codes,
-                        'hours': combo_hours
-                    }
-
-        return best_combo
-
-    def assign_shift_combo_to_person(self, person, shift_combo, shift_counts):
-        """Assign a shift combination to a person and update tracking"""
-        day = shift_combo['day']
-        shifts = shift_combo['shifts']
-        hours = shift_combo['hours']
-
-        # Add person to each shift
-        for shift_code in shifts:
-            self.temp_schedule[day][shift_code].append(person['name'])
-            shift_counts[day][shift_code] += 1
-
-        # Update person's scheduled hours
-        self.hours_scheduled[person['name']] += hours
-
-        # Update weekly hours tracking
-        # Week 1: day indices 0-3 (Monday-Thursday Week 1)
-        # Week 2: day indices 4-7 (Monday-Thursday Week 2)
-        week_idx = self.day_names.index(day)
-        if week_idx < 4:
-            # Week 1
-            self.week1_hours[person['name']] += hours
-        else:
-            # Week 2
-            self.week2_hours[person['name']] += hours
-
-
     def display_schedule(self):
+        started = self.stats.start()
+
         # Clear previous display
         for widget in self.schedule_frame.winfo_children():
             widget.destroy()
@@ -1385,14 +1525,69 @@ class SchedulingTool:
         main_container = tk.Frame(self.schedule_frame, bg=self.colors['bg_dark'])
         main_container.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
 
-        # Week information at top
-        week_info = tk.Label(main_container,
+        # Week information at top, with the view switch next to it
+        top_bar = tk.Frame(main_container, bg=self.colors['bg_dark'])
+        top_bar.pack(fill=tk.X)
+        week_info = tk.Label(top_bar,
                             text=self.get_week_display_text(),
                             font=("Consolas", 14, "bold"),
                             fg=self.colors['accent'],
                             bg=self.colors['bg_dark'],
                             pady=15)
-        week_info.pack(anchor=tk.W)
+        week_info.pack(side=tk.LEFT)
+
+        for value, label in (('timeline', "Timeline"), ('days', "Day Grid")):
+            tk.Radiobutton(top_bar, text=label, value=value, variable=self.schedule_view,
+                           command=self.display_schedule, indicatoron=0,
+                           font=("Consolas", 9), padx=10, pady=4,
+                           bg=self.colors['bg_medium'], fg=self.colors['text_primary'],
+                           selectcolor=self.colors['accent'], activebackground=self.colors['bg_light'],
+                           activeforeground=self.colors['text_primary'],
+                           relief=tk.FLAT, borderwidth=0).pack(side=tk.RIGHT, padx=(5, 0))
+
+        compare_btn = tk.Button(top_bar, text="Compare...", command=self.compare_schedule,
+                                font=("Consolas", 9), padx=10, pady=2, relief=tk.FLAT, cursor="hand2",
+                                bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                                activebackground=self.colors['bg_medium'])
+        compare_btn.pack(side=tk.RIGHT, padx=(5, 0))
+        ToolTip(compare_btn, "Compare with a saved schedule: list what changed\nper person and highlight it in the day grid")
+
+        # Undo/redo of manual edits (also Ctrl+Z / Ctrl+Y)
+        history_buttons = {}
+        for action, label in (('redo', "Redo"), ('undo', "Undo")):
+            history_buttons[action] = tk.Button(top_bar, text=label,
+                                                command=lambda action=action: self.step_history(action),
+                                                font=("Consolas", 9), padx=10, pady=2, relief=tk.FLAT,
+                                                cursor="hand2", bg=self.colors['bg_light'],
+                                                fg=self.colors['text_primary'],
+                                                disabledforeground=self.colors['text_muted'],
+                                                activebackground=self.colors['bg_medium'])
+            history_buttons[action].pack(side=tk.RIGHT, padx=(5, 0))
+        self.undo_button = history_buttons['undo']
+        self.redo_button = history_buttons['redo']
+        self.refresh_history_buttons()
+
+        if self.schedule_view.get() == 'timeline':
+            # Whole schedule on one zoomable canvas
+            TimelineView(self, main_container)
+            tk.Label(main_container, text="Ctrl+wheel to zoom, drag to pan",
+                     font=("Consolas", 8), fg=self.colors['text_muted'],
+                     bg=self.colors['bg_dark']).pack(anchor=tk.W, pady=(5, 0))
+        else:
+            tk.Label(main_container, text="Drag a shift to another shift or day to move it",
+                     font=("Consolas", 8), fg=self.colors['text_muted'],
+                     bg=self.colors['bg_dark']).pack(anchor=tk.W)
+            self.display_day_grid(main_container)
+
+        # Update canvas size to fit content
+        self.schedule_frame.update_idletasks()
+        self.update_schedule_canvas_size()
+        self.stats.stop('display_schedule', started)
+
+    def display_day_grid(self, main_container):
+        """One block per day, in a 2x2 grid per week"""
+        self.day_views = {}
+        self.block_drag = None
 
         # Create vertical layout for 2 weeks
         # Week 1 section
@@ -1444,9 +1639,66 @@ class SchedulingTool:
             desks = self.desks_per_day[day]
             self.create_day_block(week2_grid, day, i + 4, desks, row, col)
 
-        # Update canvas size to fit content
-        self.schedule_frame.update_idletasks()
-        self.update_schedule_canvas_size()
+    def lane_types(self, day, desks):
+        """Desk type of each lane on a day (None = general desk)"""
+        if self.engine is None or not self.engine.desk_types:
+            return [None] * desks
+        return self.engine.day_desk_types(self.day_names.index(day))[:desks]
+
+    def assign_lanes(self, day, desks):
+        """
+        Give everyone scheduled on a day a desk lane for drawing
+
+        Returns [(person_name, shifts, lane)]. A person keeps one lane for all
+        their shifts that day; people are placed in order of their shifts.
+        With typed desks, people only go in lanes of desk types they're
+        qualified for (those first) or general lanes.
+        """
+        # Track lane assignments for each shift: {shift_code: [person_names]}
+        shift_lanes = {code: [] for code in self.timeslot_codes}
+        people_shifts = sorted(self.schedule.get(day, {}).items(), key=lambda x: x[1]['shifts'])
+        lane_types = self.lane_types(day, desks)
+        typed = any(lane_types)
+
+        lanes = []
+        for person_name, person_data in people_shifts:
+            shifts = person_data['shifts']
+            if typed:
+                # The desks the engine seated them at first, then other desks they can use
+                person_id = self.engine.name_to_id[person_name]
+                qualifications = self.engine.people[person_id].qualifications
+                day_seating = self.engine.seating[self.day_names.index(day)]
+                seated = [day_seating[self.shift_table.index[code]].desk_of.get(person_id) for code in shifts]
+                lane_order = ([lane for lane in seated if lane is not None and lane < desks] +
+                              [lane for lane, desk_type in enumerate(lane_types) if desk_type in qualifications] +
+                              [lane for lane, desk_type in enumerate(lane_types) if desk_type is None])
+            else:
+                lane_order = range(desks)
+
+            # Find a lane that's free for ALL shifts this person needs
+            assigned_lane = None
+            for lane_idx in lane_order:
+                lane_is_free = all(
+                    lane_idx >= len(shift_lanes[shift_code]) or
+                    shift_lanes[shift_code][lane_idx] is None
+                    for shift_code in shifts
+                )
+
+                if lane_is_free:
+                    assigned_lane = lane_idx
+                    # Reserve this lane for all shifts
+                    for shift_code in shifts:
+                        # Extend the lane list if needed
+                        while len(shift_lanes[shift_code]) <= lane_idx:
+                            shift_lanes[shift_code].append(None)
+                        shift_lanes[shift_code][lane_idx] = person_name
+                    break
+
+            if assigned_lane is None:
+                # No single lane is free all day; overlap on a desk they can still use
+                assigned_lane = next(iter(lane_order), 0)
+            lanes.append((person_name, shifts, assigned_lane))
+        return lanes
 
     def create_day_block(self, parent, day, day_idx, desks, row, col):
         """Create a single day schedule block using shift codes"""
@@ -1470,13 +1722,8 @@ class SchedulingTool:
         schedule_grid = tk.Frame(day_container, bg=self.colors['bg_dark'])
         schedule_grid.pack(fill=tk.BOTH, expand=True)
 
-        # Calculate heights for each shift (proportional to hours)
-        shift_heights = {
-            "0930": 90,   # 3h shift
-            "1030": 60,   # 2h shift
-            "1300": 75,   # 2.5h shift
-            "1300F": 120  # 4h shift
-        }
+        # Calculate heights for each shift (proportional to hours, 30px per hour)
+        shift_heights = self.shift_table.row_heights()
         total_height = sum(shift_heights.values())
 
         # Time column - use Canvas for exact positioning
@@ -1513,24 +1760,36 @@ class SchedulingTool:
                               highlightbackground=self.colors['border'])
         day_canvas.pack(fill=tk.BOTH, expand=True)
 
-        # Count capacity and add warnings for each shift
-        shift_counts = {code: 0 for code in self.timeslot_codes}
+        # Add warnings for each shift (fill comes from the engine's running totals)
+        floors = self.engine.staffing_floors()
 
-        if day in self.schedule:
-            for person_name, person_data in self.schedule[day].items():
-                for shift_code in person_data['shifts']:
-                    shift_counts[shift_code] += 1
+        def draw_warnings():
+            warning_canvas.delete("all")
+            shift_fill = self.engine.index.shift_fill[day_idx]
+            shift_counts = {code: shift_fill[idx] for idx, code in enumerate(self.timeslot_codes)}
 
-        # Add warning labels for understaffed shifts
-        y_offset = 0
-        for shift_code in self.timeslot_codes:
-            if shift_counts[shift_code] < desks:
-                warning_canvas.create_text(5, y_offset + 5,
-                                         text=f"⚠ {shift_counts[shift_code]}/{desks}",
-                                         font=("Consolas", 8),
-                                         fill=self.colors['error'],
-                                         anchor=tk.W)
-            y_offset += shift_heights[shift_code]
+            # Add warning labels for understaffed shifts (with the minimum if it isn't met)
+            y_offset = 0
+            for shift_code in self.timeslot_codes:
+                minimum = floors.get((day_idx, self.shift_table.index[shift_code]), 0)
+                if shift_counts[shift_code] < minimum:
+                    warning_canvas.create_text(5, y_offset,
+                                             text=f"⚠ {shift_counts[shift_code]}/{desks}\nmin {minimum}",
+                                             font=("Consolas", 8, "bold"),
+                                             fill=self.colors['error'],
+                                             anchor=tk.NW)
+                elif shift_counts[shift_code] < desks:
+                    warning_canvas.create_text(5, y_offset + 5,
+                                             text=f"⚠ {shift_counts[shift_code]}/{desks}",
+                                             font=("Consolas", 8),
+                                             fill=self.colors['error'],
+                                             anchor=tk.W)
+                y_offset += shift_heights[shift_code]
+        draw_warnings()
+
+        # Hit boxes of the drawn blocks, for dragging: [(x1, y1, x2, y2, person_name, shift_group)]
+        view = {'canvas': day_canvas, 'desks': desks, 'blocks': []}
+        self.day_views[day_idx] = view
 
         # Update canvas when it's sized
         def draw_schedule(event=None):
@@ -1539,6 +1798,7 @@ class SchedulingTool:
                 canvas_width = 400  # Default width
 
             day_canvas.delete("all")
+            view['blocks'] = []
 
             # Draw grid lines between shifts
             y_offset = 0
@@ -1552,55 +1812,28 @@ class SchedulingTool:
                                   fill=self.colors['border'],
                                   width=1)
 
+            # Typed desk lanes: shaded, with the desk type at the bottom
+            lane_width = (canvas_width - 10) / max(desks, 1)
+            for lane, desk_type in enumerate(self.lane_types(day, desks)):
+                if desk_type is None:
+                    continue
+                x1 = 5 + lane * lane_width
+                day_canvas.create_rectangle(x1 - 2, 1, x1 + lane_width - 3, y_offset - 1,
+                                            fill=self.colors['bg_medium'], outline='')
+                day_canvas.create_text(x1 + lane_width / 2 - 2, y_offset - 3, text=desk_type,
+                                       fill=self.colors['text_muted'], font=("Consolas", 7), anchor=tk.S)
+
+            overlay = self.diff_overlay.get(day, {})
+            new_shifts = overlay.get('new', {})
+
             # Draw schedule blocks
             if day in self.schedule:
                 # Calculate block width
                 block_width = (canvas_width - 10) / desks
 
-                # Track lane assignments for each shift: {shift_code: [person_names]}
-                shift_lanes = {code: [] for code in self.timeslot_codes}
-
-                # Assign people to lanes
-                people_shifts = list(self.schedule[day].items())
-                people_shifts.sort(key=lambda x: x[1]['shifts'])
-
-                for person_name, person_data in people_shifts:
-                    shifts = person_data['shifts']
-
-                    # Find a lane that's free for ALL shifts this person needs
-                    assigned_lane = None
-                    for lane_idx in range(desks):
-                        # Check if this lane is free for all required shifts
-                        lane_is_free = all(
-                            lane_idx >= len(shift_lanes[shift_code]) or
-                            shift_lanes[shift_code][lane_idx] is None
-                            for shift_code in shifts
-                        )
-
-                        if lane_is_free:
-                            assigned_lane = lane_idx
-                            # Reserve this lane for all shifts
-                            for shift_code in shifts:
-                                # Extend the lane list if needed
-                                while len(shift_lanes[shift_code]) <= lane_idx:
-                                    shift_lanes[shift_code].append(None)
-                                shift_lanes[shift_code][lane_idx] = person_name
-                            break
-
-                    if assigned_lane is None:
-                        assigned_lane = 0
-
-                    # Group non-overlapping shifts
-                    # Morning shifts: 0930 (9:30-12:30), 1030 (10:30-12:30) - only one can be scheduled
-                    # Afternoon shifts: 1300 (13:00-15:30), 1300F (13:00-17:00) - only one can be scheduled
-                    shift_groups = []
-                    morning_shifts = [s for s in shifts if s in ['0930', '1030']]
-                    afternoon_shifts = [s for s in shifts if s in ['1300', '1300F']]
-
-                    if morning_shifts:
-                        shift_groups.append(morning_shifts)
-                    if afternoon_shifts:
-                        shift_groups.append(afternoon_shifts)
+                for person_name, shifts, assigned_lane in self.assign_lanes(day, desks):
+                    # Group shifts into blocks (consecutive shifts are merged)
+                    shift_groups = self.shift_table.group_blocks(shifts)
 
                     # Draw merged blocks for each group
                     for shift_group in shift_groups:
@@ -1631,6 +1864,12 @@ class SchedulingTool:
                         radius = 8
                         self.draw_rounded_rect(day_canvas, x1, y1, x2, y2, radius,
                                               fill=color, outline=self.colors['border'], width=2)
+                        view['blocks'].append((x1, y1, x2, y2, person_name, shift_group))
+
+                        # Highlight shifts that are new since the compared schedule
+                        if new_shifts.get(person_name, set()).intersection(shift_group):
+                            self.draw_rounded_rect(day_canvas, x1 - 2, y1 - 2, x2 + 2, y2 + 2, radius,
+                                                  fill='', outline=self.colors['success'], width=3)
 
                         # Add name and times
                         display_name = self.get_display_name(person_name)
@@ -1696,10 +1935,279 @@ class SchedulingTool:
                                               fill=self.colors['bg_dark'],
                                               font=time_font)
 
+            # Shifts removed since the compared schedule: listed at the bottom right of their row
+            row_labels = {code: 0 for code in self.timeslot_codes}
+            for person_name, codes in overlay.get('removed', []):
+                for code in codes:
+                    row_bottom = sum(shift_heights[c] for c in self.timeslot_codes[:self.timeslot_codes.index(code) + 1])
+                    day_canvas.create_text(canvas_width - 6, row_bottom - 4 - 11 * row_labels[code],
+                                          text=f"− {self.get_display_name(person_name)}",
+                                          fill=self.colors['error'], font=("Consolas", 8, "bold"),
+                                          anchor=tk.SE)
+                    row_labels[code] += 1
+
+        def redraw():
+            draw_warnings()
+            draw_schedule()
+        view['redraw'] = redraw
 
         day_canvas.bind('<Configure>', draw_schedule)
+        day_canvas.bind('<ButtonPress-1>', lambda event: self.start_block_drag(event, day_idx))
+        day_canvas.bind('<B1-Motion>', self.drag_block)
+        day_canvas.bind('<ButtonRelease-1>', self.drop_block)
         day_canvas.after(100, draw_schedule)
 
+    def shift_row_at(self, y):
+        """Index of the shift row at a y position in a day canvas, or None"""
+        top = 0
+        for idx, height in enumerate(self.shift_table.row_heights().values()):
+            if top <= y < top + height:
+                return idx
+            top += height
+        return None
+
+    def start_block_drag(self, event, day_idx):
+        """Pick up the block under the pointer"""
+        view = self.day_views.get(day_idx)
+        if view is None or self.engine is None:
+            return
+        for x1, y1, x2, y2, person_name, shift_group in view['blocks']:
+            if x1 <= event.x <= x2 and y1 <= event.y <= y2:
+                row = self.shift_row_at(event.y)
+                if row is None:
+                    return
+                self.block_drag = {
+                    'person_id': self.engine.name_to_id[person_name],
+                    'day_idx': day_idx,
+                    'mask': self.shift_table.combo_mask(shift_group),
+                    'rows': [self.shift_table.index[code] for code in shift_group],
+                    'row': row,
+                    'target': None,  # (day_idx, mask, reason) under the pointer
+                    'ghost_canvas': None
+                }
+                view['canvas'].config(cursor="fleur")
+                return
+
+    def drag_target(self, event):
+        """Day canvas, day and lane under the pointer while dragging, or None"""
+        widget = self.root.winfo_containing(event.x_root, event.y_root)
+        for day_idx, view in self.day_views.items():
+            if view['canvas'] is widget:
+                canvas = view['canvas']
+                return day_idx, event.x_root - canvas.winfo_rootx(), event.y_root - canvas.winfo_rooty()
+        return None
+
+    def drag_block(self, event):
+        """
+        Show where the dragged block would land and whether that's allowed
+
+        The check (engine.check_move) only reads running totals, so it can run
+        on every pointer move; it's only repeated when the target changes.
+        """
+        drag = self.block_drag
+        if drag is None:
+            return
+        found = self.drag_target(event)
+        target = None
+        if found:
+            day_idx, x, y = found
+            row = self.shift_row_at(y)
+            if row is not None:
+                # The block keeps its shape: every shift moves by the same number of rows
+                offset = row - drag['row']
+                rows = [idx + offset for idx in drag['rows']]
+                if all(0 <= idx < len(self.timeslot_codes) for idx in rows):
+                    mask = sum(1 << idx for idx in rows)
+                    if (day_idx, mask) != (drag['day_idx'], drag['mask']):
+                        previous = drag['target']
+                        if previous and previous[:2] == (day_idx, mask):
+                            target = previous
+                        else:
+                            reason = self.engine.check_move(drag['person_id'], drag['day_idx'], drag['mask'],
+                                                            day_idx, mask)
+                            target = (day_idx, mask, reason)
+                        self.draw_drag_ghost(target, rows, x)
+        if target is None:
+            self.clear_drag_ghost()
+        drag['target'] = target
+
+    def draw_drag_ghost(self, target, rows, x):
+        """Outline the target shifts on the target day: green if allowed, red with the reason if not"""
+        self.clear_drag_ghost()
+        day_idx, mask, reason = target
+        view = self.day_views[day_idx]
+        canvas = view['canvas']
+        heights = list(self.shift_table.row_heights().values())
+        y1 = sum(heights[:rows[0]]) + 3
+        y2 = sum(heights[:rows[-1] + 1]) - 3
+        block_width = (max(canvas.winfo_width(), 20) - 10) / max(view['desks'], 1)
+        lane = min(max(int((x - 5) // block_width), 0), max(view['desks'] - 1, 0))
+        x1 = 5 + lane * block_width
+        x2 = x1 + block_width - 5
+        color = self.colors['success'] if reason is None else self.colors['error']
+        canvas.create_rectangle(x1, y1, x2, y2, outline=color, width=3, dash=(4, 2), tags="drag_ghost")
+        if reason:
+            canvas.create_text((x1 + x2) / 2, (y1 + y2) / 2, text=self.MOVE_REASONS.get(reason, reason),
+                               fill=color, font=("Consolas", 8, "bold"), width=max(x2 - x1 - 4, 20),
+                               tags="drag_ghost")
+        self.block_drag['ghost_canvas'] = canvas
+
+    def clear_drag_ghost(self):
+        canvas = self.block_drag['ghost_canvas'] if self.block_drag else None
+        if canvas is not None:
+            canvas.delete("drag_ghost")
+            self.block_drag['ghost_canvas'] = None
+
+    def drop_block(self, event):
+        """Move the block if the target is allowed, then redraw only the days involved"""
+        drag = self.block_drag
+        if drag is None:
+            return
+        self.clear_drag_ghost()
+        self.day_views[drag['day_idx']]['canvas'].config(cursor="")
+        self.block_drag = None
+        target = drag['target']
+        if target is None or target[2] is not None:
+            return
+
+        to_day_idx, to_mask, _ = target
+        self.engine.move_shifts(drag['person_id'], drag['day_idx'], drag['mask'], to_day_idx, to_mask)
+        self.show_edit([(drag['person_id'], drag['day_idx']), (drag['person_id'], to_day_idx)])
+
+    def compare_schedule(self):
+        """Compare the current schedule with a saved one and show what changed"""
+        file_path = filedialog.askopenfilename(
+            title="Compare With Saved Schedule",
+            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path) as f:
+                self.diff_base = json.load(f).get('schedule', {})
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to load schedule: {str(e)}")
+            return
+
+        self.update_schedule_diff()
+        self.display_schedule()
+        self.show_diff_panel(os.path.basename(file_path))
+
+    def update_schedule_diff(self):
+        """Re-diff against the compared schedule and rebuild the overlay (after loading or an edit)"""
+        if self.diff_base is None:
+            self.schedule_diff = None
+            self.diff_overlay = {}
+            return
+        self.schedule_diff = diff_schedules(self.diff_base, self.schedule, self.shift_table)
+        overlay = {day: {'new': {}, 'removed': []} for day in self.day_names}
+        for change in self.schedule_diff['changes']:
+            if change['change'] == 'added':
+                overlay[change['day']]['new'].setdefault(change['person'], set()).update(change['shifts'])
+                continue
+            overlay[change['day']]['removed'].append((change['person'], change['shifts']))
+            if change['change'] == 'moved':
+                overlay[change['to_day']]['new'].setdefault(change['person'], set()).update(change['to_shifts'])
+        self.diff_overlay = overlay
+
+    def clear_schedule_diff(self):
+        self.diff_base = None
+        self.update_schedule_diff()
+        if self.schedule_generated:
+            self.display_schedule()
+
+    def show_diff_panel(self, compared_name):
+        """Table of the changes since the compared schedule, with CSV export"""
+        diff = self.schedule_diff
+        panel = tk.Toplevel(self.root)
+        panel.title(f"Changes since {compared_name}")
+        panel.configure(bg=self.colors['bg_dark'])
+
+        container = tk.Frame(panel, bg=self.colors['bg_dark'])
+        container.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+
+        counts = diff['counts']
+        tk.Label(container, text=f"{counts['added']} added, {counts['removed']} removed, {counts['moved']} moved",
+                 font=("Consolas", 11, "bold"), fg=self.colors['accent'],
+                 bg=self.colors['bg_dark']).grid(row=0, column=0, columnspan=3, sticky=tk.W, pady=(0, 10))
+
+        columns = (('person', "Person", 180), ('change', "Change", 70), ('from', "From", 220),
+                   ('to', "To", 220), ('hours', "Hours", 150))
+        table = ttk.Treeview(container, columns=[column for column, _, _ in columns], show='headings',
+                             height=min(max(len(diff['changes']), 1), 20), style='Hours.Treeview')
+        for column, heading, width in columns:
+            table.heading(column, text=heading)
+            table.column(column, width=width, stretch=False)
+        table.tag_configure('added', foreground=self.colors['success'])
+        table.tag_configure('removed', foreground=self.colors['error'])
+        table.tag_configure('moved', foreground=self.colors['text_primary'])
+        for change in diff['changes']:
+            hours = diff['hours'][change['person']]
+            source = f"{change['day']} {' '.join(change['shifts'])}"
+            if change['change'] == 'moved':
+                target = f"{change['to_day']} {' '.join(change['to_shifts'])}"
+            elif change['change'] == 'added':
+                source, target = "", source
+            else:
+                target = ""
+            table.insert('', tk.END, tags=(change['change'],), values=(
+                change['person'], change['change'], source, target,
+                f"{hours['old']:.1f}h -> {hours['new']:.1f}h ({hours['delta']:+.1f}h)"))
+
+        scrollbar = ttk.Scrollbar(container, orient="vertical", command=table.yview)
+        table.configure(yscrollcommand=scrollbar.set)
+        table.grid(row=1, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=1, column=2, sticky=(tk.N, tk.S))
+
+        tk.Button(container, text="Save CSV", command=lambda: self.save_diff_csv(diff),
+                  bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                  font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                  cursor="hand2").grid(row=2, column=0, sticky=tk.W, pady=(10, 0))
+        tk.Button(container, text="Clear Highlights", command=lambda: (self.clear_schedule_diff(), panel.destroy()),
+                  bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                  font=("Consolas", 9), relief=tk.FLAT, padx=10, pady=3,
+                  cursor="hand2").grid(row=2, column=1, sticky=tk.W, pady=(10, 0))
+
+    def save_diff_csv(self, diff):
+        file_path = filedialog.asksaveasfilename(
+            defaultextension=".csv",
+            filetypes=[("CSV files", "*.csv")],
+            initialfile="B2.0 Schedule changes.csv"
+        )
+        if not file_path:
+            return
+        try:
+            with open(file_path, 'w', newline='') as f:
+                write_diff_csv(f, diff)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to save changes: {str(e)}")
+
+    def step_history(self, action):
+        """Undo or redo one manual edit ('undo' or 'redo')"""
+        if self.engine is None or self.block_drag is not None:
+            return
+        delta = self.engine.undo() if action == 'undo' else self.engine.redo()
+        if delta:
+            self.show_edit([(person_id, day_idx) for person_id, day_idx, _, _ in delta])
+
+    def show_edit(self, changes):
+        """Redraw after an edit: only the changed days in the day grid, and the changed hours rows"""
+        if self.diff_base is not None:
+            # Only the edited days' highlights change
+            self.update_schedule_diff()
+        if self.schedule_view.get() == 'days' and self.day_views:
+            for day_idx in {day_idx for _, day_idx in changes}:
+                self.day_views[day_idx]['redraw']()
+            self.refresh_history_buttons()
+        else:
+            self.display_schedule()
+        self.update_hours_rows({person_id for person_id, _ in changes})
+
+    def refresh_history_buttons(self):
+        history = self.engine.history
+        self.undo_button.config(state=tk.NORMAL if history.can_undo() else tk.DISABLED)
+        self.redo_button.config(state=tk.NORMAL if history.can_redo() else tk.DISABLED)
+
     def draw_rounded_rect(self, canvas, x1, y1, x2, y2, radius, **kwargs):
         """Draw a rounded rectangle on canvas"""
         fill = kwargs.get('fill', '')
@@ -1742,237 +2250,219 @@ class SchedulingTool:
                               fill=outline, width=width, tags=tags)
 
     def display_hours(self):
-        # Clear previous display
-        for widget in self.hours_frame.winfo_children():
-            widget.destroy()
-
-        # Calculate hours per week for each person
-        week1_days = self.day_names[:4]  # Monday-Thursday Week 1
-        week2_days = self.day_names[4:]  # Monday-Thursday Week 2
-
-        hours_per_week = {}
-        for person in self.people:
-            name = person['name']
-            week1_hours = 0
-            week2_hours = 0
+        """
+        Hours tracker: one table row per person
 
-            for day in week1_days:
-                if day in self.schedule and name in self.schedule[day]:
-                    week1_hours += self.schedule[day][name]['hours']
+        The rows live in a ttk.Treeview, which only draws the visible ones, so
+        the widget count stays the same however big the roster is. Hours come
+        from the engine's running totals. Click a column heading to sort.
+        """
+        started = self.stats.start()
 
-            for day in week2_days:
-                if day in self.schedule and name in self.schedule[day]:
-                    week2_hours += self.schedule[day][name]['hours']
+        if self.hours_frame is None:
+            self.setup_hours_panel()
 
-            hours_per_week[name] = {'week1': week1_hours, 'week2': week2_hours}
+        # Clear previous display
+        for widget in self.hours_frame.winfo_children():
+            widget.destroy()
 
-        # Create styled container
         container = tk.Frame(self.hours_frame, bg=self.colors['bg_dark'])
         container.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
 
-        # Week 1 Section
-        week1_title = tk.Label(container, text="Week 1 Hours",
-                              font=("Consolas", 12, "bold"),
-                              fg=self.colors['accent'],
-                              bg=self.colors['bg_dark'])
-        week1_title.grid(row=0, column=0, columnspan=5, sticky=tk.W, pady=(0, 10))
-
-        # Week 1 headers
-        headers = ["Name", "Scheduled", "Preferred", "Agreed", "Max"]
-        for col, header in enumerate(headers):
-            header_label = tk.Label(container, text=header,
-                                   font=("Consolas", 10, "bold"),
-                                   fg=self.colors['text_secondary'],
-                                   bg=self.colors['bg_dark'])
-            header_label.grid(row=1, column=col, padx=15, pady=5, sticky=tk.W)
-
-        # Week 1 separator
-        separator1 = tk.Frame(container, height=1, bg=self.colors['border'])
-        separator1.grid(row=2, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=(0, 5))
-
-        # Sort people by name
-        sorted_people = sorted(self.people, key=lambda p: p['name'])
-
-        # Display Week 1 hours
-        current_row = 3
-        for person in sorted_people:
-            name = person['name']
-            scheduled = hours_per_week[name]['week1']
-            # Week hours are half of 2-week totals
-            preferred = person['preferred_hours'] / 2
-            agreed = person['agreed_hours'] / 2
-            max_hours = person['max_hours'] / 2
-
-            # Color code based on hours
-            if scheduled < agreed:
-                color = self.colors['error']
-            elif scheduled < preferred:
-                color = self.colors['warning']
-            else:
-                color = self.colors['success']
-
-            # Get person's color for visual consistency
-            person_color = self.person_colors.get(name, self.colors['accent'])
-
-            # Color indicator
-            color_box = tk.Frame(container, width=4, height=20, bg=person_color)
-            color_box.grid(row=current_row, column=0, sticky=tk.W, padx=(0, 5))
-
-            # Name
-            name_label = tk.Label(container, text=name,
-                                 font=("Consolas", 10),
-                                 fg=self.colors['text_primary'],
-                                 bg=self.colors['bg_dark'])
-            name_label.grid(row=current_row, column=0, padx=(10, 15), pady=4, sticky=tk.W)
-
-            # Scheduled hours (colored)
-            scheduled_label = tk.Label(container, text=f"{scheduled:.1f}h",
-                                      font=("Consolas", 10, "bold"),
-                                      fg=color,
-                                      bg=self.colors['bg_dark'])
-            scheduled_label.grid(row=current_row, column=1, padx=15, pady=4, sticky=tk.W)
-
-            # Other hours
-            for col, hours in enumerate([preferred, agreed, max_hours], start=2):
-                label = tk.Label(container, text=f"{hours:.1f}h",
-                               font=("Consolas", 10),
-                               fg=self.colors['text_secondary'],
-                               bg=self.colors['bg_dark'])
-                label.grid(row=current_row, column=col, padx=15, pady=4, sticky=tk.W)
-
-            current_row += 1
-
-        # Week 2 Section (with spacing)
-        current_row += 2
-        week2_title = tk.Label(container, text="Week 2 Hours",
-                              font=("Consolas", 12, "bold"),
-                              fg=self.colors['accent'],
-                              bg=self.colors['bg_dark'])
-        week2_title.grid(row=current_row, column=0, columnspan=5, sticky=tk.W, pady=(10, 10))
-        current_row += 1
-
-        # Week 2 headers
-        for col, header in enumerate(headers):
-            header_label = tk.Label(container, text=header,
-                                   font=("Consolas", 10, "bold"),
-                                   fg=self.colors['text_secondary'],
-                                   bg=self.colors['bg_dark'])
-            header_label.grid(row=current_row, column=col, padx=15, pady=5, sticky=tk.W)
-        current_row += 1
-
-        # Week 2 separator
-        separator2 = tk.Frame(container, height=1, bg=self.colors['border'])
-        separator2.grid(row=current_row, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=(0, 5))
-        current_row += 1
-
-        # Display Week 2 hours
-        for person in sorted_people:
-            name = person['name']
-            scheduled = hours_per_week[name]['week2']
-            # Week hours are half of 2-week totals
-            preferred = person['preferred_hours'] / 2
-            agreed = person['agreed_hours'] / 2
-            max_hours = person['max_hours'] / 2
-
-            # Color code based on hours
-            if scheduled < agreed:
-                color = self.colors['error']
-            elif scheduled < preferred:
-                color = self.colors['warning']
-            else:
-                color = self.colors['success']
-
-            # Get person's color for visual consistency
-            person_color = self.person_colors.get(name, self.colors['accent'])
-
-            # Color indicator
-            color_box = tk.Frame(container, width=4, height=20, bg=person_color)
-            color_box.grid(row=current_row, column=0, sticky=tk.W, padx=(0, 5))
-
-            # Name
-            name_label = tk.Label(container, text=name,
-                                 font=("Consolas", 10),
-                                 fg=self.colors['text_primary'],
-                                 bg=self.colors['bg_dark'])
-            name_label.grid(row=current_row, column=0, padx=(10, 15), pady=4, sticky=tk.W)
-
-            # Scheduled hours (colored)
-            scheduled_label = tk.Label(container, text=f"{scheduled:.1f}h",
-                                      font=("Consolas", 10, "bold"),
-                                      fg=color,
-                                      bg=self.colors['bg_dark'])
-            scheduled_label.grid(row=current_row, column=1, padx=15, pady=4, sticky=tk.W)
-
-            # Other hours
-            for col, hours in enumerate([preferred, agreed, max_hours], start=2):
-                label = tk.Label(container, text=f"{hours:.1f}h",
-                               font=("Consolas", 10),
-                               fg=self.colors['text_secondary'],
-                               bg=self.colors['bg_dark'])
-                label.grid(row=current_row, column=col, padx=15, pady=4, sticky=tk.W)
-
-            current_row += 1
-
-        # Total Hours Section
-        current_row += 1
-        separator3 = tk.Frame(container, height=2, bg=self.colors['border'])
-        separator3.grid(row=current_row, column=0, columnspan=5, sticky=(tk.W, tk.E), pady=(10, 10))
-        current_row += 1
-
-        week1_total = sum(hours_per_week[p['name']]['week1'] for p in self.people)
-        week2_total = sum(hours_per_week[p['name']]['week2'] for p in self.people)
-        total_scheduled = week1_total + week2_total
+        title = tk.Label(container, text="Hours Tracker",
+                         font=("Consolas", 12, "bold"),
+                         fg=self.colors['accent'],
+                         bg=self.colors['bg_dark'])
+        title.grid(row=0, column=0, columnspan=2, sticky=tk.W, pady=(0, 10))
+
+        # Filter row: name search and deficit filter
+        filter_frame = tk.Frame(container, bg=self.colors['bg_dark'])
+        filter_frame.grid(row=1, column=0, columnspan=2, sticky=tk.W, pady=(0, 8))
+
+        tk.Label(filter_frame, text="Search:", font=("Consolas", 10),
+                 fg=self.colors['text_secondary'], bg=self.colors['bg_dark']).pack(side=tk.LEFT)
+        search_entry = tk.Entry(filter_frame, textvariable=self.hours_search, width=18,
+                                font=("Consolas", 10), bg=self.colors['bg_light'],
+                                fg=self.colors['text_primary'], insertbackground=self.colors['text_primary'],
+                                relief=tk.FLAT)
+        search_entry.pack(side=tk.LEFT, padx=(5, 15))
+
+        tk.Label(filter_frame, text="Show:", font=("Consolas", 10),
+                 fg=self.colors['text_secondary'], bg=self.colors['bg_dark']).pack(side=tk.LEFT)
+        filter_box = ttk.Combobox(filter_frame, textvariable=self.hours_filter, state='readonly', width=16,
+                                  values=list(self.HOURS_FILTERS))
+        filter_box.pack(side=tk.LEFT, padx=(5, 0))
+
+        # Table
+        columns = [column for column, _, _ in self.HOURS_COLUMNS]
+        self.hours_table = ttk.Treeview(container, columns=columns, show='headings',
+                                        height=20, style='Hours.Treeview')
+        for column, heading, width in self.HOURS_COLUMNS:
+            self.hours_table.heading(column, text=heading,
+                                     command=lambda column=column: self.sort_hours_table(column))
+            self.hours_table.column(column, width=width, stretch=False,
+                                    anchor=tk.W if column in ('name', 'limit') else tk.E)
+        self.hours_table.tag_configure('below_agreed', foreground=self.colors['error'])
+        self.hours_table.tag_configure('below_preferred', foreground=self.colors['warning'])
+        self.hours_table.tag_configure('ok', foreground=self.colors['success'])
+        self.hours_table.bind('<Double-1>', self.show_person_explanation)
+
+        table_scrollbar = ttk.Scrollbar(container, orient="vertical", command=self.hours_table.yview)
+        self.hours_table.configure(yscrollcommand=table_scrollbar.set)
+        self.hours_table.grid(row=2, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        table_scrollbar.grid(row=2, column=1, sticky=(tk.N, tk.S))
+
+        # Totals over everyone (not just the filtered rows)
+        self.hours_totals_label = tk.Label(container, text=self.hours_totals_text(),
+                                           font=("Consolas", 10, "bold"),
+                                           fg=self.colors['accent_hover'],
+                                           bg=self.colors['bg_dark'])
+        self.hours_totals_label.grid(row=3, column=0, columnspan=2, sticky=tk.W, pady=(10, 0))
+
+        self.hours_rows = self.build_hours_rows()
+        self.refresh_hours_table()
+
+        # Refilter while typing / on filter change (only one trace at a time)
+        for var, attr in ((self.hours_search, 'hours_search_trace'), (self.hours_filter, 'hours_filter_trace')):
+            trace = getattr(self, attr, None)
+            if trace:
+                var.trace_remove('write', trace)
+            setattr(self, attr, var.trace_add('write', lambda *_: self.refresh_hours_table()))
 
-        # Week 1 Total
-        week1_label = tk.Label(container, text="Week 1 Total:",
-                              font=("Consolas", 10, "bold"),
-                              fg=self.colors['text_secondary'],
-                              bg=self.colors['bg_dark'])
-        week1_label.grid(row=current_row, column=0, padx=(10, 15), pady=4, sticky=tk.W)
+        # Update canvas size to fit content
+        self.hours_frame.update_idletasks()
+        self.update_hours_canvas_size()
+        self.stats.stop('display_hours', started)
 
-        week1_value = tk.Label(container, text=f"{week1_total:.1f}h",
-                              font=("Consolas", 10, "bold"),
-                              fg=self.colors['text_secondary'],
-                              bg=self.colors['bg_dark'])
-        week1_value.grid(row=current_row, column=1, padx=15, pady=4, sticky=tk.W)
-        current_row += 1
+    def show_person_explanation(self, event):
+        """Window with the solver's decisions for the double-clicked person (see ScheduleEngine.explain)"""
+        item = self.hours_table.identify_row(event.y)
+        if not item:
+            return
+        name = self.hours_table.item(item, 'values')[0]
+        person_id = self.engine.name_to_id.get(name)
+        if person_id is None:
+            return
+        text = self.engine.explain(person_id)
+        if not self.engine.trace.enabled:
+            text += "\n\nCheck 'Collect stats and trace' and generate again to record the solver's decisions."
+
+        panel = tk.Toplevel(self.root)
+        panel.title(f"Why this schedule: {name}")
+        panel.configure(bg=self.colors['bg_dark'])
+        container = tk.Frame(panel, bg=self.colors['bg_dark'])
+        container.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
+
+        text_box = tk.Text(container, width=110, height=min(text.count("\n") + 2, 40), wrap=tk.NONE,
+                           font=("Consolas", 9), bg=self.colors['bg_light'], fg=self.colors['text_primary'],
+                           relief=tk.FLAT)
+        text_box.insert('1.0', text)
+        text_box.config(state=tk.DISABLED)
+        scrollbar = ttk.Scrollbar(container, orient="vertical", command=text_box.yview)
+        text_box.configure(yscrollcommand=scrollbar.set)
+        text_box.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
 
-        # Week 2 Total
-        week2_label = tk.Label(container, text="Week 2 Total:",
-                              font=("Consolas", 10, "bold"),
-                              fg=self.colors['text_secondary'],
-                              bg=self.colors['bg_dark'])
-        week2_label.grid(row=current_row, column=0, padx=(10, 15), pady=4, sticky=tk.W)
+    def build_hours_rows(self):
+        """Table rows as tuples in HOURS_COLUMNS order, read from the engine's running totals"""
+        limits = self.unmet_limits()
+        return [self.hours_row(person, limits) for person in self.people]
+
+    def unmet_limits(self):
+        """{name: what keeps them below preferred hours} for everyone below (see ScheduleEngine.unmet_hours)"""
+        return {entry['name']: UNMET_LIMITS[entry['limit']] for entry in self.engine.unmet_hours()}
+
+    def hours_row(self, person, limits):
+        index = self.engine.index
+        total = index.total_hours[person.id]
+        return (person.name, index.week_hours[0][person.id], index.week_hours[1][person.id], total,
+                person.preferred_hours, person.agreed_hours, person.max_hours,
+                person.preferred_hours - total, limits.get(person.name, ""))
+
+    def hours_totals_text(self):
+        index = self.engine.index
+        week1_total, week2_total = index.week_totals
+        return (f"Week 1 Total: {week1_total:.1f}h    Week 2 Total: {week2_total:.1f}h    "
+                f"Total (2 Weeks): {index.total:.1f}h")
+
+    def update_hours_rows(self, person_ids):
+        """Refresh the hours of some people (after an edit) without rebuilding the panel"""
+        if self.hours_frame is None or not self.hours_rows:
+            return
+        limits = self.unmet_limits()
+        for person_id in person_ids:
+            self.hours_rows[person_id] = self.hours_row(self.people[person_id], limits)
+        # Anyone's limit can change with the shift fill
+        self.hours_rows = [row[:-1] + (limits.get(row[0], ""),) for row in self.hours_rows]
+        self.hours_totals_label.config(text=self.hours_totals_text())
+        self.refresh_hours_table()
+
+    def refresh_hours_table(self):
+        """Re-fill the table with the rows that pass the filters, in the current sort order"""
+        if not self.hours_rows:
+            return
+        search = self.hours_search.get().strip().lower()
+        keep = self.HOURS_FILTERS.get(self.hours_filter.get(), self.HOURS_FILTERS["All"])
+        column, descending = self.hours_sort
+        key_idx = [name for name, _, _ in self.HOURS_COLUMNS].index(column)
+
+        rows = [row for row in self.hours_rows
+                if keep(row) and (not search or search in row[0].lower())]
+        rows.sort(key=lambda row: (row[key_idx], row[0]), reverse=descending)
+
+        self.hours_table.delete(*self.hours_table.get_children())
+        for row in rows:
+            name, week1, week2, total, preferred, agreed, max_hours, deficit, limit = row
+            if total < agreed:
+                tag = 'below_agreed'
+            elif total < preferred:
+                tag = 'below_preferred'
+            else:
+                tag = 'ok'
+            self.hours_table.insert('', tk.END, tags=(tag,), values=(
+                name, f"{week1:.1f}h", f"{week2:.1f}h", f"{total:.1f}h",
+                f"{preferred:.1f}h", f"{agreed:.1f}h", f"{max_hours:.1f}h", f"{deficit:+.1f}h", limit))
+
+    def sort_hours_table(self, column):
+        """Sort by a column; clicking the same heading again reverses the order"""
+        current, descending = self.hours_sort
+        if column == current:
+            self.hours_sort = (column, not descending)
+        else:
+            # Text ascending, numbers largest first
+            self.hours_sort = (column, column != 'name')
+        self.refresh_hours_table()
 
-        week2_value = tk.Label(container, text=f"{week2_total:.1f}h",
-                              font=("Consolas", 10, "bold"),
-                              fg=self.colors['text_secondary'],
-                              bg=self.colors['bg_dark'])
-        week2_value.grid(row=current_row, column=1, padx=15, pady=4, sticky=tk.W)
-        current_row += 1
-
-        # Total (2 Weeks)
-        total_label = tk.Label(container, text="Total (2 Weeks):",
-                              font=("Consolas", 11, "bold"),
-                              fg=self.colors['accent'],
-                              bg=self.colors['bg_dark'])
-        total_label.grid(row=current_row, column=0, padx=(10, 15), pady=8, sticky=tk.W)
-
-        # Total hours value
-        total_value = tk.Label(container, text=f"{total_scheduled:.1f}h",
-                              font=("Consolas", 10, "bold"),
-                              fg=self.colors['accent_hover'],
-                              bg=self.colors['bg_dark'])
-        total_value.grid(row=current_row, column=1, padx=15, pady=8, sticky=tk.W)
 
-        # Update canvas size to fit content
-        self.hours_frame.update_idletasks()
-        self.update_hours_canvas_size()
+def print_startup_report(timings):
+    total = sum(timings.values())
+    parts = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    print(f"Startup: {parts} (total {total * 1000:.0f} ms)")
 
 
 def main():
+    parser = argparse.ArgumentParser(description="B2.0 Scheduling Tool")
+    parser.add_argument('--startup-report', action='store_true',
+                        help="Print how long each startup step took")
+    args = parser.parse_args()
+
+    # Startup steps: imports, Tk, building the UI, and the first draw
+    timings = {'imports': time.perf_counter() - IMPORT_STARTED}
+    started = time.perf_counter()
     root = tk.Tk()
+    timings['tk'] = time.perf_counter() - started
+
+    started = time.perf_counter()
     app = SchedulingTool(root)
+    timings['ui'] = time.perf_counter() - started
+
+    def first_draw_done():
+        timings['first_draw'] = time.perf_counter() - started
+        if args.startup_report or os.environ.get('B2_STARTUP_REPORT'):
+            print_startup_report(timings)
+
+    started = time.perf_counter()
+    root.after_idle(first_draw_done)
     root.mainloop()
 
 
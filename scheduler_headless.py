@@ -0,0 +1,658 @@
+"""
+Headless runner for the B2.0 Scheduling Tool
+
+Solve a roster and write the exports without opening the GUI:
+
+    python scheduler_headless.py roster.csv --desks 8 --target 270 --output-dir out
+
+Watch mode re-solves whenever the roster CSVs in a directory change
+(e.g. when the form system regenerates them):
+
+    python scheduler_headless.py --watch rosters/ --desks 8 --output-dir out
+
+All CSVs in the watched directory together form the roster. Only files
+whose size or modification time changed are re-parsed. Small changes
+keep the existing schedule and only re-schedule the people who were
+added or changed. Large changes (see --full-resolve-ratio) trigger a
+full solve.
+
+Season mode plans a whole term of consecutive 2-week periods:
+
+    python scheduler_headless.py --season season.json --output-dir out
+
+season.json lists the periods in order; anything not given per period
+comes from "defaults" and then from the command line options:
+
+    {
+        "defaults": {"desks": 8, "rigidity": 50, "variance": 1.0, "target": 270},
+        "periods": [
+            {"roster": "roster.csv", "week": 1},
+            {"roster": "roster.csv", "week": 3, "target": 250},
+            {"roster": "library.csv", "week": 1, "desks_per_day": [4, 4, 4, 4, 4, 4, 4, 4]}
+        ]
+    }
+
+Hours a person is short of (or over) their preferred hours carry over to
+their targets in the next periods they're on. Periods that share people
+have to be listed with increasing weeks. Periods whose rosters share nobody
+are independent and are solved concurrently in separate processes.
+
+Stop instead of solving when the total hours target can't be reached
+(prints the feasibility report and exits with code 2; in watch mode that
+roster change is skipped and watching goes on):
+
+    python scheduler_headless.py roster.csv --target 300 --stop-if-infeasible
+
+Check a saved or hand-edited schedule JSON against its roster (exit code 1
+if anything is wrong):
+
+    python scheduler_headless.py roster.csv --validate "B2.0 Schedule week 1.json"
+
+List what changed between two saved schedules (also written as CSV to
+the output directory):
+
+    python scheduler_headless.py --diff old.json new.json --output-dir out
+
+Typed desks (e.g. 2 intake desks per day) only take people with that
+qualification in the roster's "qualifications" column:
+
+    python scheduler_headless.py roster.csv --desks 8 --desk-types "intake:2, helpdesk:1"
+
+Minimum staffing per shift (every day, or one day with a roster day code)
+is filled before anyone gets extra hours; minimums that can't be reached
+are reported before solving:
+
+    python scheduler_headless.py roster.csv --min-staff "1300F:2, TH1 1300F:3"
+
+Explain how someone's schedule came about (records a decision trace while
+solving; repeat --explain for more people):
+
+    python scheduler_headless.py roster.csv --explain "Jane Doe"
+
+Tune how the solver scores shifts (see Objective in scheduling_engine.py;
+terms not given keep their default weight):
+
+    python scheduler_headless.py roster.csv --objective "consecutive_days:2, weekly_evenness:1"
+
+Keep rosters and schedules in an SQLite store (see schedule_store.py). The
+roster is stored as a period (roster name + week) and the schedule with it;
+hours owed from earlier periods in the store carry over to the targets.
+With --season, the store is where every period's roster is read from and
+where the carry-over comes from:
+
+    python scheduler_headless.py roster.csv --week 3 --store season.db
+    python scheduler_headless.py --season season.json --store season.db
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from scheduling_engine import (
+    DAY_NAMES, UNMET_LIMITS, DecisionTrace, Objective, Person, ScheduleEngine, ShiftTable, SolverStats,
+    diff_schedules, format_diff, format_violations,
+    load_roster_csv, parse_desk_types, parse_min_staff, write_diff_csv
+)
+from schedule_store import ScheduleStore
+
+
+def write_atomic(file_path, write):
+    """Write a file through a temporary file so readers never see a partial export"""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w', newline='') as f:
+        write(f)
+    os.replace(tmp_path, file_path)
+
+
+def write_exports(engine, output_dir, week_num, ics=False):
+    """Write the CSV export and the schedule JSON (and optionally the calendars), return the written paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    csv_path = os.path.join(output_dir, f"B2.0 Schedule week {week_num}.csv")
+    json_path = os.path.join(output_dir, f"B2.0 Schedule week {week_num}.json")
+    write_atomic(csv_path, lambda f: engine.write_csv(f, week_num))
+    write_atomic(json_path, lambda f: json.dump(engine.to_dict(), f, indent=2))
+    paths = [csv_path, json_path]
+    if ics:
+        ics_dir = os.path.join(output_dir, f"B2.0 Schedule week {week_num} calendars")
+        count = len(engine.write_ics_files(ics_dir, week_num))
+        paths.append(f"{ics_dir} ({count} calendars)")
+    return paths
+
+
+class RosterWatcher:
+    """
+    Tracks the roster CSVs in a directory by stat polling
+
+    files: {path: {'stamp': (mtime_ns, size), 'people': [Person]}}
+    """
+    def __init__(self, directory, shift_table):
+        self.directory = directory
+        self.shift_table = shift_table
+        self.files = {}
+
+    def scan(self):
+        """Re-parse changed files. Returns True if anything changed."""
+        current = {}
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.lower().endswith('.csv'):
+                stat = entry.stat()
+                current[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+        changed = False
+        for path in list(self.files):
+            if path not in current:
+                del self.files[path]
+                changed = True
+
+        for path, stamp in sorted(current.items()):
+            known = self.files.get(path)
+            if known is not None and known['stamp'] == stamp:
+                continue
+            try:
+                people = load_roster_csv(path, self.shift_table)
+            except (OSError, KeyError, ValueError) as e:
+                # Probably still being written; try again on the next poll
+                print(f"Skipping {os.path.basename(path)}: {e}")
+                continue
+            self.files[path] = {'stamp': stamp, 'people': people}
+            changed = True
+        return changed
+
+    def roster(self):
+        """All people across the watched files (a later file wins on duplicate names)"""
+        people = {}
+        for path in sorted(self.files):
+            for person in self.files[path]['people']:
+                people[person.name] = person
+        return list(people.values())
+
+
+def diff_rosters(old_people, new_people):
+    """Return (added, removed, changed) sets of names between two rosters"""
+    old = {person.name: person for person in old_people}
+    new = {person.name: person for person in new_people}
+    added = set(new) - set(old)
+    removed = set(old) - set(new)
+    changed = {name for name in set(old) & set(new) if old[name] != new[name]}
+    return added, removed, changed
+
+
+def load_season(file_path, args, shift_table):
+    """
+    Read a season file and resolve every period's parameters
+
+    Returns [{'roster', 'week', 'desks_per_day', 'rigidity', 'variance', 'target', 'phase1',
+    'desk_types', 'min_staff', 'objective'}] in file order. Roster paths are relative to
+    the season file. Desk types may be given as {"intake": 2} or as "intake:2"; minimum
+    staffing as {"1300F": 2} or as "1300F:2" (checked against shift_table here, so a bad
+    entry stops the season before anything runs); objective weights as
+    {"consecutive_days": 2} or as "consecutive_days:2".
+    """
+    with open(file_path, 'r') as f:
+        season = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(file_path))
+    defaults = {'desks': args.desks, 'rigidity': args.rigidity, 'variance': args.variance,
+                'target': args.target, 'week': args.week, 'phase1': args.phase1,
+                'desk_types': args.desk_types, 'min_staff': args.min_staff, 'objective': args.objective}
+    defaults.update(season.get('defaults', {}))
+
+    periods = []
+    for idx, entry in enumerate(season.get('periods', [])):
+        settings = dict(defaults)
+        settings.update(entry)
+        if 'roster' not in settings:
+            raise ValueError(f"Season period {idx + 1} has no roster")
+        desks = settings.get('desks_per_day') or [settings['desks']] * len(DAY_NAMES)
+        if len(desks) != len(DAY_NAMES):
+            raise ValueError(f"Season period {idx + 1}: desks_per_day needs {len(DAY_NAMES)} values")
+        min_staff = settings['min_staff'] or ''
+        if isinstance(min_staff, dict):
+            min_staff = ", ".join(f"{key}:{int(count)}" for key, count in min_staff.items())
+        objective = settings['objective'] or {}
+        if isinstance(objective, str):
+            objective = Objective.parse(objective)
+        else:
+            objective = Objective(objective)
+        periods.append({
+            'roster': os.path.join(base_dir, settings['roster']),
+            'week': int(settings['week']),
+            'desks_per_day': [int(d) for d in desks],
+            'rigidity': int(settings['rigidity']),
+            'variance': float(settings['variance']),
+            'target': int(settings['target']),
+            'phase1': settings['phase1'],
+            'desk_types': parse_desk_types(settings['desk_types']),
+            'min_staff': parse_min_staff(min_staff, shift_table),
+            'objective': objective.changed_weights()
+        })
+    if not periods:
+        raise ValueError("Season file has no periods")
+    return periods
+
+
+def season_chains(roster_names):
+    """
+    Split the periods into chains that have to run in order
+
+    Periods are linked when their rosters share a person (carry-over flows
+    through them); unlinked chains can be solved at the same time. Each
+    chain keeps the file order. roster_names: the names on each period's roster
+    """
+    parent = list(range(len(roster_names)))
+
+    def find(idx):
+        while parent[idx] != idx:
+            parent[idx] = parent[parent[idx]]
+            idx = parent[idx]
+        return idx
+
+    first_period_of = {}  # {name: period idx}
+    for idx, names in enumerate(roster_names):
+        for name in names:
+            other = first_period_of.setdefault(name, idx)
+            parent[find(idx)] = find(other)
+
+    chains = {}
+    for idx in range(len(roster_names)):
+        chains.setdefault(find(idx), []).append(idx)
+    return list(chains.values())
+
+
+def carried_roster(people, carry):
+    """
+    Copies of the roster with carry-over added to preferred and agreed hours
+
+    carry: {name: hours owed (positive) or ahead (negative)}. Targets stay
+    between 0 and the person's max hours.
+    """
+    adjusted = []
+    for person in people:
+        owed = carry.get(person.name, 0)
+        adjusted.append(Person(person.name,
+                               min(person.max_hours, max(0, person.agreed_hours + owed)),
+                               person.max_hours,
+                               min(person.max_hours, max(0, person.preferred_hours + owed)),
+                               person.availability,
+                               qualifications=person.qualifications))
+    return adjusted
+
+
+def period_label(roster_path):
+    """Name of a roster's periods in the exports and the store: the file name without extension"""
+    return os.path.splitext(os.path.basename(roster_path))[0]
+
+
+def run_season_chain(periods, shifts_path, output_dir, ics=False, store_path=None):
+    """
+    Solve one chain of periods in order, carrying hours over between them
+
+    Runs in a worker process. Exports of a period are written on a thread
+    while the next period is solved. The carry-over is everyone's running
+    balance: preferred minus scheduled hours, summed over their earlier
+    periods (the adjusted targets don't feed back into it). With a store,
+    every period's roster is read from the store (see run_season), the
+    balance comes from the store's earlier weeks (ScheduleStore.hours_owed,
+    the same sum) and the schedules are saved to it. Returns (period results,
+    final carry).
+    """
+    shift_table = ShiftTable.load(shifts_path) if shifts_path else ShiftTable.load()
+    store = ScheduleStore(store_path) if store_path else None
+    carry = {}
+    results = []
+    writes = []
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for period in periods:
+            started = time.perf_counter()
+            if store:
+                roster = store.load_roster(period['period_id'], shift_table)
+                people = carried_roster(roster, store.hours_owed(period['period_id']))
+            else:
+                roster = load_roster_csv(period['roster'], shift_table)
+                people = carried_roster(roster, carry)
+            engine = ScheduleEngine(people, shift_table)
+            desks_per_day = dict(zip(DAY_NAMES, period['desks_per_day']))
+            feasibility = engine.analyze_feasibility(desks_per_day, period['variance'], period['target'])
+            engine.solve(desks_per_day, period['rigidity'], period['variance'], period['target'], period['phase1'],
+                         period['desk_types'], period['min_staff'], period['objective'])
+
+            if store:
+                store.save_schedule(period['period_id'], engine)
+
+            # Whatever this period left them short of (or over) their own preferred hours adds up
+            for person, adjusted in zip(roster, people):
+                carry[person.name] = (carry.get(person.name, 0) + person.preferred_hours -
+                                      engine.hours_scheduled[adjusted.id])
+            period_dir = os.path.join(output_dir, f"{period_label(period['roster'])} week {period['week']}")
+            writes.append(writer.submit(write_exports, engine, period_dir, period['week'], ics))
+            results.append({
+                'roster': period['roster'],
+                'week': period['week'],
+                'people': len(people),
+                'target_hours': period['target'],
+                'target_reachable': feasibility['feasible'],
+                'upper_bound_hours': feasibility['upper_bound_hours'],
+                'scheduled_hours': engine.index.total,
+                'below_preferred_hours': engine.index.below_preferred,
+                'understaffed_shifts': len(engine.staffing_shortfalls()),
+                'output_dir': period_dir,
+                'seconds': time.perf_counter() - started
+            })
+        for future in writes:
+            future.result()
+    if store:
+        owed = store.hours_owed()
+        carry = {name: owed.get(name, 0) for name in carry}
+        store.close()
+    return results, carry
+
+
+def run_season(args):
+    """Plan every period of a season and write a summary; returns the summary dict"""
+    started = time.perf_counter()
+    shift_table = ShiftTable.load(args.shifts) if args.shifts else ShiftTable.load()
+    periods = load_season(args.season, args, shift_table)
+    names = {path: [person.name for person in load_roster_csv(path, shift_table)]
+             for path in {p['roster'] for p in periods}}
+    chains = season_chains([names[period['roster']] for period in periods])
+
+    # Carry-over runs in file order, the store's in week order: they have to agree
+    for chain in chains:
+        for earlier, later in zip(chain, chain[1:]):
+            if periods[later]['week'] <= periods[earlier]['week']:
+                raise ValueError(
+                    f"Season periods that share people need increasing weeks: "
+                    f"{os.path.basename(periods[later]['roster'])} week {periods[later]['week']} comes after "
+                    f"{os.path.basename(periods[earlier]['roster'])} week {periods[earlier]['week']}")
+
+    if args.store:
+        # Import every period's roster up front; the workers read them back from the store
+        with ScheduleStore(args.store) as store:
+            for period in periods:
+                period['period_id'] = store.import_roster_csv(period['roster'], period_label(period['roster']),
+                                                              period['week'], shift_table)
+
+    workers = min(len(chains), os.cpu_count() or 1)
+    print(f"Season: {len(periods)} periods in {len(chains)} independent chain(s), {workers} worker(s)")
+    chain_periods = [[periods[idx] for idx in chain] for chain in chains]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            outcomes = list(executor.map(run_season_chain, chain_periods,
+                                         [args.shifts] * len(chains), [args.output_dir] * len(chains),
+                                         [args.ics] * len(chains), [args.store] * len(chains)))
+    else:
+        outcomes = [run_season_chain(chain, args.shifts, args.output_dir, args.ics, args.store)
+                    for chain in chain_periods]
+
+    results = [None] * len(periods)
+    final_carry = {}
+    for chain, (chain_results, carry) in zip(chains, outcomes):
+        for idx, result in zip(chain, chain_results):
+            results[idx] = result
+        final_carry.update(carry)
+
+    for result in results:
+        unreachable = ("" if result['target_reachable'] else
+                       f" - warning: target not reachable (at most {result['upper_bound_hours']:.1f}h)")
+        print(f"  {os.path.basename(result['roster'])} week {result['week']}: "
+              f"{result['scheduled_hours']:.1f}h / {result['target_hours']}h target, "
+              f"{result['below_preferred_hours']:.1f}h below preferred ({result['seconds']:.2f}s){unreachable}")
+
+    owed = {name: hours for name, hours in final_carry.items() if hours}
+    summary = {
+        'periods': results,
+        'carry_over': owed,
+        'total_seconds': time.perf_counter() - started
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_atomic(os.path.join(args.output_dir, "B2.0 season summary.json"),
+                 lambda f: json.dump(summary, f, indent=2))
+    print(f"Carry-over after the last period: {sum(h for h in owed.values() if h > 0):.1f}h owed, "
+          f"{-sum(h for h in owed.values() if h < 0):.1f}h ahead")
+    print(f"Season planned in {summary['total_seconds']:.2f}s")
+    return summary
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Solve B2.0 schedules without the GUI")
+    parser.add_argument('rosters', nargs='*', help="Roster CSV file(s)")
+    parser.add_argument('--watch', metavar='DIR', help="Watch a directory of roster CSVs and re-solve on changes")
+    parser.add_argument('--season', metavar='FILE', help="Plan all periods of a season file (see above)")
+    parser.add_argument('--interval', type=float, default=2.0, help="Watch polling interval in seconds (default: 2)")
+    parser.add_argument('--full-resolve-ratio', type=float, default=0.25,
+                        help="Re-solve from scratch when more than this share of people changed (default: 0.25)")
+    parser.add_argument('--shifts', help="Shift definitions file (default: shifts.json)")
+    parser.add_argument('--desks', type=int, default=8, help="Desks per day (default: 8)")
+    parser.add_argument('--desks-per-day', type=int, nargs=len(DAY_NAMES), metavar='N',
+                        help="Desks for each of the 8 days (overrides --desks)")
+    parser.add_argument('--rigidity', type=int, default=50, help="Shift preference rigidity 0-100 (default: 50)")
+    parser.add_argument('--variance', type=float, default=1.0, help="Weekly hour variance (default: 1.0)")
+    parser.add_argument('--target', type=int, default=270, help="Total hours target (default: 270)")
+    parser.add_argument('--phase1', choices=('greedy', 'matching'), default='greedy',
+                        help="How the first shift per person is given out (default: greedy)")
+    parser.add_argument('--desk-types', type=parse_desk_types, default={}, metavar='TEXT',
+                        help="Typed desks per day, e.g. 'intake:2, helpdesk:1' (default: none)")
+    parser.add_argument('--min-staff', default='', metavar='TEXT',
+                        help="Minimum people per shift, e.g. '1300F:2, TH1 1300F:3' (default: none)")
+    parser.add_argument('--objective', default='', metavar='TEXT',
+                        help="Objective weights, e.g. 'consecutive_days:2, weekly_evenness:1' (default: the solver's)")
+    parser.add_argument('--week', type=int, default=1, help="Week number (default: 1)")
+    parser.add_argument('--store', metavar='DB',
+                        help="SQLite store to keep rosters and schedules in and take carry-over from (see above)")
+    parser.add_argument('--output-dir', default='.', help="Where to write the exports (default: current directory)")
+    parser.add_argument('--ics', action='store_true', help="Also write one .ics calendar per person")
+    parser.add_argument('--stats', action='store_true', help="Print solver timing stats as JSON")
+    parser.add_argument('--explain', action='append', default=[], metavar='NAME',
+                        help="Print the solver's decisions for a person (can be repeated)")
+    parser.add_argument('--stop-if-infeasible', action='store_true',
+                        help="Don't solve if the target can't be reached; print the report and exit with code 2")
+    parser.add_argument('--validate', metavar='FILE',
+                        help="Check a saved schedule JSON against the roster instead of solving")
+    parser.add_argument('--diff', nargs=2, metavar=('OLD', 'NEW'),
+                        help="List what changed between two saved schedule JSONs")
+    args = parser.parse_args(argv)
+    if not args.rosters and not args.watch and not args.season and not args.diff:
+        parser.error("give roster CSV file(s), --watch DIR or --season FILE")
+    if args.validate and not args.rosters:
+        parser.error("--validate needs the roster CSV file(s) of the schedule")
+    if args.stop_if_infeasible and args.season:
+        parser.error("--stop-if-infeasible doesn't work with --season (the summary flags unreachable targets)")
+    if args.store and (args.watch or args.validate or args.diff):
+        parser.error("--store works with roster CSV file(s) or --season")
+    return args
+
+
+class InfeasibleTarget(Exception):
+    """The total hours target can't be reached and --stop-if-infeasible is set"""
+
+
+class HeadlessRunner:
+    def __init__(self, args):
+        self.args = args
+        self.shift_table = ShiftTable.load(args.shifts) if args.shifts else ShiftTable.load()
+        desks = args.desks_per_day or [args.desks] * len(DAY_NAMES)
+        self.desks_per_day = dict(zip(DAY_NAMES, desks))
+        self.min_staff = parse_min_staff(args.min_staff, self.shift_table)
+        self.objective = Objective.parse(args.objective).changed_weights()
+        self.stats = SolverStats(enabled=args.stats)
+        self.trace = DecisionTrace(enabled=bool(args.explain))
+        self.engine = None
+
+    def solve_params(self):
+        return (self.desks_per_day, self.args.rigidity, self.args.variance, self.args.target, self.args.phase1,
+                self.args.desk_types, self.min_staff, self.objective)
+
+    def check_targets(self, people):
+        """
+        Report what the roster can't reach before solving
+
+        Prints the warnings; with --stop-if-infeasible an unreachable hours
+        target raises InfeasibleTarget instead. Works on copies of the people:
+        another engine would renumber them, and the current one (kept when
+        the solve is skipped) still needs their ids.
+        """
+        engine = ScheduleEngine([Person(person.name, person.agreed_hours, person.max_hours, person.preferred_hours,
+                                        person.availability, qualifications=person.qualifications)
+                                 for person in people], self.shift_table)
+        report = engine.analyze_feasibility(self.desks_per_day, self.args.variance, self.args.target)
+        if not report['feasible']:
+            message = "total hours target is not reachable\n" + engine.format_feasibility_report(report)
+            if self.args.stop_if_infeasible:
+                raise InfeasibleTarget(message)
+            print("Warning: " + message)
+        shortfalls = engine.analyze_staffing(self.desks_per_day, self.min_staff)
+        if shortfalls:
+            print("Warning: minimum staffing is not reachable\n" + engine.format_staffing_report(shortfalls))
+
+    def full_solve(self, people):
+        self.check_targets(people)
+        self.stats.reset()
+        self.engine = ScheduleEngine(people, self.shift_table, self.stats, self.trace)
+        self.engine.solve(*self.solve_params())
+
+    def incremental_solve(self, people):
+        """Re-solve only what the roster change affects; returns False if a full solve was done"""
+        added, removed, changed = diff_rosters(self.engine.people, people)
+        affected = len(added) + len(removed) + len(changed)
+        if affected > self.args.full_resolve_ratio * max(len(people), 1):
+            print(f"{affected} people changed, re-solving from scratch")
+            self.full_solve(people)
+            return False
+
+        print(f"Roster change: {len(added)} added, {len(removed)} removed, {len(changed)} changed")
+        self.check_targets(people)
+        self.stats.reset()
+        self.engine.update_roster(people, changed)
+        self.engine.resolve(*self.solve_params())
+        return True
+
+    def report(self):
+        paths = write_exports(self.engine, self.args.output_dir, self.args.week, self.args.ics)
+        total = self.engine.index.total
+        print(f"{len(self.engine.people)} people, {total:.1f}h scheduled -> {', '.join(paths)}")
+        pruning = self.engine.prune_report
+        if pruning:
+            print(f"Pre-pruning removed {pruning['pruned_fraction']:.0%} of {pruning['options']} "
+                  f"(person, day, combo) options")
+        shortfalls = self.engine.staffing_shortfalls()
+        if shortfalls:
+            print(f"{len(shortfalls)} shift(s) below minimum staffing:\n" +
+                  self.engine.format_staffing_report(shortfalls))
+        unmet = self.engine.unmet_hours()
+        if unmet:
+            counts = {}
+            for entry in unmet:
+                counts[entry['limit']] = counts.get(entry['limit'], 0) + 1
+            print(f"{len(unmet)} people below preferred hours: " +
+                  ", ".join(f"{count} {UNMET_LIMITS[limit]}" for limit, count in counts.items()))
+            print(self.engine.format_unmet_hours(unmet, limit=10))
+        for name in self.args.explain:
+            if name in self.engine.name_to_id:
+                print(self.engine.explain(self.engine.name_to_id[name]))
+            else:
+                print(f"{name} is not in the roster")
+        if self.args.stats:
+            print(json.dumps(self.stats.to_dict(), indent=2))
+
+    def load_rosters(self):
+        people = {}
+        for path in self.args.rosters:
+            for person in load_roster_csv(path, self.shift_table):
+                people[person.name] = person
+        return list(people.values())
+
+    def run_once(self):
+        if not self.args.store:
+            self.full_solve(self.load_rosters())
+            self.report()
+            return
+
+        label = "+".join(period_label(path) for path in self.args.rosters)
+        roster = self.load_rosters()
+        with ScheduleStore(self.args.store) as store:
+            names = {person.name for person in roster}
+            owed = {name: hours for name, hours in store.hours_owed(before_week=self.args.week).items()
+                    if name in names}
+            if any(owed.values()):
+                print(f"Carry-over from {self.args.store}: {sum(h for h in owed.values() if h > 0):.1f}h owed, "
+                      f"{-sum(h for h in owed.values() if h < 0):.1f}h ahead")
+            # Stored only once solved: a stopped solve (--stop-if-infeasible) keeps the earlier version
+            self.full_solve(carried_roster(roster, owed))
+            store.save_schedule(store.add_period(label, self.args.week, self.shift_table, roster), self.engine)
+        self.report()
+        print(f"Stored as {label} week {self.args.week} in {self.args.store}")
+
+    def diff(self):
+        """Print and write the changes between two saved schedules"""
+        old_path, new_path = self.args.diff
+        with open(old_path) as f:
+            old = json.load(f)['schedule']
+        with open(new_path) as f:
+            new = json.load(f)['schedule']
+        diff = diff_schedules(old, new, self.shift_table)
+        print(format_diff(diff))
+        os.makedirs(self.args.output_dir, exist_ok=True)
+        csv_path = os.path.join(self.args.output_dir, "B2.0 Schedule changes.csv")
+        write_atomic(csv_path, lambda f: write_diff_csv(f, diff))
+        print(f"-> {csv_path}")
+
+    def validate(self):
+        """Check a saved schedule; returns the exit code (1 if there are violations)"""
+        with open(self.args.validate) as f:
+            data = json.load(f)
+        self.engine = ScheduleEngine(self.load_rosters(), self.shift_table, self.stats)
+        violations = self.engine.load_schedule(data)
+        if not violations:
+            print(f"{self.args.validate}: OK ({self.engine.index.total:.1f}h scheduled)")
+            return 0
+        print(f"{self.args.validate}: {len(violations)} problem(s)\n{format_violations(violations)}")
+        return 1
+
+    def watch(self):
+        watcher = RosterWatcher(self.args.watch, self.shift_table)
+        print(f"Watching {self.args.watch} (Ctrl+C to stop)")
+        while True:
+            if watcher.scan():
+                people = watcher.roster()
+                try:
+                    if self.engine is None:
+                        self.full_solve(people)
+                    else:
+                        self.incremental_solve(people)
+                except InfeasibleTarget as e:
+                    print(f"Not solved: {e}")
+                else:
+                    self.report()
+            time.sleep(self.args.interval)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        runner = HeadlessRunner(args)
+        if args.validate:
+            return runner.validate()
+        if args.diff:
+            runner.diff()
+            return 0
+        if args.season:
+            run_season(args)
+        elif args.watch:
+            runner.watch()
+        else:
+            runner.run_once()
+    except KeyboardInterrupt:
+        pass
+    except InfeasibleTarget as e:
+        print(f"Stopped: {e}")
+        return 2
+    except (OSError, KeyError, ValueError, sqlite3.Error) as e:
+        print(f"Error: {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
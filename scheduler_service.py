@@ -0,0 +1,282 @@
+"""
+Local HTTP/JSON scheduling service
+
+Lets one machine do the solving for several coordinators. Solves run in a
+bounded pool of worker processes; identical requests are answered from a
+result cache (or share the solve that's already running).
+
+    python scheduler_service.py --port 8765 --workers 2
+
+Endpoints:
+    GET  /health    {"status": "ok", "workers": 2, "pending": 0, "cached": 3}
+    POST /solve     schedule JSON, or the CSV export with "format": "csv"
+
+Request body for /solve:
+    {
+        "roster_csv": "<contents of the roster CSV>",
+        "desks": 8,                             (or "desks_per_day": {"Monday (Week 1)": 8, ...})
+        "rigidity": 50,
+        "weekly_variance": 1.0,
+        "total_hours_target": 270,
+        "week_number": 1,
+        "format": "json",                       ("json" or "csv")
+        "stop_if_infeasible": false,            (true: return 422 with the report instead of solving)
+        "phase1": "greedy",                     ("greedy" or "matching")
+        "desk_types": {"intake": 2},            (optional, typed desks per day)
+        "min_staff": {"1300F": 2, "TH1 1300F": 3},
+                                                (optional, minimum people per shift; or "1300F:2")
+        "explain": ["Jane Doe"],                (optional, adds "explanations" of their schedules)
+        "objective": {"consecutive_days": 2},   (optional, objective weights, see Objective)
+        "shifts": {...}                         (optional, same format as shifts.json)
+    }
+"""
+import argparse
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from scheduling_engine import (
+    DAY_NAMES, DecisionTrace, Objective, ScheduleEngine, ShiftTable, SolverStats, load_roster, parse_desk_types,
+    parse_min_staff
+)
+
+DEFAULT_PORT = 8765
+
+
+def normalize_request(payload):
+    """Validate a /solve body and fill in defaults. Raises ValueError on bad input."""
+    if not isinstance(payload, dict):
+        raise ValueError("Request body must be a JSON object")
+    if not isinstance(payload.get('roster_csv'), str) or not payload['roster_csv'].strip():
+        raise ValueError("'roster_csv' is required")
+
+    try:
+        min_staff = payload.get('min_staff') or ''
+        if isinstance(min_staff, dict):
+            # Checked against the shifts by parse_min_staff when the request is solved
+            min_staff = ", ".join(f"{key}:{int(count)}" for key, count in min_staff.items())
+        if 'desks_per_day' in payload:
+            desks_per_day = {day: int(payload['desks_per_day'][day]) for day in DAY_NAMES}
+        else:
+            desks = int(payload.get('desks', 8))
+            desks_per_day = {day: desks for day in DAY_NAMES}
+
+        request = {
+            'roster_csv': payload['roster_csv'],
+            'desks_per_day': desks_per_day,
+            'rigidity': int(payload.get('rigidity', 50)),
+            'weekly_variance': float(payload.get('weekly_variance', 1.0)),
+            'total_hours_target': int(payload.get('total_hours_target', 270)),
+            'week_number': int(payload.get('week_number', 1)),
+            'format': payload.get('format', 'json'),
+            'stop_if_infeasible': bool(payload.get('stop_if_infeasible', False)),
+            'phase1': payload.get('phase1', 'greedy'),
+            'shifts': payload.get('shifts'),
+            'desk_types': parse_desk_types(payload.get('desk_types') or {}),
+            'min_staff': str(min_staff),
+            'explain': [str(name) for name in payload.get('explain') or []],
+            'objective': Objective(payload.get('objective')).changed_weights()
+        }
+    except KeyError as e:
+        raise ValueError(f"Missing desks for {e}")
+    except (AttributeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid parameter: {e}")
+
+    if request['format'] not in ('json', 'csv'):
+        raise ValueError("'format' must be 'json' or 'csv'")
+    if request['phase1'] not in ('greedy', 'matching'):
+        raise ValueError("'phase1' must be 'greedy' or 'matching'")
+    return request
+
+
+def request_key(request):
+    """Cache key: hash of the canonical request"""
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def run_solve(request):
+    """
+    Solve one normalized request (runs in a worker process)
+
+    Returns (http_status, content_type, body_text).
+    """
+    try:
+        shift_table = ShiftTable(request['shifts']) if request['shifts'] else ShiftTable.load()
+        people = load_roster(io.StringIO(request['roster_csv']), shift_table)
+        min_staff = parse_min_staff(request['min_staff'], shift_table)
+    except (AttributeError, KeyError, TypeError, ValueError) as e:
+        return 400, 'application/json', json.dumps({'error': f"Invalid roster, shifts or minimum staffing: {e}"})
+
+    stats = SolverStats(enabled=True)
+    engine = ScheduleEngine(people, shift_table, stats, DecisionTrace(enabled=bool(request['explain'])))
+
+    report = engine.analyze_feasibility(request['desks_per_day'], request['weekly_variance'],
+                                        request['total_hours_target'])
+    if not report['feasible'] and request['stop_if_infeasible']:
+        return 422, 'application/json', json.dumps({
+            'error': "Total hours target is not reachable",
+            'feasibility': report,
+            'report': engine.format_feasibility_report(report)
+        })
+
+    engine.solve(request['desks_per_day'], request['rigidity'],
+                 request['weekly_variance'], request['total_hours_target'], request['phase1'],
+                 request['desk_types'], min_staff, request['objective'])
+
+    if request['format'] == 'csv':
+        output = io.StringIO()
+        engine.write_csv(output, request['week_number'])
+        return 200, 'text/csv', output.getvalue()
+
+    result = engine.to_dict()
+    result['feasibility'] = report
+    result['staffing'] = engine.analyze_staffing(request['desks_per_day'], min_staff)
+    result['stats'] = stats.to_dict()
+    if request['explain']:
+        result['explanations'] = {name: engine.explain(engine.name_to_id[name]) if name in engine.name_to_id
+                                  else f"{name} is not in the roster"
+                                  for name in request['explain']}
+    return 200, 'application/json', json.dumps(result)
+
+
+class SchedulingService:
+    """Bounded worker pool with a result cache and in-flight request sharing"""
+    def __init__(self, workers=2, max_pending=16, cache_size=64, timeout=120):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.lock = threading.Lock()
+        self.cache = OrderedDict()  # {key: (status, content_type, body)} in LRU order
+        self.in_flight = {}  # {key: Future}
+
+    def status(self):
+        with self.lock:
+            return {
+                'status': 'ok',
+                'workers': self.workers,
+                'pending': len(self.in_flight),
+                'max_pending': self.max_pending,
+                'cached': len(self.cache)
+            }
+
+    def submit(self, request):
+        """Solve a normalized request, using the cache when possible"""
+        key = request_key(request)
+        with self.lock:
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+
+            future = self.in_flight.get(key)
+            started = future is None
+            if started:
+                if len(self.in_flight) >= self.max_pending:
+                    return 503, 'application/json', json.dumps({'error': "Solve queue is full, try again later"})
+                future = self.executor.submit(run_solve, request)
+                self.in_flight[key] = future
+
+        if started:
+            # Outside the lock: a solve that's already done runs _finish right here, and that takes the lock
+            future.add_done_callback(lambda done, key=key: self._finish(key, done))
+
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            return 504, 'application/json', json.dumps({'error': "Solve timed out"})
+        except Exception as e:
+            return 500, 'application/json', json.dumps({'error': f"Solve failed: {e}"})
+
+    def _finish(self, key, future):
+        with self.lock:
+            self.in_flight.pop(key, None)
+            if future.cancelled() or future.exception() is not None:
+                return
+            result = future.result()
+            # Only successful solves are cached
+            if result[0] == 200 and self.cache_size > 0:
+                self.cache[key] = result
+                self.cache.move_to_end(key)
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ServiceRequestHandler(BaseHTTPRequestHandler):
+    service = None  # Set by make_server
+    max_body_bytes = 20 * 1024 * 1024
+
+    def do_GET(self):
+        if self.path == '/health':
+            self.send_body(200, 'application/json', json.dumps(self.service.status()))
+        else:
+            self.send_body(404, 'application/json', json.dumps({'error': "Not found"}))
+
+    def do_POST(self):
+        if self.path != '/solve':
+            self.send_body(404, 'application/json', json.dumps({'error': "Not found"}))
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            if length > self.max_body_bytes:
+                self.send_body(413, 'application/json', json.dumps({'error': "Request too large"}))
+                return
+            payload = json.loads(self.rfile.read(length) or b'null')
+            request = normalize_request(payload)
+        except (ValueError, json.JSONDecodeError) as e:
+            self.send_body(400, 'application/json', json.dumps({'error': str(e)}))
+            return
+
+        status, content_type, body = self.service.submit(request)
+        self.send_body(status, content_type, body)
+
+    def send_body(self, status, content_type, body):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f"{content_type}; charset=utf-8")
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def make_server(host, port, service):
+    handler = type('BoundRequestHandler', (ServiceRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="B2.0 scheduling service (local HTTP/JSON)")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port (default: {DEFAULT_PORT})")
+    parser.add_argument('--workers', type=int, default=2, help="Solver processes (default: 2)")
+    parser.add_argument('--max-pending', type=int, default=16,
+                        help="Max queued + running solves before new ones are refused (default: 16)")
+    parser.add_argument('--cache-size', type=int, default=64, help="Cached results (default: 64)")
+    parser.add_argument('--timeout', type=float, default=120, help="Seconds to wait for a solve (default: 120)")
+    args = parser.parse_args()
+
+    service = SchedulingService(args.workers, args.max_pending, args.cache_size, args.timeout)
+    server = make_server(args.host, args.port, service)
+    print(f"B2.0 scheduling service on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    main()
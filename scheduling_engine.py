@@ -0,0 +1,2733 @@
+"""
+Scheduling engine for the B2.0 Scheduling Tool
+
+Everything needed to load a roster and solve a schedule without a GUI:
+shift definitions, the feasibility check, the greedy solver and CSV export.
+Used by scheduler.py (desktop app) and scheduler_service.py (HTTP service).
+"""
+import csv
+import heapq
+import json
+import os
+import re
+import time
+from array import array
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+# 2 weeks = 8 days (Mon-Thu, Week 1 and Week 2)
+DAYS = ["M1", "TU1", "W1", "TH1", "M2", "TU2", "W2", "TH2"]
+DAY_NAMES = [
+    "Monday (Week 1)", "Tuesday (Week 1)", "Wednesday (Week 1)", "Thursday (Week 1)",
+    "Monday (Week 2)", "Tuesday (Week 2)", "Wednesday (Week 2)", "Thursday (Week 2)"
+]
+
+class SolverStats:
+    """Collect per-phase wall times and solver counters.
+
+    When disabled, start() returns 0 and stop() returns immediately, so the
+    instrumentation points can stay in the code at almost no cost. Hot loops
+    should check `enabled` once and skip counting altogether.
+    """
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        """Clear all collected timings and counters"""
+        self.timings = {}  # {section: {'seconds': float, 'calls': int}}
+        self.counters = defaultdict(int)  # {counter_name: count}
+        self.rejections = defaultdict(int)  # {constraint_name: rejected candidates}
+
+    def start(self):
+        """Return a start timestamp (0 when disabled)"""
+        if not self.enabled:
+            return 0
+        return time.perf_counter()
+
+    def stop(self, section, started):
+        """Add the time since `started` to a section"""
+        if not self.enabled:
+            return
+        elapsed = time.perf_counter() - started
+        entry = self.timings.setdefault(section, {'seconds': 0.0, 'calls': 0})
+        entry['seconds'] += elapsed
+        entry['calls'] += 1
+
+    def to_dict(self):
+        """Return all collected data as a JSON-serialisable dict"""
+        return {
+            'enabled': self.enabled,
+            'timings': {name: dict(entry) for name, entry in self.timings.items()},
+            'counters': dict(self.counters),
+            'rejections': dict(self.rejections)
+        }
+
+    def dump_json(self, file_path):
+        """Write the collected data to a JSON file"""
+        with open(file_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+class DecisionTrace:
+    """
+    Optional record of the solver's decisions, to explain a schedule afterwards
+
+    Every call of find_best_available_shift_combo (and every assignment made
+    by the phase-1 matching or the minimum-staffing pass) adds a record to a
+    ring buffer that keeps the last `limit` decisions: the person, the phase,
+    the chosen day and shifts with their hours and score, how many candidates
+    were still open and the options ruled out so far by reason. removed keeps
+    why each person's options dropped out of their candidate list, per day,
+    so "why not Tuesday?" can be answered even for a day no call got to.
+
+    Like SolverStats it's off by default, and the solver checks `enabled`
+    once per call and records nothing otherwise.
+    """
+    def __init__(self, enabled=False, limit=20000):
+        self.enabled = enabled
+        self.limit = limit
+        self.reset()
+
+    def reset(self):
+        """Forget all recorded decisions"""
+        self.records = deque(maxlen=self.limit)
+        self.removed = defaultdict(lambda: defaultdict(int))  # {person_id: {(day_idx, reason): options}}
+        self.last = {}  # {person_id: their latest record}
+        self.steps = 0  # Decisions recorded so far, including those the buffer dropped
+
+    def remove(self, person_id, day_idx, reason, count=1):
+        """Note that a person's options on a day were ruled out for a reason"""
+        self.removed[person_id][(day_idx, reason)] += count
+
+    def record(self, person_id, mode, choice, score, open_candidates, rejected):
+        """
+        Add one decision. choice is the chosen combo dict (or None), rejected
+        the call's own rejections {reason: candidates}. Finding nothing again
+        for the same reasons (the solver retries people) only counts up the
+        repeats of the person's previous record.
+        """
+        ruled_out = defaultdict(int, rejected)
+        for (_, reason), count in self.removed.get(person_id, {}).items():
+            ruled_out[reason] += count
+        ruled_out = dict(ruled_out)
+
+        last = self.last.get(person_id)
+        if (choice is None and last is not None and last['shifts'] is None and last['mode'] == mode and
+                last['open_candidates'] == open_candidates and last['rejected'] == ruled_out):
+            last['repeats'] += 1
+            return
+
+        self.steps += 1
+        entry = {
+            'step': self.steps,
+            'person_id': person_id,
+            'mode': mode,
+            'day_idx': choice['day_idx'] if choice else None,
+            'shifts': list(choice['shifts']) if choice else None,
+            'hours': choice['hours'] if choice else 0,
+            'score': score if choice else None,
+            'open_candidates': open_candidates,
+            'rejected': ruled_out,
+            'repeats': 1
+        }
+        self.records.append(entry)
+        self.last[person_id] = entry
+
+    def for_person(self, person_id):
+        """A person's decisions still in the buffer, oldest first"""
+        return [entry for entry in self.records if entry['person_id'] == person_id]
+
+    def removed_for(self, person_id, day_idx=None):
+        """Options of a person ruled out by reason, for one day or all days"""
+        totals = defaultdict(int)
+        for (removed_day, reason), count in self.removed.get(person_id, {}).items():
+            if day_idx is None or removed_day == day_idx:
+                totals[reason] += count
+        return dict(totals)
+
+# Shift definitions live in shifts.json next to this file; these are used if it's missing
+SHIFT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "shifts.json")
+DEFAULT_SHIFT_CONFIG = {
+    "shifts": [
+        {"code": "0930", "start": "9:30", "end": "12:30"},
+        {"code": "1030", "start": "10:30", "end": "12:30"},
+        {"code": "1300", "start": "13:00", "end": "15:30"},
+        {"code": "1300F", "start": "13:00", "end": "17:00"}
+    ],
+    # Same order as shifts.json (the intervals alone would also give 0930+1300 under 'high')
+    "combo_priorities": {
+        "high": [["0930", "1300F"], ["1300F"], ["0930"], ["1030", "1300F"], ["1300"], ["1030"]],
+        "medium": [["0930", "1300F"], ["1030", "1300F"], ["0930", "1300"], ["1300F"], ["0930"],
+                   ["1030", "1300"], ["1300"], ["1030"]],
+        "low": [["0930", "1300F"], ["1030", "1300F"], ["0930", "1300"], ["1030", "1300"], ["1300F"],
+                ["0930"], ["1300"], ["1030"]]
+    }
+}
+
+# What keeps someone below their preferred hours (see ScheduleEngine.unmet_hours), in check order
+UNMET_LIMITS = {
+    'no_availability': "no availability left",
+    'shifts_full': "available shifts full",
+    'weekly_variance': "weekly variance cap",
+    'budget': "shifts longer than hours left",
+    'open': "could still get shifts"
+}
+
+class ShiftTable:
+    """
+    Shift intervals compiled to bitmasks
+
+    Each shift code gets one bit. conflict_masks[code] has the bits of every
+    shift whose interval overlaps it (including itself), so checking a combo
+    against a person's assigned shifts is a single AND. Valid combos are all
+    sets of mutually non-overlapping shifts.
+
+    combo_priorities (per rigidity level 'high', 'medium', 'low') can be given
+    in the config file; missing levels are derived from the intervals.
+    At most MAX_SHIFTS shifts: the combos are enumerated from all subsets,
+    and the solver keeps candidates per person, day and combo.
+    """
+    RIGIDITY_LEVELS = ('high', 'medium', 'low')
+    MAX_SHIFTS = 12
+
+    def __init__(self, config):
+        shifts = config.get('shifts', [])
+        if not shifts:
+            raise ValueError("Shift config has no shifts")
+        if len(shifts) > self.MAX_SHIFTS:
+            raise ValueError(f"Shift config has {len(shifts)} shifts, at most {self.MAX_SHIFTS} are supported")
+
+        self.codes = []
+        self.definitions = {}  # {code: {'start': str, 'end': str, 'hours': float}}
+        self.intervals = {}    # {code: (start_minutes, end_minutes)}
+        for shift in shifts:
+            code = str(shift['code'])
+            if code in self.definitions:
+                raise ValueError(f"Duplicate shift code: {code}")
+            start = self.parse_time(shift['start'])
+            end = self.parse_time(shift['end'])
+            if end <= start:
+                raise ValueError(f"Shift {code} ends before it starts")
+            self.codes.append(code)
+            self.intervals[code] = (start, end)
+            self.definitions[code] = {
+                'start': shift['start'],
+                'end': shift['end'],
+                'hours': (end - start) / 60
+            }
+
+        self.index = {code: idx for idx, code in enumerate(self.codes)}
+        self.bits = {code: 1 << idx for idx, code in enumerate(self.codes)}
+        self.conflict_masks = {}
+        for code in self.codes:
+            mask = 0
+            for other in self.codes:
+                if self.overlaps(code, other):
+                    mask |= self.bits[other]
+            self.conflict_masks[code] = mask
+
+        # Every set of mutually non-overlapping shifts, in display order
+        self.valid_combos = []
+        for subset in range(1, 1 << len(self.codes)):
+            combo = [code for code in self.codes if subset & self.bits[code]]
+            if all(self.conflict_masks[code] & subset == self.bits[code] for code in combo):
+                self.valid_combos.append(combo)
+
+        # Full shifts aren't contained in any other shift (e.g. 0930 vs 1030)
+        self.full_codes = {
+            code for code in self.codes
+            if not any(other != code and self.contains(other, code) for other in self.codes)
+        }
+
+        configured = config.get('combo_priorities', {})
+        self.combo_priorities = {}
+        for level in self.RIGIDITY_LEVELS:
+            if level in configured:
+                combos = [[str(code) for code in combo] for combo in configured[level]]
+                for combo in combos:
+                    unknown = [code for code in combo if code not in self.definitions]
+                    if unknown:
+                        raise ValueError(f"Unknown shift code in {level} combos: {', '.join(unknown)}")
+                    if any(self.overlaps(a, b) for i, a in enumerate(combo) for b in combo[i + 1:]):
+                        raise ValueError(f"Overlapping shifts in {level} combo: {', '.join(combo)}")
+                self.combo_priorities[level] = combos
+            else:
+                self.combo_priorities[level] = self.derive_priorities(level)
+
+    @classmethod
+    def load(cls, file_path=SHIFT_CONFIG_FILE):
+        """Load a shift config file, falling back to the built-in shifts if it doesn't exist"""
+        if not os.path.exists(file_path):
+            return cls(DEFAULT_SHIFT_CONFIG)
+        with open(file_path, 'r') as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def parse_time(value):
+        """Convert 'H:MM' to minutes after midnight"""
+        hours, minutes = str(value).strip().split(':')
+        return int(hours) * 60 + int(minutes)
+
+    def overlaps(self, a, b):
+        start_a, end_a = self.intervals[a]
+        start_b, end_b = self.intervals[b]
+        return start_a < end_b and start_b < end_a
+
+    def contains(self, outer, inner):
+        return (self.intervals[outer][0] <= self.intervals[inner][0] and
+                self.intervals[inner][1] <= self.intervals[outer][1])
+
+    def combo_mask(self, combo):
+        mask = 0
+        for code in combo:
+            mask |= self.bits[code]
+        return mask
+
+    def combo_blocked_mask(self, combo):
+        """Bits that must be free for a combo: its own shifts and everything overlapping them"""
+        mask = 0
+        for code in combo:
+            mask |= self.conflict_masks[code]
+        return mask
+
+    def combo_hours(self, combo):
+        return sum(self.definitions[code]['hours'] for code in combo)
+
+    def derive_priorities(self, level):
+        """
+        Default combo order when the config doesn't list one:
+        - low: every valid combo, longest first
+        - medium: combos with at least one full shift first, then the rest
+        - high: combos of only full shifts first, then combos with a full shift
+          or a single shift
+        """
+        by_length = sorted(self.valid_combos, key=lambda combo: -self.combo_hours(combo))
+        if level == 'low':
+            return by_length
+
+        with_full = [combo for combo in by_length if any(code in self.full_codes for code in combo)]
+        if level == 'medium':
+            return with_full + [combo for combo in by_length if combo not in with_full]
+
+        all_full = [combo for combo in by_length if all(code in self.full_codes for code in combo)]
+        rest = [combo for combo in by_length
+                if combo not in all_full and (combo in with_full or len(combo) == 1)]
+        return all_full + rest
+
+    def priorities_for(self, rigidity):
+        """Combos to try, in priority order, for a rigidity value (0-100)"""
+        if rigidity >= 70:
+            level = 'high'
+        elif rigidity >= 30:
+            level = 'medium'
+        else:
+            level = 'low'
+        return [list(combo) for combo in self.combo_priorities[level]]
+
+    def overlap_groups(self):
+        """Connected groups of overlapping shifts (e.g. [[0930, 1030], [1300, 1300F]])"""
+        groups = []
+        seen = set()
+        for code in self.codes:
+            if code in seen:
+                continue
+            group = []
+            stack = [code]
+            seen.add(code)
+            while stack:
+                current = stack.pop()
+                group.append(current)
+                for other in self.codes:
+                    if other not in seen and self.overlaps(current, other):
+                        seen.add(other)
+                        stack.append(other)
+            groups.append([c for c in self.codes if c in group])
+        return groups
+
+    def group_blocks(self, shifts):
+        """
+        Group a person's shifts for one day into displayed blocks
+
+        Shifts that follow each other directly (one ends when the next starts)
+        are merged into a single block.
+        """
+        ordered = sorted(shifts, key=lambda code: self.intervals[code])
+        blocks = []
+        for code in ordered:
+            if blocks and self.intervals[blocks[-1][-1]][1] == self.intervals[code][0]:
+                blocks[-1].append(code)
+            else:
+                blocks.append([code])
+        return blocks
+
+    def row_heights(self, pixels_per_hour=30):
+        """Height of each shift row in the day views (proportional to hours)"""
+        return {code: int(self.definitions[code]['hours'] * pixels_per_hour) for code in self.codes}
+
+    def mask_indices(self, mask):
+        """Shift indices set in a bitmask"""
+        return [idx for idx in range(len(self.codes)) if mask & (1 << idx)]
+
+    def mask_hours(self, mask):
+        return sum(self.definitions[code]['hours'] for code in self.codes if mask & self.bits[code])
+
+class FlowNetwork:
+    """Directed graph with integer capacities and a Dinic max-flow solver"""
+    def __init__(self, node_count):
+        # Each edge is [to, residual_capacity, index_of_reverse_edge]
+        self.graph = [[] for _ in range(node_count)]
+        self.capacities = {}  # {(node, edge_idx): original capacity}
+
+    def add_edge(self, u, v, capacity):
+        """Add an edge and return a handle for reading its flow later"""
+        self.graph[u].append([v, capacity, len(self.graph[v])])
+        self.graph[v].append([u, 0, len(self.graph[u]) - 1])
+        handle = (u, len(self.graph[u]) - 1)
+        self.capacities[handle] = capacity
+        return handle
+
+    def flow(self, handle):
+        """Flow currently pushed through an edge"""
+        u, idx = handle
+        return self.capacities[handle] - self.graph[u][idx][1]
+
+    def max_flow(self, source, sink):
+        total = 0
+        while True:
+            # Build BFS level graph
+            level = [-1] * len(self.graph)
+            level[source] = 0
+            queue = [source]
+            for u in queue:
+                for v, cap, _ in self.graph[u]:
+                    if cap > 0 and level[v] < 0:
+                        level[v] = level[u] + 1
+                        queue.append(v)
+            if level[sink] < 0:
+                return total
+
+            # Push blocking flow along level-increasing paths
+            next_edge = [0] * len(self.graph)
+
+            def push(u, limit):
+                if u == sink:
+                    return limit
+                edges = self.graph[u]
+                while next_edge[u] < len(edges):
+                    edge = edges[next_edge[u]]
+                    v, cap, rev = edge
+                    if cap > 0 and level[v] == level[u] + 1:
+                        pushed = push(v, min(limit, cap))
+                        if pushed:
+                            edge[1] -= pushed
+                            self.graph[v][rev][1] += pushed
+                            return pushed
+                    next_edge[u] += 1
+                return 0
+
+            while True:
+                pushed = push(source, float('inf'))
+                if not pushed:
+                    break
+                total += pushed
+
+def hopcroft_karp(adjacency, right_count):
+    """
+    Maximum bipartite matching (Hopcroft-Karp)
+
+    adjacency[u] lists the right nodes left node u may take, in order of
+    preference; the greedy start uses that order. Returns (match_left,
+    match_right) with the partner of each node, or -1.
+    """
+    left_count = len(adjacency)
+    match_left = [-1] * left_count
+    match_right = [-1] * right_count
+    for u, nodes in enumerate(adjacency):
+        for v in nodes:
+            if match_right[v] == -1:
+                match_left[u] = v
+                match_right[v] = u
+                break
+
+    unreached = left_count + 1
+    while True:
+        # BFS from the free left nodes: layer the alternating paths
+        dist = [unreached] * left_count
+        queue = deque()
+        for u in range(left_count):
+            if match_left[u] == -1:
+                dist[u] = 0
+                queue.append(u)
+        found = False
+        while queue:
+            u = queue.popleft()
+            for v in adjacency[u]:
+                w = match_right[v]
+                if w == -1:
+                    found = True
+                elif dist[w] == unreached:
+                    dist[w] = dist[u] + 1
+                    queue.append(w)
+        if not found:
+            return match_left, match_right
+
+        # DFS along the layers from each free left node (iterative, rosters can be big)
+        pointer = [0] * left_count
+        for root in range(left_count):
+            if match_left[root] != -1:
+                continue
+            stack = [root]
+            path = []  # path[i]: right node between stack[i] and stack[i + 1]
+            while stack:
+                u = stack[-1]
+                nodes = adjacency[u]
+                advanced = False
+                while pointer[u] < len(nodes):
+                    v = nodes[pointer[u]]
+                    pointer[u] += 1
+                    w = match_right[v]
+                    if w == -1:
+                        # Free right node: flip the whole path
+                        path.append(v)
+                        for left_node, right_node in zip(stack, path):
+                            match_left[left_node] = right_node
+                            match_right[right_node] = left_node
+                        stack = []
+                        advanced = True
+                        break
+                    if dist[w] == dist[u] + 1:
+                        path.append(v)
+                        stack.append(w)
+                        advanced = True
+                        break
+                if not advanced:
+                    # Dead end: never try this node again in this round
+                    dist[u] = unreached
+                    stack.pop()
+                    if path:
+                        path.pop()
+
+class Person:
+    """
+    One roster entry
+
+    Compact on purpose: big rosters keep thousands of these around. The id is
+    the person's index in the engine's roster (set by ScheduleEngine) and is
+    what the solver uses to index its per-person arrays. availability holds
+    one shift bitmask per day (bit = ShiftTable.bits[code]). qualifications
+    are the desk types the person may staff (see DeskSeating).
+    """
+    __slots__ = ('id', 'name', 'agreed_hours', 'max_hours', 'preferred_hours', 'availability', 'qualifications')
+
+    def __init__(self, name, agreed_hours, max_hours, preferred_hours, availability=None, person_id=-1,
+                 qualifications=()):
+        self.id = person_id
+        self.name = name
+        # Hours are for 2 weeks
+        self.agreed_hours = agreed_hours
+        self.max_hours = max_hours
+        self.preferred_hours = preferred_hours
+        self.availability = availability if availability is not None else array('I', [0] * len(DAYS))
+        self.qualifications = frozenset(qualifications)
+
+    def is_available(self, day_idx, bit):
+        return bool(self.availability[day_idx] & bit)
+
+    def __eq__(self, other):
+        # The id is only a position in the current roster, not part of the person
+        if not isinstance(other, Person):
+            return NotImplemented
+        return (self.name == other.name and self.agreed_hours == other.agreed_hours and
+                self.max_hours == other.max_hours and self.preferred_hours == other.preferred_hours and
+                self.availability == other.availability and self.qualifications == other.qualifications)
+
+    def __hash__(self):
+        return hash(self.name)
+
+    def __repr__(self):
+        return f"Person({self.name!r}, id={self.id})"
+
+def parse_qualifications(text):
+    """Desk types from a roster cell: 'intake; helpdesk' -> frozenset({'intake', 'helpdesk'})"""
+    return frozenset(part.strip().lower() for part in re.split(r'[;,]', text or '') if part.strip())
+
+def parse_desk_types(text):
+    """
+    Typed desks per day from 'intake:2, helpdesk:1' -> {'intake': 2, 'helpdesk': 1}
+
+    Also takes the {name: count} form of season files and service requests,
+    so both get the same checks. Raises ValueError on anything else. An
+    empty string means no typed desks.
+    """
+    if isinstance(text, dict):
+        pairs = [(str(name), count) for name, count in text.items()]
+    else:
+        pairs = []
+        for part in (text or '').split(','):
+            if not part.strip():
+                continue
+            name, sep, count = part.partition(':')
+            if not sep:
+                raise ValueError(f"Desk types must look like 'intake:2', got '{part.strip()}'")
+            pairs.append((name, count))
+
+    desk_types = {}
+    for name, count in pairs:
+        name = name.strip().lower()
+        if not name:
+            raise ValueError(f"Desk types need a name, got ':{count}'")
+        count = int(count)
+        if count < 0:
+            raise ValueError(f"Negative desk count for '{name}'")
+        desk_types[name] = desk_types.get(name, 0) + count
+    return desk_types
+
+def parse_min_staff(text, shift_table):
+    """
+    Minimum staffing from '1300F:2, TH1 1300F:3' -> {'1300F': 2, 'TH1 1300F': 3}
+
+    A shift code on its own applies to every day; with a roster day code in
+    front (M1 ... TH2) it's for that day only and wins over the plain one.
+    Raises ValueError on anything else. An empty string means no minimums.
+    """
+    min_staff = {}
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        key, sep, count = part.partition(':')
+        words = key.upper().split()
+        if not sep or not 1 <= len(words) <= 2:
+            raise ValueError(f"Minimum staffing must look like '1300F:2' or 'TH1 1300F:2', got '{part.strip()}'")
+        if words[-1] not in shift_table.index:
+            raise ValueError(f"Unknown shift '{words[-1]}'")
+        if len(words) == 2 and words[0] not in DAYS:
+            raise ValueError(f"Unknown day '{words[0]}' (use {', '.join(DAYS)})")
+        count = int(count)
+        if count < 0:
+            raise ValueError(f"Negative minimum for '{' '.join(words)}'")
+        min_staff[' '.join(words)] = count
+    return min_staff
+
+def desk_type_list(desk_types, desks):
+    """
+    Type of each of a day's desks: the typed desks in config order, then
+    general desks (None) for the rest. Typed desks beyond the day's desk
+    count are dropped.
+    """
+    types = [name for name, count in desk_types.items() for _ in range(count)][:max(desks, 0)]
+    return types + [None] * (max(desks, 0) - len(types))
+
+def load_roster(file_obj, shift_table):
+    """
+    Parse a roster CSV (one row per person, availability per day and shift code)
+
+    The optional 'qualifications' column lists the desk types someone may
+    staff, separated by ';' (e.g. 'intake;helpdesk').
+    """
+    people = []
+    reader = csv.DictReader(file_obj)
+    # Resolve the availability columns once: [(day_idx, column, bit)]
+    columns = [(day_idx, f"{day_code}{code}", shift_table.bits[code])
+               for day_idx, day_code in enumerate(DAYS) for code in shift_table.codes]
+    for row in reader:
+        availability = array('I', [0] * len(DAYS))
+        for day_idx, col_name, bit in columns:
+            if (row.get(col_name) or '').lower() in ('true', '1', 'yes'):
+                availability[day_idx] |= bit
+
+        people.append(Person(row['name'],
+                             int(row['agreed hours per 2 weeks']),
+                             int(row['max hours per 2 weeks']),
+                             int(row['preferred hours per 2 weeks']),
+                             availability,
+                             len(people),
+                             parse_qualifications(row.get('qualifications'))))
+    return people
+
+def load_roster_csv(file_path, shift_table):
+    with open(file_path, 'r') as f:
+        return load_roster(f, shift_table)
+
+def get_first_monday(year):
+    """First Monday of a year (week 1 starts here)"""
+    jan_1 = datetime(year, 1, 1)
+    days_to_monday = (7 - jan_1.weekday()) % 7
+    if days_to_monday == 0 and jan_1.weekday() != 0:
+        days_to_monday = 7
+    return jan_1 + timedelta(days=days_to_monday)
+
+def get_day_dates(week_num, year=None):
+    """Dates of the 8 scheduled days for a 2-week block starting at week_num"""
+    if year is None:
+        year = datetime.now().year
+    first_monday = get_first_monday(year)
+
+    dates = []
+    for day_idx in range(len(DAY_NAMES)):
+        # Week 1 days: 0-3 (Mon-Thu), Week 2 days: 4-7 (skip Fri, Sat, Sun)
+        day_offset = day_idx if day_idx < 4 else day_idx + 3
+        dates.append(first_monday + timedelta(weeks=(week_num - 1), days=day_offset))
+    return dates
+
+def ics_escape(text):
+    """Escape a text value for an iCalendar property"""
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def ics_file_name(name):
+    """File name for a person's calendar (characters that aren't safe in file names become _)"""
+    return re.sub(r'[^\w\-. ]', '_', name).strip() or 'person'
+
+def ics_fold(line, limit=75):
+    """Fold a content line into lines of at most limit octets (RFC 5545 3.1), without splitting a character"""
+    parts = []
+    size = 0
+    start = 0
+    for i, char in enumerate(line):
+        octets = len(char.encode('utf-8'))
+        # Continuation lines start with a space, which counts towards the limit
+        if size + octets > limit - (1 if parts else 0):
+            parts.append(line[start:i])
+            start = i
+            size = 0
+        size += octets
+    parts.append(line[start:])
+    return "\r\n ".join(parts)
+
+def format_ics(name, events, stamp, person_id):
+    """
+    One person's calendar as iCalendar text
+
+    events: [(start_datetime, end_datetime, shift_codes)]. Times are local
+    (floating), like everywhere else in the tool. The event UIDs use
+    person_id, so people whose names look alike still get distinct UIDs.
+    """
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//B2.0 Scheduling Tool//EN",
+        "CALSCALE:GREGORIAN",
+        f"X-WR-CALNAME:{ics_escape(f'B2.0 shifts - {name}')}"
+    ]
+    for start, end, codes in events:
+        lines += [
+            "BEGIN:VEVENT",
+            f"UID:{start:%Y%m%dT%H%M}-{'-'.join(codes)}-p{person_id}@b2-scheduler",
+            f"DTSTAMP:{stamp:%Y%m%dT%H%M%SZ}",
+            f"DTSTART:{start:%Y%m%dT%H%M%S}",
+            f"DTEND:{end:%Y%m%dT%H%M%S}",
+            "SUMMARY:B2.0 desk shift",
+            "END:VEVENT"
+        ]
+    lines.append("END:VCALENDAR")
+    return "\r\n".join(ics_fold(line) for line in lines) + "\r\n"
+
+class Objective:
+    """
+    Weighted score of giving a person a (day, shift combo); lower is better
+
+    Terms, each multiplied by its weight:
+        fill_balance          average number of people already in the combo's shifts
+        shift_length          minus the combo's hours (longer shifts score lower)
+        preference_closeness  hours the person would end up away from preferred
+        weekly_evenness       difference between their two weeks' hours afterwards
+        consecutive_days      neighbouring days (same week) they already work
+    The defaults (fill_balance 5, shift_length 2, rest 0) give the solver's
+    original score, avg_fill * 5 - hours * 2.
+
+    Scores are worked out in batches rather than term by term per
+    candidate: prepare() computes the per-combo part once per solve, and
+    person_terms() the person's part for all (day, combo) pairs at once, only
+    when one of its weights is set. The search then adds the fill term, which
+    changes with every assignment.
+    """
+    TERMS = ('fill_balance', 'shift_length', 'preference_closeness', 'weekly_evenness', 'consecutive_days')
+    DEFAULT_WEIGHTS = {'fill_balance': 5, 'shift_length': 2, 'preference_closeness': 0,
+                       'weekly_evenness': 0, 'consecutive_days': 0}
+
+    def __init__(self, weights=None):
+        self.weights = dict(self.DEFAULT_WEIGHTS)
+        for term, weight in (weights or {}).items():
+            if term not in self.weights:
+                raise ValueError(f"Unknown objective term '{term}' (use {', '.join(self.TERMS)})")
+            try:
+                self.weights[term] = float(weight)
+            except (TypeError, ValueError):
+                raise ValueError(f"Objective weight for '{term}' must be a number, got '{weight}'")
+        self.person_dependent = any(self.weights[term]
+                                    for term in ('preference_closeness', 'weekly_evenness', 'consecutive_days'))
+        self.length_terms = []
+
+    @classmethod
+    def parse(cls, text):
+        """Objective from 'consecutive_days:1, fill_balance:4' (unnamed terms keep their default)"""
+        weights = {}
+        for part in (text or '').split(','):
+            if not part.strip():
+                continue
+            term, sep, weight = part.partition(':')
+            if not sep:
+                raise ValueError(f"Objective weights must look like 'fill_balance:5', got '{part.strip()}'")
+            weights[term.strip().lower()] = weight.strip()
+        return cls(weights)
+
+    def changed_weights(self):
+        """Weights that differ from the defaults, e.g. for saving"""
+        return {term: weight for term, weight in self.weights.items() if weight != self.DEFAULT_WEIGHTS[term]}
+
+    def prepare(self, combo_hours):
+        """Per-combo part of the score for a solve's combos (see build_candidate_lists)"""
+        weight = self.weights['shift_length']
+        self.length_terms = [-hours * weight for hours in combo_hours]
+
+    def person_terms(self, engine, person):
+        """
+        Person-dependent part of the score for every candidate at once:
+        terms[day_idx][combo_idx], or None while those weights are all 0
+        """
+        if not self.person_dependent:
+            return None
+        weights = self.weights
+        combo_hours = engine.combo_hours
+        person_id = person.id
+        scheduled = engine.hours_scheduled[person_id]
+        week_hours = (engine.week1_hours[person_id], engine.week2_hours[person_id])
+
+        closeness = [weights['preference_closeness'] * abs(person.preferred_hours - scheduled - hours)
+                     for hours in combo_hours]
+        evenness = [[closeness[combo_idx] + weights['weekly_evenness'] * abs(week_hours[week] + hours -
+                                                                             week_hours[1 - week])
+                     for combo_idx, hours in enumerate(combo_hours)]
+                    for week in (0, 1)]
+
+        day_count = len(engine.day_names)
+        week_length = ScheduleIndex.WEEK_LENGTH
+        base = person_id * day_count
+        terms = []
+        for day_idx in range(day_count):
+            week = day_idx // week_length
+            neighbours = sum(1 for other in (day_idx - 1, day_idx + 1)
+                             if 0 <= other < day_count and other // week_length == week
+                             and engine.assigned_shifts[base + other])
+            consecutive = weights['consecutive_days'] * neighbours
+            terms.append([term + consecutive for term in evenness[week]])
+        return terms
+
+class DeskSeating:
+    """
+    Who sits at which desk in one (day, shift) when some desks are typed
+
+    desk_types has one entry per desk: a desk type, or None for a general
+    desk anyone can use. A typed desk needs someone qualified for it. Seating
+    someone new is one augmenting-path step of bipartite matching: take a
+    free desk they can use, or move people who are already seated to other
+    desks they can use until one frees up. The seating is kept between
+    calls, so a check or an add only searches from the new person, and
+    while a usable desk is free that's a lookup in the free desks per type.
+    people: list indexed by the person ids that are seated
+    """
+    __slots__ = ('desk_types', 'people', 'occupant', 'desk_of', 'free')
+
+    def __init__(self, desk_types, people):
+        self.desk_types = desk_types
+        self.people = people
+        self.occupant = [-1] * len(desk_types)  # desk -> person id
+        self.desk_of = {}  # {person_id: desk}
+        self.free = defaultdict(set)  # {desk type: free desks}
+        for desk, desk_type in enumerate(desk_types):
+            self.free[desk_type].add(desk)
+
+    def usable(self, qualifications, desk):
+        desk_type = self.desk_types[desk]
+        return desk_type is None or desk_type in qualifications
+
+    def free_desk(self, qualifications):
+        """A free desk someone with these qualifications can use (typed desks first), or None"""
+        for desk_type in sorted(qualifications):
+            if self.free.get(desk_type):
+                return min(self.free[desk_type])
+        if self.free.get(None):
+            return min(self.free[None])
+        return None
+
+    def augmenting_path(self, qualifications, visited):
+        """Desks to shift people along so someone with these qualifications gets a desk, or None"""
+        desk = self.free_desk(qualifications)
+        if desk is not None:
+            return [desk]
+        for desk, occupant in enumerate(self.occupant):
+            if desk in visited or occupant == -1 or not self.usable(qualifications, desk):
+                continue
+            visited.add(desk)
+            rest = self.augmenting_path(self.people[occupant].qualifications, visited)
+            if rest is not None:
+                return [desk] + rest
+        return None
+
+    def can_seat(self, qualifications):
+        if self.free_desk(qualifications) is not None:
+            return True
+        return self.augmenting_path(qualifications, set()) is not None
+
+    def seat(self, person_id):
+        """Give a person a desk, re-seating others if needed; False if there is no way"""
+        path = self.augmenting_path(self.people[person_id].qualifications, set())
+        if path is None:
+            return False
+        # Everyone on the path moves one desk along, the new person takes the first
+        self.free[self.desk_types[path[-1]]].discard(path[-1])
+        for step in range(len(path) - 1, 0, -1):
+            mover = self.occupant[path[step - 1]]
+            self.occupant[path[step]] = mover
+            self.desk_of[mover] = path[step]
+        self.occupant[path[0]] = person_id
+        self.desk_of[person_id] = path[0]
+        return True
+
+    def unseat(self, person_id):
+        desk = self.desk_of.pop(person_id, None)
+        if desk is not None:
+            self.occupant[desk] = -1
+            self.free[self.desk_types[desk]].add(desk)
+
+def validate_schedule(schedule, people, shift_table, desks_per_day, weekly_variance, desk_types=None):
+    """
+    Check a whole schedule against the solver's hard constraints
+
+    schedule is a person-based schedule as in ScheduleEngine.schedule or the
+    saved JSON: {day: {person_name: {'shifts': [codes], ...}}}. Each person's
+    day is turned into one shift bitmask, so availability and overlapping
+    shifts are single AND operations; desk fill and per-person week hours are
+    accumulated into arrays in the same pass and checked at the end.
+
+    With desk_types ({type: desks per day}), everyone in a shift must also
+    fit on a desk they're qualified for (checked with DeskSeating).
+
+    Returns a list of violations, each {'type', 'day', 'person', 'shifts',
+    'message'} (day/person/shifts are None where they don't apply). Types:
+    unknown_day, unknown_person, unknown_shift, overlap, availability,
+    desk_capacity, desk_type, max_hours, weekly_variance.
+    """
+    by_name = {person.name: person for person in people}
+    codes = shift_table.codes
+    bits = shift_table.bits
+    day_count = len(DAY_NAMES)
+    fill = [array('i', [0] * len(codes)) for _ in range(day_count)]
+    week_hours = defaultdict(lambda: [0.0, 0.0])  # {person_name: [week 1, week 2]}
+    violations = []
+
+    def violation(kind, day, name, shifts, message):
+        violations.append({'type': kind, 'day': day, 'person': name, 'shifts': shifts, 'message': message})
+
+    for day in schedule:
+        if day not in DAY_NAMES:
+            violation('unknown_day', day, None, None, f"Unknown day '{day}'")
+
+    for day_idx, day in enumerate(DAY_NAMES):
+        day_fill = fill[day_idx]
+        members = [[] for _ in codes]  # People per shift, only needed for typed desks
+        for name, entry in schedule.get(day, {}).items():
+            shifts = list(entry.get('shifts', []))
+            unknown = [code for code in shifts if code not in bits]
+            if unknown:
+                violation('unknown_shift', day, name, unknown, f"{name}: unknown shift(s) {', '.join(unknown)}")
+
+            mask = 0
+            clashing = 0
+            for code in shifts:
+                if code not in bits:
+                    continue
+                if mask & shift_table.conflict_masks[code]:
+                    clashing |= bits[code] | (mask & shift_table.conflict_masks[code])
+                mask |= bits[code]
+            for idx in range(len(codes)):
+                if mask >> idx & 1:
+                    day_fill[idx] += 1
+            if clashing:
+                overlapping = [code for code in codes if clashing & bits[code]]
+                violation('overlap', day, name, overlapping,
+                          f"{name}: overlapping shifts {', '.join(overlapping)}")
+
+            person = by_name.get(name)
+            if person is None:
+                violation('unknown_person', day, name, None, f"{name} is not in the roster")
+                continue
+            if desk_types:
+                for idx in range(len(codes)):
+                    if mask >> idx & 1:
+                        members[idx].append(person)
+            unavailable = mask & ~person.availability[day_idx]
+            if unavailable:
+                missing = [code for code in codes if unavailable & bits[code]]
+                violation('availability', day, name, missing,
+                          f"{name} is not available for {', '.join(missing)}")
+            week_hours[name][0 if day_idx < 4 else 1] += shift_table.mask_hours(mask)
+
+        desks = desks_per_day.get(day, 0)
+        for idx, code in enumerate(codes):
+            if day_fill[idx] > desks:
+                violation('desk_capacity', day, None, [code],
+                          f"{code}: {day_fill[idx]} people for {desks} desk(s)")
+            elif desk_types and members[idx]:
+                seating = DeskSeating(desk_type_list(desk_types, desks), members[idx])
+                unseated = [person.name for person_id, person in enumerate(members[idx])
+                            if not seating.seat(person_id)]
+                if unseated:
+                    violation('desk_type', day, None, [code],
+                              f"{code}: no desk they're qualified for left for {', '.join(unseated)}")
+
+    for name, (week1, week2) in week_hours.items():
+        person = by_name[name]
+        if week1 + week2 > person.max_hours:
+            violation('max_hours', None, name, None,
+                      f"{name}: {week1 + week2:.1f}h scheduled, max is {person.max_hours}h")
+        weekly_limit = person.preferred_hours / 2 + weekly_variance
+        for week, hours in enumerate((week1, week2), start=1):
+            if hours > weekly_limit:
+                violation('weekly_variance', f"Week {week}", name, None,
+                          f"{name}: {hours:.1f}h in week {week}, limit is {weekly_limit:.1f}h")
+    return violations
+
+def format_violations(violations, limit=None):
+    """One line per violation (at most limit lines, then a count of the rest)"""
+    shown = violations if limit is None else violations[:limit]
+    lines = [f"{v['day'] + ': ' if v['day'] else ''}{v['message']}" for v in shown]
+    if len(violations) > len(shown):
+        lines.append(f"... and {len(violations) - len(shown)} more")
+    return "\n".join(lines)
+
+class ScheduleIndex:
+    """
+    Running totals of a schedule, updated on every assignment
+
+    Holds everything the hours table and the exports need, so none of them
+    has to walk the schedule again:
+        total_hours:    hours per person id (both weeks)
+        week_hours:     [week 1, week 2] hours per person id
+        day_hours:      flat array, day_hours[id * days + day_idx]
+        shift_fill:     shift_fill[day_idx][shift_idx] -> people in that shift
+        total, week_totals: hours over everyone
+        below_preferred, below_agreed, over_max: hours summed over everyone
+    """
+    WEEK_LENGTH = 4  # Week 1: days 0-3, Week 2: days 4-7
+
+    def __init__(self, people, shift_count, day_count=len(DAYS)):
+        count = len(people)
+        self.people = people
+        self.day_count = day_count
+        self.total_hours = array('d', [0.0] * count)
+        self.week_hours = [array('d', [0.0] * count), array('d', [0.0] * count)]
+        self.day_hours = array('d', [0.0] * (count * day_count))
+        self.shift_fill = [array('i', [0] * shift_count) for _ in range(day_count)]
+        self.total = 0.0
+        self.week_totals = [0.0, 0.0]
+        # Nobody has hours yet, so everyone is missing all of them
+        self.below_preferred = float(sum(max(0, person.preferred_hours) for person in people))
+        self.below_agreed = float(sum(max(0, person.agreed_hours) for person in people))
+        self.over_max = 0.0
+
+    def add(self, person, day_idx, shift_indices, hours):
+        """Record that a person got these shifts on a day"""
+        self._change(person, day_idx, shift_indices, hours, 1)
+
+    def remove(self, person, day_idx, shift_indices, hours):
+        """Record that a person lost these shifts on a day"""
+        self._change(person, day_idx, shift_indices, -hours, -1)
+
+    def _change(self, person, day_idx, shift_indices, hours, step):
+        person_id = person.id
+        before = self.total_hours[person_id]
+        after = before + hours
+        week = 0 if day_idx < self.WEEK_LENGTH else 1
+
+        self.total_hours[person_id] = after
+        self.week_hours[week][person_id] += hours
+        self.day_hours[person_id * self.day_count + day_idx] += hours
+        fill = self.shift_fill[day_idx]
+        for shift_idx in shift_indices:
+            fill[shift_idx] += step
+
+        self.total += hours
+        self.week_totals[week] += hours
+        self.below_preferred += max(0, person.preferred_hours - after) - max(0, person.preferred_hours - before)
+        self.below_agreed += max(0, person.agreed_hours - after) - max(0, person.agreed_hours - before)
+        self.over_max += max(0, after - person.max_hours) - max(0, before - person.max_hours)
+
+    def deficits(self, person):
+        """Hours a person is short of preferred and agreed, and room left below max (never negative)"""
+        hours = self.total_hours[person.id]
+        return {
+            'preferred': max(0, person.preferred_hours - hours),
+            'agreed': max(0, person.agreed_hours - hours),
+            'max': max(0, person.max_hours - hours)
+        }
+
+    def summary(self):
+        """Global totals as a JSON-serialisable dict"""
+        return {
+            'total_hours': self.total,
+            'week1_hours': self.week_totals[0],
+            'week2_hours': self.week_totals[1],
+            'below_preferred_hours': self.below_preferred,
+            'below_agreed_hours': self.below_agreed,
+            'over_max_hours': self.over_max
+        }
+
+def diff_schedules(old, new, shift_table):
+    """
+    What changed between two person-based schedules (saved JSON or solves)
+
+    Both are {day: {person_name: {'shifts': [codes], ...}}}. Each person-day
+    is compared as a pair of shift bitmasks, so the diff is one pass over
+    the assignments of both schedules. Per person, shifts that were removed
+    and added on the same day count as moved within the day; removed and
+    added shifts on different days are paired up as moves between days
+    (same length first, then in day order); the rest are added or removed.
+
+    Returns {'changes': [change], 'hours': {person_name: {'old', 'new', 'delta'}},
+    'counts': {'added', 'removed', 'moved'}}, where a change is {'person',
+    'change', 'day', 'shifts', 'to_day', 'to_shifts', 'hours'} (to_day and
+    to_shifts only for moves). 'hours' lists everyone with a change.
+    """
+    bits = shift_table.bits
+
+    def masks(schedule):
+        result = {}  # {(person_name, day_idx): mask}
+        for day_idx, day in enumerate(DAY_NAMES):
+            for name, entry in schedule.get(day, {}).items():
+                mask = 0
+                for code in entry.get('shifts', []):
+                    mask |= bits.get(code, 0)
+                if mask:
+                    result[name, day_idx] = mask
+        return result
+
+    def codes(mask):
+        return [code for code in shift_table.codes if mask & bits[code]]
+
+    old_masks = masks(old)
+    new_masks = masks(new)
+    changed = defaultdict(lambda: {'removed': [], 'added': [], 'old': 0.0, 'new': 0.0})
+    for (name, day_idx), mask in old_masks.items():
+        changed[name]['old'] += shift_table.mask_hours(mask)
+    for (name, day_idx), mask in new_masks.items():
+        changed[name]['new'] += shift_table.mask_hours(mask)
+    for key in old_masks.keys() | new_masks.keys():
+        before = old_masks.get(key, 0)
+        after = new_masks.get(key, 0)
+        if before != after:
+            name, day_idx = key
+            if before & ~after:
+                changed[name]['removed'].append((day_idx, before & ~after))
+            if after & ~before:
+                changed[name]['added'].append((day_idx, after & ~before))
+
+    changes = []
+    hours = {}
+    counts = {'added': 0, 'removed': 0, 'moved': 0}
+
+    def record(name, kind, day_idx, mask, to_day_idx=None, to_mask=0):
+        change = {'person': name, 'change': kind, 'day': DAY_NAMES[day_idx], 'shifts': codes(mask),
+                  'hours': shift_table.mask_hours(to_mask if kind == 'moved' else mask)}
+        if kind == 'moved':
+            change['to_day'] = DAY_NAMES[to_day_idx]
+            change['to_shifts'] = codes(to_mask)
+        changes.append(change)
+        counts[kind] += 1
+
+    for name in sorted(changed):
+        person = changed[name]
+        removed = sorted(person['removed'])
+        added = sorted(person['added'])
+        if not removed and not added:
+            continue
+        hours[name] = {'old': person['old'], 'new': person['new'], 'delta': person['new'] - person['old']}
+
+        # Same day: changed shifts within the day
+        added_days = {day_idx: mask for day_idx, mask in added}
+        left_removed = []
+        for day_idx, mask in removed:
+            if day_idx in added_days:
+                record(name, 'moved', day_idx, mask, day_idx, added_days.pop(day_idx))
+            else:
+                left_removed.append((day_idx, mask))
+
+        # Other days: pair up shifts of the same length, then whatever is left in day order
+        by_hours = defaultdict(list)
+        for day_idx, mask in sorted(added_days.items(), reverse=True):
+            by_hours[shift_table.mask_hours(mask)].append((day_idx, mask))
+        unpaired = []
+        for day_idx, mask in left_removed:
+            matches = by_hours.get(shift_table.mask_hours(mask))
+            if matches:
+                to_day_idx, to_mask = matches.pop()
+                added_days.pop(to_day_idx)
+                record(name, 'moved', day_idx, mask, to_day_idx, to_mask)
+            else:
+                unpaired.append((day_idx, mask))
+        left_added = sorted(added_days.items())
+        for (day_idx, mask), (to_day_idx, to_mask) in zip(unpaired, left_added):
+            record(name, 'moved', day_idx, mask, to_day_idx, to_mask)
+        for day_idx, mask in unpaired[len(left_added):]:
+            record(name, 'removed', day_idx, mask)
+        for day_idx, mask in left_added[len(unpaired):]:
+            record(name, 'added', day_idx, mask)
+
+    return {'changes': changes, 'hours': hours, 'counts': counts}
+
+def format_diff(diff):
+    """Schedule diff as a text table, grouped per person"""
+    if not diff['changes']:
+        return "No changes"
+    lines = [f"{diff['counts']['added']} added, {diff['counts']['removed']} removed, "
+             f"{diff['counts']['moved']} moved"]
+    person = None
+    for change in diff['changes']:
+        if change['person'] != person:
+            person = change['person']
+            hours = diff['hours'][person]
+            lines.append(f"{person} ({hours['old']:.1f}h -> {hours['new']:.1f}h, {hours['delta']:+.1f}h)")
+        where = f"{change['day']} {' '.join(change['shifts'])}"
+        if change['change'] == 'moved':
+            where += f" -> {change['to_day']} {' '.join(change['to_shifts'])}"
+        lines.append(f"  {change['change']:<8} {where}")
+    return "\n".join(lines)
+
+def write_diff_csv(f, diff):
+    """Schedule diff as CSV: one row per change, with the person's hours before and after"""
+    writer = csv.writer(f)
+    writer.writerow(['Person', 'Change', 'Day', 'Shifts', 'To Day', 'To Shifts', 'Shift Hours',
+                     'Hours Before', 'Hours After', 'Hours Change'])
+    for change in diff['changes']:
+        hours = diff['hours'][change['person']]
+        writer.writerow([
+            change['person'], change['change'], change['day'], ' '.join(change['shifts']),
+            change.get('to_day', ''), ' '.join(change.get('to_shifts', [])), f"{change['hours']:.1f}",
+            f"{hours['old']:.1f}", f"{hours['new']:.1f}", f"{hours['delta']:+.1f}"
+        ])
+
+class EditHistory:
+    """
+    Undo/redo stacks for manual schedule edits
+
+    An edit is stored as its delta, a tuple of (person_id, day_idx,
+    mask_before, mask_after) for each person-day it touched, so memory grows
+    with the number of edits and undo/redo cost the size of the edit, not of
+    the schedule. Making a new edit clears the redo stack.
+    """
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.undo_stack = deque(maxlen=limit)
+        self.redo_stack = []
+
+    def record(self, delta):
+        if delta:
+            self.undo_stack.append(delta)
+            self.redo_stack.clear()
+
+    def can_undo(self):
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        return bool(self.redo_stack)
+
+    def clear(self):
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+
+class ScheduleEngine:
+    """
+    Solver state and algorithm for one 2-week schedule
+
+    People are numbered by their position in the roster (person.id) and all
+    solver state is indexed by that id:
+        people:         [Person]
+        occupancy:      occupancy[day_idx][shift_idx] -> [person ids] (shift_idx = ShiftTable.index)
+        assigned_shifts: flat array, assigned_shifts[id * days + day_idx] -> shift bitmask
+        index:          ScheduleIndex with hour totals and shift fill
+        seating:        seating[day_idx][shift_idx] -> DeskSeating, only with typed desks (else None)
+        min_staff:      minimum people per shift ({'1300F': 2, 'TH1 1300F': 3}, see staffing_floors)
+        hours_scheduled, week1_hours, week2_hours: the index's arrays of hours per person id
+        trace:          DecisionTrace of the solve (see explain), empty unless enabled
+        schedule:       {day: {person_name: {'shifts': [shift_codes], 'hours': float}}} (built after solving)
+    """
+    def __init__(self, people, shift_table, stats=None, trace=None):
+        self.shift_table = shift_table
+        self.timeslot_codes = shift_table.codes
+        self.shift_definitions = shift_table.definitions
+        self.days = DAYS
+        self.day_names = DAY_NAMES
+        self.stats = stats if stats is not None else SolverStats()
+        self.trace = trace if trace is not None else DecisionTrace()
+        self.desks_per_day = {day: 0 for day in self.day_names}
+        self.desk_types = {}  # {desk type: typed desks per day}, the other desks are general
+        self.min_staff = {}  # Minimum people per shift, see parse_min_staff
+        self.objective = Objective()  # How candidates are scored (see Objective)
+        self.prune_report = None  # Set by build_candidate_lists
+        self.parameters = {}  # Solve parameters (saved with the schedule)
+        self.set_people(people)
+        self.reset()
+
+    def set_people(self, people):
+        """Take over a roster and number it"""
+        self.people = people
+        for idx, person in enumerate(people):
+            person.id = idx
+        self.name_to_id = {person.name: person.id for person in people}
+
+    def reset(self):
+        """Clear all assignments"""
+        count = len(self.people)
+        self.schedule = {day: {} for day in self.day_names}
+
+        # Hour totals (per person, per week for variance checking) and shift fill
+        self.index = ScheduleIndex(self.people, len(self.timeslot_codes), len(self.day_names))
+        self.hours_scheduled = self.index.total_hours
+        self.week1_hours, self.week2_hours = self.index.week_hours
+
+        # For algorithm: who is in each shift, and each person's shifts per day as a bitmask
+        self.occupancy = [[[] for _ in self.timeslot_codes] for _ in self.day_names]
+        self.assigned_shifts = array('I', [0] * (count * len(self.day_names)))
+
+        # Manual edits of this schedule (ids change with a new roster, so history can't be kept)
+        self.history = EditHistory()
+        self.trace.reset()
+        self.rebuild_seating()
+
+    def day_desk_types(self, day_idx):
+        """Type of each desk on a day (None = general), see desk_type_list"""
+        return desk_type_list(self.desk_types, self.desks_per_day.get(self.day_names[day_idx], 0))
+
+    def rebuild_seating(self):
+        """Seat everyone in occupancy again (after the desks, desk types or ids changed)"""
+        if not self.desk_types:
+            self.seating = None
+            return
+        self.seating = []
+        for day_idx, day_shifts in enumerate(self.occupancy):
+            desk_types = self.day_desk_types(day_idx)
+            day_seating = []
+            for members in day_shifts:
+                seating = DeskSeating(desk_types, self.people)
+                for person_id in members:
+                    seating.seat(person_id)
+                day_seating.append(seating)
+            self.seating.append(day_seating)
+
+    def solve(self, desks_per_day, rigidity, weekly_variance, total_hours_target, phase1='greedy',
+              desk_types=None, min_staff=None, objective=None):
+        """
+        Run a full solve from an empty schedule and return the person-based schedule
+
+        phase1: 'greedy' (roster order) or 'matching' (see match_initial_shifts)
+        desk_types: {desk type: desks per day} that need a qualified person
+        (see DeskSeating); the rest of each day's desks are general
+        min_staff: minimum people per shift (see parse_min_staff and
+        fill_staffing_floors)
+        objective: weights of the candidate score, {term: weight} (see Objective)
+        """
+        started = self.stats.start()
+        self.desks_per_day = desks_per_day
+        self.desk_types = dict(desk_types or {})
+        self.min_staff = dict(min_staff or {})
+        self.objective = Objective(objective)
+        self.remember_parameters(rigidity, weekly_variance, total_hours_target, phase1)
+        self.reset()
+
+        # Run scheduling algorithm with per-day desks, rigidity, weekly variance, and target hours
+        self.run_scheduling_algorithm(desks_per_day, rigidity, weekly_variance, total_hours_target, phase1)
+
+        # Convert occupancy to person-centric schedule
+        self.convert_to_person_schedule()
+        self.stats.stop('solve_total', started)
+        return self.schedule
+
+    def resolve(self, desks_per_day, rigidity, weekly_variance, total_hours_target, phase1='greedy',
+                desk_types=None, min_staff=None, objective=None):
+        """
+        Continue solving from the current assignments
+
+        Used after roster changes: existing assignments are kept and only the
+        remaining room (new people, freed desks, unmet hours) is filled.
+        """
+        started = self.stats.start()
+        self.desks_per_day = desks_per_day
+        self.desk_types = dict(desk_types or {})
+        self.min_staff = dict(min_staff or {})
+        self.objective = Objective(objective)
+        self.remember_parameters(rigidity, weekly_variance, total_hours_target, phase1)
+        self.history.clear()  # Edits can't be undone past a re-solve
+        self.rebuild_seating()
+        self.run_scheduling_algorithm(desks_per_day, rigidity, weekly_variance, total_hours_target, phase1)
+        self.convert_to_person_schedule()
+        self.stats.stop('resolve_total', started)
+        return self.schedule
+
+    def remember_parameters(self, rigidity, weekly_variance, total_hours_target, phase1):
+        self.parameters = {
+            'rigidity': rigidity,
+            'weekly_variance': weekly_variance,
+            'total_hours_target': total_hours_target,
+            'phase1': phase1,
+            'desk_types': dict(self.desk_types),
+            'min_staff': dict(self.min_staff),
+            'objective': self.objective.changed_weights()
+        }
+
+    def validate(self, weekly_variance=None):
+        """Check the current schedule against the hard constraints (see validate_schedule)"""
+        if weekly_variance is None:
+            weekly_variance = self.parameters.get('weekly_variance', 0)
+        return validate_schedule(self.schedule, self.people, self.shift_table, self.desks_per_day, weekly_variance,
+                                 self.desk_types)
+
+    def load_schedule(self, data):
+        """
+        Take over a saved schedule (the to_dict() format)
+
+        The schedule is validated as saved, then loaded: shifts of people or
+        codes that don't exist are left out, everything else is kept as is,
+        even if it breaks a constraint. Returns the violations.
+        """
+        self.desks_per_day = {day: int(data.get('desks_per_day', {}).get(day, 0)) for day in self.day_names}
+        self.parameters = dict(data.get('parameters', {}))
+        self.desk_types = dict(self.parameters.get('desk_types') or {})
+        self.min_staff = dict(self.parameters.get('min_staff') or {})
+        self.objective = Objective(self.parameters.get('objective'))
+        schedule = data.get('schedule', {})
+        violations = validate_schedule(schedule, self.people, self.shift_table, self.desks_per_day,
+                                       self.parameters.get('weekly_variance', 0), self.desk_types)
+
+        self.reset()
+        table = self.shift_table
+        day_count = len(self.day_names)
+        for day_idx, day in enumerate(self.day_names):
+            for name, entry in schedule.get(day, {}).items():
+                person_id = self.name_to_id.get(name)
+                if person_id is None:
+                    continue
+                mask = table.combo_mask([code for code in entry.get('shifts', []) if code in table.bits])
+                if not mask:
+                    continue
+                shift_indices = table.mask_indices(mask)
+                for shift_idx in shift_indices:
+                    self.occupancy[day_idx][shift_idx].append(person_id)
+                self.assigned_shifts[person_id * day_count + day_idx] = mask
+                self.index.add(self.people[person_id], day_idx, shift_indices, table.mask_hours(mask))
+        self.rebuild_seating()
+        self.convert_to_person_schedule()
+        return violations
+
+    def check_move(self, person_id, from_day_idx, from_mask, to_day_idx, to_mask):
+        """
+        Why moving some of a person's shifts would break a constraint, or None
+
+        The person gives up from_mask on from_day_idx and gets to_mask on
+        to_day_idx (from_mask may be 0 to only add shifts). Only the running
+        index and the person's day bitmasks are read, so the check costs the
+        same however big the schedule is. A move is only refused for a limit
+        it makes worse: a day already over capacity in a loaded schedule can
+        still be edited. Reasons: availability, overlap, desk_capacity,
+        desk_type, max_hours, weekly_variance.
+        """
+        person = self.people[person_id]
+        table = self.shift_table
+        day_count = len(self.day_names)
+        same_day = from_day_idx == to_day_idx
+
+        if to_mask & ~person.availability[to_day_idx]:
+            return 'availability'
+
+        # Shifts the person keeps on the target day
+        kept = self.assigned_shifts[person_id * day_count + to_day_idx]
+        if same_day:
+            kept &= ~from_mask
+        for idx in table.mask_indices(to_mask):
+            conflicts = table.conflict_masks[table.codes[idx]]
+            # Against the kept shifts, and the moved shifts among themselves
+            # (a dragged block can land on shifts that overlap each other)
+            if kept & conflicts or to_mask & conflicts != 1 << idx:
+                return 'overlap'
+
+        desks = self.desks_per_day.get(self.day_names[to_day_idx], 0)
+        fill = self.index.shift_fill[to_day_idx]
+        for idx in table.mask_indices(to_mask):
+            # Moving within the shift doesn't add anyone to it
+            if not (same_day and from_mask >> idx & 1) and fill[idx] >= desks:
+                return 'desk_capacity'
+        if self.seating is not None:
+            for idx in table.mask_indices(to_mask):
+                if not (same_day and from_mask >> idx & 1) and \
+                        not self.seating[to_day_idx][idx].can_seat(person.qualifications):
+                    return 'desk_type'
+
+        from_hours = table.mask_hours(from_mask)
+        to_hours = table.mask_hours(to_mask)
+        total = self.index.total_hours[person_id]
+        if to_hours > from_hours and total - from_hours + to_hours > person.max_hours:
+            return 'max_hours'
+
+        week = 0 if to_day_idx < ScheduleIndex.WEEK_LENGTH else 1
+        week_hours = self.index.week_hours[week][person_id] + to_hours
+        if (0 if from_day_idx < ScheduleIndex.WEEK_LENGTH else 1) == week:
+            week_hours -= from_hours
+        weekly_limit = person.preferred_hours / 2 + self.parameters.get('weekly_variance', 0)
+        if week_hours > weekly_limit and week_hours > self.index.week_hours[week][person_id]:
+            return 'weekly_variance'
+        return None
+
+    def add_shifts(self, person_id, day_idx, mask):
+        """Give a person extra shifts on a day (manual edit, not checked; see check_move)"""
+        mask &= ~self.assigned_shifts[person_id * len(self.day_names) + day_idx]
+        if not mask:
+            return
+        shift_indices = self.shift_table.mask_indices(mask)
+        for shift_idx in shift_indices:
+            self.occupancy[day_idx][shift_idx].append(person_id)
+            if self.seating is not None:
+                self.seating[day_idx][shift_idx].seat(person_id)
+        self.assigned_shifts[person_id * len(self.day_names) + day_idx] |= mask
+        self.index.add(self.people[person_id], day_idx, shift_indices, self.shift_table.mask_hours(mask))
+        self.refresh_schedule_entry(person_id, day_idx)
+
+    def remove_shifts(self, person_id, day_idx, mask):
+        """Take shifts away from a person on a day (manual edit)"""
+        mask &= self.assigned_shifts[person_id * len(self.day_names) + day_idx]
+        if not mask:
+            return
+        shift_indices = self.shift_table.mask_indices(mask)
+        for shift_idx in shift_indices:
+            self.occupancy[day_idx][shift_idx].remove(person_id)
+            if self.seating is not None:
+                self.seating[day_idx][shift_idx].unseat(person_id)
+        self.assigned_shifts[person_id * len(self.day_names) + day_idx] &= ~mask
+        self.index.remove(self.people[person_id], day_idx, shift_indices, self.shift_table.mask_hours(mask))
+        self.refresh_schedule_entry(person_id, day_idx)
+
+    def move_shifts(self, person_id, from_day_idx, from_mask, to_day_idx, to_mask):
+        """Move some of a person's shifts (manual edit, not checked; see check_move), undoable"""
+        day_count = len(self.day_names)
+        days = (from_day_idx,) if from_day_idx == to_day_idx else (from_day_idx, to_day_idx)
+        before = [self.assigned_shifts[person_id * day_count + day_idx] for day_idx in days]
+        self.remove_shifts(person_id, from_day_idx, from_mask)
+        self.add_shifts(person_id, to_day_idx, to_mask)
+        self.history.record(tuple(
+            (person_id, day_idx, mask, self.assigned_shifts[person_id * day_count + day_idx])
+            for day_idx, mask in zip(days, before)
+            if mask != self.assigned_shifts[person_id * day_count + day_idx]))
+
+    def set_day_shifts(self, person_id, day_idx, mask):
+        """Give a person exactly these shifts on a day"""
+        current = self.assigned_shifts[person_id * len(self.day_names) + day_idx]
+        self.remove_shifts(person_id, day_idx, current & ~mask)
+        self.add_shifts(person_id, day_idx, mask & ~current)
+
+    def undo(self):
+        """Revert the last manual edit; returns its delta (see EditHistory), or None if there is none"""
+        if not self.history.undo_stack:
+            return None
+        delta = self.history.undo_stack.pop()
+        for person_id, day_idx, before, _ in delta:
+            self.set_day_shifts(person_id, day_idx, before)
+        self.history.redo_stack.append(delta)
+        return delta
+
+    def redo(self):
+        """Apply the last undone edit again; returns its delta, or None if there is none"""
+        if not self.history.redo_stack:
+            return None
+        delta = self.history.redo_stack.pop()
+        for person_id, day_idx, _, after in delta:
+            self.set_day_shifts(person_id, day_idx, after)
+        self.history.undo_stack.append(delta)
+        return delta
+
+    def refresh_schedule_entry(self, person_id, day_idx):
+        """Update one person's day in the person-based schedule from their bitmask"""
+        person = self.people[person_id]
+        slot = person_id * len(self.day_names) + day_idx
+        mask = self.assigned_shifts[slot]
+        day_schedule = self.schedule[self.day_names[day_idx]]
+        if mask:
+            day_schedule[person.name] = {
+                'shifts': [code for code in self.timeslot_codes if mask & self.shift_table.bits[code]],
+                'hours': self.index.day_hours[slot]
+            }
+        else:
+            day_schedule.pop(person.name, None)
+
+    def unassign_person(self, person_id):
+        """Remove all of a person's shifts"""
+        person = self.people[person_id]
+        base = person_id * len(self.day_names)
+        for day_idx in range(len(self.day_names)):
+            mask = self.assigned_shifts[base + day_idx]
+            if not mask:
+                continue
+            shift_indices = self.shift_table.mask_indices(mask)
+            for shift_idx in shift_indices:
+                self.occupancy[day_idx][shift_idx].remove(person_id)
+                if self.seating is not None:
+                    self.seating[day_idx][shift_idx].unseat(person_id)
+            self.index.remove(person, day_idx, shift_indices, self.shift_table.mask_hours(mask))
+            self.assigned_shifts[base + day_idx] = 0
+
+    def update_roster(self, people, changed_names=()):
+        """
+        Replace the roster while keeping existing assignments
+
+        People who left and people in changed_names (availability or hours
+        edited) lose their shifts so they can be scheduled again. Everyone is
+        renumbered, so the kept assignments are moved to the new ids.
+        """
+        # Read the old ids before renumbering (unchanged people may be the same objects)
+        old_ids = {person.name: person.id for person in self.people}
+        old_occupancy = self.occupancy
+        old_assigned = self.assigned_shifts
+        day_count = len(self.day_names)
+
+        self.set_people(people)
+        kept = {}  # {old_id: new_id}
+        for person in people:
+            if person.name in old_ids and person.name not in changed_names:
+                kept[old_ids[person.name]] = person.id
+
+        self.reset()
+        for old_id, new_id in kept.items():
+            for day_idx in range(day_count):
+                mask = old_assigned[old_id * day_count + day_idx]
+                if mask:
+                    self.assigned_shifts[new_id * day_count + day_idx] = mask
+                    self.index.add(people[new_id], day_idx, self.shift_table.mask_indices(mask),
+                                   self.shift_table.mask_hours(mask))
+        for day_idx, day_shifts in enumerate(old_occupancy):
+            for shift_idx, members in enumerate(day_shifts):
+                self.occupancy[day_idx][shift_idx] = [kept[old_id] for old_id in members if old_id in kept]
+        self.rebuild_seating()
+
+    def to_dict(self):
+        """Schedule and hour totals as a JSON-serialisable dict"""
+        return {
+            'days': list(self.day_names),
+            'desks_per_day': dict(self.desks_per_day),
+            'parameters': dict(self.parameters),
+            'schedule': {day: {name: {'shifts': list(entry['shifts']), 'hours': entry['hours']}
+                               for name, entry in people.items()}
+                         for day, people in self.schedule.items()},
+            'hours': {
+                person.name: {
+                    'week1': self.week1_hours[person.id],
+                    'week2': self.week2_hours[person.id],
+                    'total': self.hours_scheduled[person.id],
+                    'preferred': person.preferred_hours,
+                    'agreed': person.agreed_hours,
+                    'max': person.max_hours
+                }
+                for person in self.people
+            },
+            'total_hours': self.index.total,
+            'summary': self.index.summary(),
+            'pruning': self.prune_report,
+            'understaffed': self.staffing_shortfalls(),
+            'unmet_hours': self.unmet_hours()
+        }
+
+    def unmet_hours(self, weekly_variance=None):
+        """
+        Why people below their preferred hours didn't get more
+
+        One pass over everyone's availability bitmasks against the final
+        occupancy. Every (day, shift combo) someone could add is counted under
+        the first check that rules it out (see UNMET_LIMITS):
+            no_availability   not available, or it clashes with their shifts
+            shifts_full       a shift has no desk left (for them, with typed desks)
+            weekly_variance   the week would go over the variance cap
+            budget            longer than their hours left to preferred (or max)
+            open              nothing rules it out (e.g. the solve hit the target)
+        The limiting factor is the furthest any option got: if some option
+        only fails on the budget, that's what's holding them back.
+
+        Returns [{'name', 'scheduled', 'preferred', 'missing', 'limit', 'options'}],
+        most hours missing first; options is {check: combos} for every check
+        that ruled something out.
+        """
+        if weekly_variance is None:
+            weekly_variance = self.parameters.get('weekly_variance', 0)
+        table = self.shift_table
+        combos = [(table.combo_mask(combo), table.combo_blocked_mask(combo), table.combo_hours(combo))
+                  for combo in table.valid_combos]
+        checks = list(UNMET_LIMITS)
+        day_count = len(self.day_names)
+
+        # Shifts without a free desk, per day (as a bitmask)
+        full_masks = []
+        for day_idx, day in enumerate(self.day_names):
+            desks = self.desks_per_day.get(day, 0)
+            fill = self.index.shift_fill[day_idx]
+            full_masks.append(sum(1 << idx for idx in range(len(self.timeslot_codes)) if fill[idx] >= desks))
+        seat_blocked = {}  # Typed desks: {(day_idx, qualifications): shifts with no desk for them}
+
+        entries = []
+        for person in self.people:
+            person_id = person.id
+            scheduled = self.hours_scheduled[person_id]
+            missing = person.preferred_hours - scheduled
+            if missing <= 0:
+                continue
+            budget = min(missing, person.max_hours - scheduled)
+            weekly_cap = person.preferred_hours / 2 + weekly_variance
+            counts = [0] * len(checks)
+            for day_idx in range(day_count):
+                available = person.availability[day_idx]
+                assigned = self.assigned_shifts[person_id * day_count + day_idx]
+                full = full_masks[day_idx]
+                if self.seating is not None:
+                    key = (day_idx, person.qualifications)
+                    if key not in seat_blocked:
+                        seat_blocked[key] = sum(1 << idx for idx, seating in enumerate(self.seating[day_idx])
+                                                if not seating.can_seat(person.qualifications))
+                    full |= seat_blocked[key]
+                week_hours = self.index.week_hours[0 if day_idx < ScheduleIndex.WEEK_LENGTH else 1][person_id]
+                for mask, blocked, hours in combos:
+                    if mask & ~available or (mask | blocked) & assigned:
+                        counts[0] += 1
+                    elif mask & full:
+                        counts[1] += 1
+                    elif week_hours + hours > weekly_cap:
+                        counts[2] += 1
+                    elif hours > budget:
+                        counts[3] += 1
+                    else:
+                        counts[4] += 1
+            furthest = max(idx for idx, count in enumerate(counts) if count)
+            entries.append({
+                'name': person.name,
+                'scheduled': scheduled,
+                'preferred': person.preferred_hours,
+                'missing': missing,
+                'limit': checks[furthest],
+                'options': {check: count for check, count in zip(checks, counts) if count}
+            })
+        entries.sort(key=lambda entry: (-entry['missing'], entry['name']))
+        return entries
+
+    def format_unmet_hours(self, entries, limit=None):
+        """One line per person from unmet_hours (the first `limit` people if given)"""
+        shown = entries if limit is None else entries[:limit]
+        lines = [f"  {entry['name']}: {entry['missing']:.1f}h below preferred - {UNMET_LIMITS[entry['limit']]}"
+                 for entry in shown]
+        if len(shown) < len(entries):
+            lines.append(f"  ... and {len(entries) - len(shown)} more")
+        return "\n".join(lines)
+
+    def explain(self, person_id):
+        """
+        Text on how a person's schedule came about, from the decision trace
+
+        Lists the solver's decisions for them (oldest first) and, per day, the
+        options that were ruled out and why. The trace has to be enabled for
+        the solve; manual edits afterwards aren't in it.
+        """
+        person = self.people[person_id]
+        lines = [f"{person.name}: {self.hours_scheduled[person_id]:.1f}h scheduled (preferred "
+                 f"{person.preferred_hours}h, agreed {person.agreed_hours}h, max {person.max_hours}h)"]
+        trace = self.trace
+        if not trace.enabled:
+            lines.append("No decision trace was recorded for this schedule")
+            return "\n".join(lines)
+
+        lines.append("Decisions:")
+        if trace.steps > len(trace.records):
+            lines.append(f"  (only the last {len(trace.records)} of {trace.steps} decisions were kept)")
+        records = trace.for_person(person_id)
+        for entry in records:
+            if entry['shifts']:
+                choice = (f"{self.day_names[entry['day_idx']]} {' '.join(entry['shifts'])} "
+                          f"({entry['hours']:.1f}h, score {entry['score']:.1f})")
+            else:
+                choice = "nothing"
+            line = f"  {entry['mode']}: {choice}, {entry['open_candidates']} option(s) open"
+            if entry['repeats'] > 1:
+                line += f" ({entry['repeats']} times)"
+            if entry['rejected']:
+                line += "; ruled out: " + ", ".join(f"{reason} {count}"
+                                                    for reason, count in sorted(entry['rejected'].items()))
+            lines.append(line)
+        if not records:
+            lines.append("  none" + (" (no preferred hours)" if person.preferred_hours <= 0 else ""))
+
+        lines.append("Options ruled out per day:")
+        day_count = len(self.day_names)
+        for day_idx, day in enumerate(self.day_names):
+            mask = self.assigned_shifts[person_id * day_count + day_idx]
+            codes = [self.timeslot_codes[idx] for idx in self.shift_table.mask_indices(mask)]
+            scheduled = f" (scheduled {' '.join(codes)})" if codes else ""
+            removed = trace.removed_for(person_id, day_idx)
+            reasons = ", ".join(f"{reason} {count}" for reason, count in sorted(removed.items())) or "none"
+            lines.append(f"  {day}{scheduled}: {reasons}")
+        return "\n".join(lines)
+
+    def convert_to_person_schedule(self):
+        """Convert the shift bitmasks to a person-based schedule with shift grouping"""
+        bits = self.shift_table.bits
+        day_count = len(self.day_names)
+        for day_idx, day in enumerate(self.day_names):
+            person_shifts = {}
+
+            for person in self.people:
+                mask = self.assigned_shifts[person.id * day_count + day_idx]
+                # If person has shifts, create entry
+                if mask:
+                    person_shifts[person.name] = {
+                        'shifts': [code for code in self.timeslot_codes if mask & bits[code]],
+                        'hours': self.index.day_hours[person.id * day_count + day_idx]
+                    }
+
+            self.schedule[day] = person_shifts
+
+    def staffing_floors(self, min_staff=None):
+        """Minimum staffing (default: the engine's) as {(day_idx, shift_idx): people}; day-specific entries win"""
+        index = self.shift_table.index
+        floors = {}
+        for specific in (False, True):
+            for key, count in (self.min_staff if min_staff is None else min_staff).items():
+                day, _, code = key.rpartition(' ')
+                if bool(day) != specific or code not in index:
+                    continue
+                for day_idx in ([DAYS.index(day)] if day else range(len(self.day_names))):
+                    if count > 0:
+                        floors[(day_idx, index[code])] = count
+                    else:
+                        floors.pop((day_idx, index[code]), None)
+        return floors
+
+    def analyze_staffing(self, desks_per_day, min_staff):
+        """
+        Minimum staffing that can't be met whatever the solver does
+
+        A minimum is out of reach when the day has fewer desks, or fewer people
+        who are available for the shift and have hours to give, than it asks
+        for. Availability is counted in one pass over the bitmasks. Returns
+        [{'day', 'shift', 'minimum', 'possible', 'limit'}] with limit 'desks'
+        or 'availability'.
+        """
+        floors = self.staffing_floors(min_staff)
+        if not floors:
+            return []
+        codes = self.timeslot_codes
+        available = [[0] * len(codes) for _ in self.day_names]
+        for person in self.people:
+            if person.preferred_hours <= 0 or person.max_hours <= 0:
+                continue
+            for day_idx, mask in enumerate(person.availability):
+                day_available = available[day_idx]
+                for shift_idx in self.shift_table.mask_indices(mask):
+                    day_available[shift_idx] += 1
+
+        shortfalls = []
+        for (day_idx, shift_idx), minimum in sorted(floors.items()):
+            desks = max(0, desks_per_day[self.day_names[day_idx]])
+            people = available[day_idx][shift_idx]
+            if min(desks, people) < minimum:
+                shortfalls.append({
+                    'day': self.day_names[day_idx],
+                    'shift': codes[shift_idx],
+                    'minimum': minimum,
+                    'possible': min(desks, people),
+                    'limit': 'desks' if desks < people else 'availability'
+                })
+        return shortfalls
+
+    def staffing_shortfalls(self):
+        """Shifts of the current schedule below their minimum: [{'day', 'shift', 'minimum', 'staffed'}]"""
+        shortfalls = []
+        for (day_idx, shift_idx), minimum in sorted(self.staffing_floors().items()):
+            staffed = len(self.occupancy[day_idx][shift_idx])
+            if staffed < minimum:
+                shortfalls.append({
+                    'day': self.day_names[day_idx],
+                    'shift': self.timeslot_codes[shift_idx],
+                    'minimum': minimum,
+                    'staffed': staffed
+                })
+        return shortfalls
+
+    def format_staffing_report(self, shortfalls):
+        """Format analyze_staffing or staffing_shortfalls results for display"""
+        lines = []
+        for entry in shortfalls:
+            if 'possible' in entry:
+                limit = "desks" if entry['limit'] == 'desks' else "people available"
+                lines.append(f"  {entry['day']} {entry['shift']}: minimum {entry['minimum']}, "
+                             f"at most {entry['possible']} ({limit})")
+            else:
+                lines.append(f"  {entry['day']} {entry['shift']}: {entry['staffed']} of {entry['minimum']}")
+        return "\n".join(lines)
+
+    def analyze_feasibility(self, desks_per_day, weekly_variance, total_hours_target):
+        """
+        Compute an upper bound on schedulable hours with a max-flow model.
+
+        Network (capacities in half hours so everything stays integer):
+            source -> person            max_hours
+            person -> person/week       preferred/2 + weekly_variance
+            person/week -> person/day/group
+                                        most hours workable in the overlap group
+                                        (overlapping shifts can't both be worked)
+            person/day/group -> day/shift
+                                        shift hours, if the person is available
+            day/shift -> sink           desks * shift hours
+
+        The greedy can never schedule more than the max flow, so a target above
+        it is unreachable. Returns a report dict.
+        """
+        # Groups of overlapping shifts (e.g. 0930/1030 and 1300/1300F)
+        overlap_groups = self.shift_table.overlap_groups()
+        half = {code: int(round(self.shift_definitions[code]['hours'] * 2)) for code in self.timeslot_codes}
+
+        people_to_schedule = [p for p in self.people if p.preferred_hours > 0]
+
+        # Node numbering
+        source, sink = 0, 1
+        next_node = 2
+        shift_nodes = {}
+        for day in self.day_names:
+            for code in self.timeslot_codes:
+                shift_nodes[(day, code)] = next_node
+                next_node += 1
+        node_count = next_node + len(people_to_schedule) * (1 + 2 + len(self.day_names) * len(overlap_groups))
+
+        network = FlowNetwork(node_count)
+        shift_edges = {}
+        for (day, code), node in shift_nodes.items():
+            shift_edges[(day, code)] = network.add_edge(node, sink, max(0, desks_per_day[day]) * half[code])
+
+        availability_half_hours = 0
+        for person in people_to_schedule:
+            person_node = next_node
+            next_node += 1
+            network.add_edge(source, person_node, person.max_hours * 2)
+
+            weekly_cap = int((person.preferred_hours / 2 + weekly_variance) * 2)
+            week_nodes = []
+            for _ in range(2):
+                week_nodes.append(next_node)
+                network.add_edge(person_node, next_node, min(weekly_cap, person.max_hours * 2))
+                next_node += 1
+
+            for day_idx, day in enumerate(self.day_names):
+                week_node = week_nodes[0] if day_idx < 4 else week_nodes[1]
+                availability = person.availability[day_idx]
+                for group in overlap_groups:
+                    available = [code for code in group if availability & self.shift_table.bits[code]]
+                    group_node = next_node
+                    next_node += 1
+                    if not available:
+                        continue
+                    available_mask = self.shift_table.combo_mask(available)
+                    group_cap = max(int(round(self.shift_table.combo_hours(combo) * 2))
+                                    for combo in self.shift_table.valid_combos
+                                    if not self.shift_table.combo_mask(combo) & ~available_mask)
+                    availability_half_hours += group_cap
+                    network.add_edge(week_node, group_node, group_cap)
+                    for code in available:
+                        network.add_edge(group_node, shift_nodes[(day, code)], half[code])
+
+        max_flow = network.max_flow(source, sink)
+        upper_bound = max_flow / 2
+
+        # Per-day usage of desk capacity
+        days = []
+        for day in self.day_names:
+            capacity = sum(network.capacities[shift_edges[(day, code)]] for code in self.timeslot_codes) / 2
+            used = sum(network.flow(shift_edges[(day, code)]) for code in self.timeslot_codes) / 2
+            saturated = [code for code in self.timeslot_codes
+                         if network.capacities[shift_edges[(day, code)]] > 0
+                         and network.flow(shift_edges[(day, code)]) == network.capacities[shift_edges[(day, code)]]]
+            days.append({
+                'day': day,
+                'desk_capacity_hours': capacity,
+                'max_schedulable_hours': used,
+                'saturated_shifts': saturated,
+                'bottleneck': 'desks' if used >= capacity else ('staff availability' if not saturated else 'mixed')
+            })
+
+        desk_capacity = sum(entry['desk_capacity_hours'] for entry in days)
+        combined_max_hours = sum(p.max_hours for p in people_to_schedule)
+        availability_hours = availability_half_hours / 2
+
+        # Name the tightest simple bound as the likely limiting factor
+        limits = [
+            ('desk capacity', desk_capacity),
+            ('combined max hours', combined_max_hours),
+            ('availability density', availability_hours)
+        ]
+        limiting_factor = min(limits, key=lambda item: item[1])[0]
+        if upper_bound < min(value for _, value in limits):
+            limiting_factor = 'weekly variance / overlapping availability'
+
+        return {
+            'target_hours': total_hours_target,
+            'upper_bound_hours': upper_bound,
+            'feasible': total_hours_target <= upper_bound,
+            'desk_capacity_hours': desk_capacity,
+            'combined_max_hours': combined_max_hours,
+            'availability_hours': availability_hours,
+            'limiting_factor': limiting_factor,
+            'days': days
+        }
+
+    def format_feasibility_report(self, report):
+        """Format a feasibility report for display"""
+        lines = [
+            f"Target: {report['target_hours']:.1f}h",
+            f"Upper bound: {report['upper_bound_hours']:.1f}h",
+            "",
+            f"Desk capacity: {report['desk_capacity_hours']:.1f}h",
+            f"Combined max hours: {report['combined_max_hours']:.1f}h",
+            f"Available hours: {report['availability_hours']:.1f}h",
+            f"Limiting factor: {report['limiting_factor']}",
+            "",
+            "Per day (schedulable / capacity):"
+        ]
+        for entry in report['days']:
+            line = (f"  {entry['day']}: {entry['max_schedulable_hours']:.1f}h / "
+                    f"{entry['desk_capacity_hours']:.1f}h ({entry['bottleneck']})")
+            if entry['saturated_shifts']:
+                line += f"  full: {', '.join(entry['saturated_shifts'])}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def run_scheduling_algorithm(self, desks_per_day, rigidity, weekly_variance, total_hours_target,
+                                 phase1='greedy'):
+        """
+        Priority-Based Scheduling Algorithm with Fixed Shifts:
+
+        HARD CONSTRAINTS:
+        1. Never exceed desk capacity per shift (ABSOLUTE HARD LIMIT)
+        2. Never schedule someone for over their max hours (ABSOLUTE HARD LIMIT)
+        3. Weekly variance limit: |week_hours - preferred/2| <= weekly_variance (per week)
+        4. Prevent conflicting shift assignments (overlapping time slots)
+
+        PRIORITIES:
+        1. Schedule everyone with nonzero preferred hours
+        2. Get everyone to their preferred hours (can exceed total target for this)
+        3. Try to meet or exceed total hours target
+        4. Respect rigidity parameter for shift combinations
+        5. Prefer longer shifts when possible
+
+        Phase 1 is greedy in roster order, or with phase1='matching' a maximum
+        matching of people to desk slots (see match_initial_shifts). Right
+        after it, shifts below their minimum staffing are filled first (see
+        fill_staffing_floors).
+        """
+
+        # Get people with nonzero preferred hours
+        people_to_schedule = [p for p in self.people if p.preferred_hours > 0]
+
+        # Per-person candidate lists that shrink as shifts and budgets fill up.
+        # People left without any option are dropped from all phases.
+        people_to_schedule = self.build_candidate_lists(people_to_schedule, desks_per_day,
+                                                        rigidity, weekly_variance)
+
+        # Phase 1: Give everyone at least one shift combination
+        phase_started = self.stats.start()
+        if phase1 == 'matching':
+            self.match_initial_shifts(people_to_schedule)
+        for person in people_to_schedule:
+            if self.hours_scheduled[person.id] == 0:
+                shift_combo = self.find_best_available_shift_combo(person, 'initial')
+                if shift_combo:
+                    self.assign_shift_combo_to_person(person, shift_combo)
+        self.stats.stop('phase_initial', phase_started)
+
+        # Minimum staffing: fill the most understaffed shifts before anyone gets more hours
+        floors = self.staffing_floors()
+        if floors:
+            phase_started = self.stats.start()
+            self.fill_staffing_floors(floors)
+            self.stats.stop('phase_floors', phase_started)
+
+        # Phase 2: AGGRESSIVELY fill everyone to their preferred hours
+        phase_started = self.stats.start()
+        max_iterations = 100
+        iteration = 0
+
+        while iteration < max_iterations:
+            iteration += 1
+            progress_made = False
+
+            # Sort by distance from preferred hours (furthest first)
+            for person in sorted(people_to_schedule,
+                               key=lambda p: p.preferred_hours - self.hours_scheduled[p.id],
+                               reverse=True):
+
+                # Try to get closer to preferred hours
+                if self.hours_scheduled[person.id] < person.preferred_hours:
+                    shift_combo = self.find_best_available_shift_combo(person, 'preferred')
+                    if shift_combo:
+                        self.assign_shift_combo_to_person(person, shift_combo)
+                        progress_made = True
+
+            if not progress_made:
+                break
+        self.stats.stop('phase_preferred', phase_started)
+
+        # Phase 3: If still under target, use agreed hours tier
+        phase_started = self.stats.start()
+        total_scheduled = self.index.total
+
+        if total_scheduled < total_hours_target:
+            iteration = 0
+            while total_scheduled < total_hours_target and iteration < max_iterations:
+                iteration += 1
+                progress_made = False
+
+                for person in sorted(people_to_schedule,
+                                   key=lambda p: p.agreed_hours - self.hours_scheduled[p.id],
+                                   reverse=True):
+
+                    if self.hours_scheduled[person.id] < person.agreed_hours:
+                        shift_combo = self.find_best_available_shift_combo(person, 'agreed')
+                        if shift_combo:
+                            self.assign_shift_combo_to_person(person, shift_combo)
+                            total_scheduled = self.index.total
+                            progress_made = True
+
+                            if total_scheduled >= total_hours_target:
+                                break
+
+                if not progress_made or total_scheduled >= total_hours_target:
+                    break
+        self.stats.stop('phase_agreed', phase_started)
+
+        # Phase 4: If still under target, use max hours tier
+        phase_started = self.stats.start()
+        if total_scheduled < total_hours_target:
+            iteration = 0
+            while total_scheduled < total_hours_target and iteration < max_iterations:
+                iteration += 1
+                progress_made = False
+
+                for person in sorted(people_to_schedule,
+                                   key=lambda p: p.max_hours - self.hours_scheduled[p.id],
+                                   reverse=True):
+
+                    if self.hours_scheduled[person.id] < person.max_hours:
+                        shift_combo = self.find_best_available_shift_combo(person, 'max')
+                        if shift_combo:
+                            self.assign_shift_combo_to_person(person, shift_combo)
+                            total_scheduled = self.index.total
+                            progress_made = True
+
+                            if total_scheduled >= total_hours_target:
+                                break
+
+                if not progress_made or total_scheduled >= total_hours_target:
+                    break
+        self.stats.stop('phase_max', phase_started)
+
+    def fill_staffing_floors(self, floors):
+        """
+        Bring shifts up to their minimum staffing, most understaffed first
+
+        floors: {(day_idx, shift_idx): minimum people}. A heap holds
+        (staffed - minimum, day_idx, shift_idx), so the biggest deficit comes
+        out first. Entries are compared with the current fill when popped:
+        one combo can staff several shifts, and a stale entry is simply queued
+        again with its new deficit. Each step adds the best eligible person
+        (see find_floor_candidate) within their preferred hours, or else
+        their agreed hours, or else their max hours. Shifts nobody can be
+        found for stay short (see staffing_shortfalls).
+        """
+        heap = []
+        for (day_idx, shift_idx), minimum in floors.items():
+            staffed = len(self.occupancy[day_idx][shift_idx])
+            if staffed < minimum:
+                heap.append((staffed - minimum, day_idx, shift_idx))
+        heapq.heapify(heap)
+
+        while heap:
+            deficit, day_idx, shift_idx = heapq.heappop(heap)
+            current = len(self.occupancy[day_idx][shift_idx]) - floors[(day_idx, shift_idx)]
+            if current >= 0:
+                continue
+            if current != deficit:
+                heapq.heappush(heap, (current, day_idx, shift_idx))
+                continue
+
+            for mode in ('preferred', 'agreed', 'max'):
+                choice = self.find_floor_candidate(day_idx, shift_idx, mode)
+                if choice:
+                    break
+            else:
+                continue  # Nobody left who can work it
+            person, shift_combo = choice
+            if self.trace.enabled:
+                score = self.combo_score(day_idx, shift_combo['combo_idx'], self.objective.person_terms(self, person))
+                self.trace.record(person.id, 'floors', shift_combo, score, len(self.candidates[person.id]), {})
+            self.assign_shift_combo_to_person(person, shift_combo)
+            if self.stats.enabled:
+                self.stats.counters['floor_assignments'] += 1
+            heapq.heappush(heap, (current + 1, day_idx, shift_idx))
+
+    def find_floor_candidate(self, day_idx, shift_idx, mode):
+        """
+        Best (person, shift combo) that adds someone to one shift, or None
+
+        Only looks at people with a remaining candidate using the shift
+        (candidate_index). Prefers whoever has the most hours left in the
+        mode's budget, then the combo with the best combo_score.
+        """
+        best = None
+        best_key = None
+        combos = self.combos_by_shift[shift_idx]
+        for person_id in self.candidate_index.get((day_idx, shift_idx), ()):
+            entries = self.candidates[person_id]
+            person = self.people[person_id]
+            budget = self.hours_budget(person, mode)
+            if budget <= 0:
+                continue
+            person_terms = self.objective.person_terms(self, person)
+            for combo_idx in combos:
+                if (day_idx, combo_idx) not in entries or self.combo_hours[combo_idx] > budget:
+                    continue
+                key = (-budget, self.combo_score(day_idx, combo_idx, person_terms), person_id)
+                if best_key is None or key < best_key:
+                    best_key = key
+                    best = (person, {
+                        'day_idx': day_idx,
+                        'combo_idx': combo_idx,
+                        'day': self.day_names[day_idx],
+                        'shifts': self.combo_priorities[combo_idx],
+                        'hours': self.combo_hours[combo_idx]
+                    })
+        return best
+
+    def match_initial_shifts(self, people):
+        """
+        Phase 1 as a maximum bipartite matching between people and desk slots
+
+        Left: people without hours yet. Right: one node per free desk in each
+        (day, shift). A person is linked to a slot when one of their remaining
+        candidates (within the initial-phase budget) uses that shift. After
+        Hopcroft-Karp, every matched person gets their best-scoring candidate
+        that uses the matched shift, preferring combos whose other shifts
+        don't take desks reserved for other matched people. Anyone left
+        without a shift goes through the greedy step as before.
+        """
+        # Right side: free desk slots (with typed desks, one per free desk with its type)
+        slot_nodes = {}  # {(day_idx, shift_idx): [node]}
+        slot_of = []     # node -> (day_idx, shift_idx)
+        slot_types = []  # node -> desk type (None = general)
+        for day_idx in range(len(self.day_names)):
+            for shift_idx in range(len(self.timeslot_codes)):
+                if self.seating is not None:
+                    seating = self.seating[day_idx][shift_idx]
+                    free_types = [seating.desk_types[desk] for desk, occupant in enumerate(seating.occupant)
+                                  if occupant == -1]
+                else:
+                    free = self.candidate_desks[day_idx] - len(self.occupancy[day_idx][shift_idx])
+                    free_types = [None] * max(0, free)
+                slot_nodes[(day_idx, shift_idx)] = list(range(len(slot_of), len(slot_of) + len(free_types)))
+                slot_of.extend([(day_idx, shift_idx)] * len(free_types))
+                slot_types.extend(free_types)
+
+        # Left side: people with no hours yet, slots in their candidate order
+        left = []
+        adjacency = []
+        for person in people:
+            current = self.hours_scheduled[person.id]
+            if current != 0:
+                continue
+            budget = min(person.preferred_hours, person.max_hours) - current
+            seen = set()
+            nodes = []
+            for day_idx, combo_idx in self.candidates[person.id]:
+                if self.combo_hours[combo_idx] > budget:
+                    continue
+                for shift_idx in self.combo_shifts[combo_idx]:
+                    if (day_idx, shift_idx) not in seen:
+                        seen.add((day_idx, shift_idx))
+                        nodes.extend(node for node in slot_nodes[(day_idx, shift_idx)]
+                                     if slot_types[node] is None or slot_types[node] in person.qualifications)
+            if nodes:
+                left.append(person)
+                adjacency.append(nodes)
+
+        match_left, _ = hopcroft_karp(adjacency, len(slot_of))
+
+        reserved = defaultdict(int)  # {(day_idx, shift_idx): matched people not yet assigned}
+        for node in match_left:
+            if node != -1:
+                reserved[slot_of[node]] += 1
+
+        matched = 0
+        for person, node in zip(left, match_left):
+            if node == -1:
+                continue
+            day_idx, shift_idx = slot_of[node]
+            reserved[(day_idx, shift_idx)] -= 1
+            budget = min(person.preferred_hours, person.max_hours) - self.hours_scheduled[person.id]
+
+            best = None  # (respects reservations, -score) - larger is better
+            person_terms = self.objective.person_terms(self, person)
+            for key in self.candidates[person.id]:
+                if key[0] != day_idx or shift_idx not in self.combo_shifts[key[1]]:
+                    continue
+                if self.combo_hours[key[1]] > budget:
+                    continue
+                fits = all(len(self.occupancy[day_idx][other]) + reserved[(day_idx, other)]
+                           < self.candidate_desks[day_idx]
+                           for other in self.combo_shifts[key[1]] if other != shift_idx)
+                rank = (fits, -self.combo_score(day_idx, key[1], person_terms))
+                if best is None or rank > best[0]:
+                    best = (rank, key[1])
+            if best is None:
+                continue
+
+            combo_idx = best[1]
+            shift_combo = {
+                'day_idx': day_idx,
+                'combo_idx': combo_idx,
+                'day': self.day_names[day_idx],
+                'shifts': self.combo_priorities[combo_idx],
+                'hours': self.combo_hours[combo_idx]
+            }
+            if self.trace.enabled:
+                self.trace.record(person.id, 'matching', shift_combo, -best[0][1],
+                                  len(self.candidates[person.id]), {})
+            self.assign_shift_combo_to_person(person, shift_combo)
+            matched += 1
+
+        if self.stats.enabled:
+            self.stats.counters['phase1_matched'] += matched
+
+    def combo_score(self, day_idx, combo_idx, person_terms=None):
+        """
+        Score of a candidate as used by the search (lower is better, see Objective)
+
+        person_terms: the person's Objective.person_terms, if the objective has them
+        """
+        day_shifts = self.occupancy[day_idx]
+        shift_indices = self.combo_shifts[combo_idx]
+        avg_fill = sum(len(day_shifts[shift_idx]) for shift_idx in shift_indices) / len(shift_indices)
+        score = avg_fill * self.objective.weights['fill_balance'] + self.objective.length_terms[combo_idx]
+        if person_terms is not None:
+            score += person_terms[day_idx][combo_idx]
+        return score
+
+    def get_combo_priorities(self, rigidity):
+        """
+        Shift combinations to try, in priority order, for a rigidity level
+
+        - High (70-100): Prefer longer single shifts (0930 or 1300F)
+        - Medium (30-70): Allow mid-length shifts (1030, 1300, 1300F)
+        - Low (0-30): Allow any shift, including shorter ones
+
+        The lists come from the shift file (see ShiftTable).
+        """
+        return self.shift_table.priorities_for(rigidity)
+
+    def build_candidate_lists(self, people, desks_per_day, rigidity, weekly_variance):
+        """
+        Build each person's list of still-feasible (day, combo) candidates
+
+        candidates: [{(day_idx, combo_idx): None}] indexed by person id
+        Entries are inserted day by day in combo priority order, the same order
+        the search used to scan, so ties are still broken the same way. An entry
+        is only removed once it can never become feasible again (shift full,
+        over max hours or weekly variance, overlapping an assigned shift), since
+        all of those only get worse as the solve progresses.
+
+        Building the lists is also the pruning pass: every (person, day, combo)
+        option is checked once against availability, days without desks, max
+        hours, the weekly variance bound on its own and any existing
+        assignments. None of these rules depend on each other's removals, so
+        one pass reaches the fixpoint; afterwards people with no options left
+        are dropped. prune_report records how much of the option space went.
+
+        Returns the people who still have options, in the given order.
+        """
+        # Compile the combos for this solve: hours, own bits, bits they block and shift indices
+        table = self.shift_table
+        self.combo_priorities = self.get_combo_priorities(rigidity)
+        self.combo_hours = [table.combo_hours(combo) for combo in self.combo_priorities]
+        self.objective.prepare(self.combo_hours)
+        self.combo_masks = [table.combo_mask(combo) for combo in self.combo_priorities]
+        self.combo_blocked_masks = [table.combo_blocked_mask(combo) for combo in self.combo_priorities]
+        self.combo_shifts = [[table.index[code] for code in combo] for combo in self.combo_priorities]
+        # combos_by_shift[shift_idx] -> [combo_idx] - combos that use a shift
+        self.combos_by_shift = [[idx for idx, shifts in enumerate(self.combo_shifts) if shift_idx in shifts]
+                                for shift_idx in range(len(self.timeslot_codes))]
+        self.candidate_desks = [desks_per_day[day] for day in self.day_names]
+        self.candidate_weekly_variance = weekly_variance
+
+        self.candidates = [{} for _ in self.people]
+        # {(day_idx, shift_idx): ids of people with a candidate using that shift}
+        self.candidate_index = defaultdict(set)
+        # Typed desks: the same per qualification set, {(day_idx, shift_idx): {qualifications: ids}}
+        self.candidate_classes = defaultdict(lambda: defaultdict(set)) if self.seating is not None else None
+
+        combo_count = len(self.combo_priorities)
+        pruned = defaultdict(int)  # {reason: options removed}
+        trace = self.trace if self.trace.enabled else None
+        if trace is not None:
+            trace.removed.clear()  # Rebuilt from scratch like the lists
+        kept_people = []
+        for person in people:
+            entries = self.candidates[person.id]
+            for day_idx in range(len(self.day_names)):
+                if self.candidate_desks[day_idx] <= 0:
+                    pruned['no_desks'] += combo_count
+                    if trace is not None:
+                        trace.remove(person.id, day_idx, 'no_desks', combo_count)
+                    continue
+                available_mask = person.availability[day_idx]
+                for combo_idx, shift_indices in enumerate(self.combo_shifts):
+                    if self.combo_masks[combo_idx] & ~available_mask:
+                        reason = 'availability'
+                    else:
+                        reason = self.candidate_rejection(person, day_idx, combo_idx)
+                    if reason:
+                        pruned[reason] += 1
+                        if trace is not None:
+                            trace.remove(person.id, day_idx, reason)
+                        continue
+                    entries[(day_idx, combo_idx)] = None
+                    for shift_idx in shift_indices:
+                        self.candidate_index[(day_idx, shift_idx)].add(person.id)
+                        if self.candidate_classes is not None:
+                            self.candidate_classes[(day_idx, shift_idx)][person.qualifications].add(person.id)
+            if entries:
+                kept_people.append(person)
+
+        total = len(people) * len(self.day_names) * combo_count
+        removed = sum(pruned.values())
+        self.prune_report = {
+            'options': total,
+            'pruned': removed,
+            'pruned_fraction': removed / total if total else 0.0,
+            'by_reason': dict(pruned),
+            'people_without_options': len(people) - len(kept_people)
+        }
+        if self.stats.enabled:
+            self.stats.counters['options_total'] += total
+            self.stats.counters['options_pruned'] += removed
+        return kept_people
+
+    def candidate_rejection(self, person, day_idx, combo_idx):
+        """
+        Return why a candidate can never be used again, or None if it still can
+
+        Only checks constraints that get monotonically tighter during a solve.
+        Availability is checked once when the lists are built.
+        """
+        person_id = person.id
+        combo_hours = self.combo_hours[combo_idx]
+
+        # Never exceed max hours
+        if combo_hours > person.max_hours - self.hours_scheduled[person_id]:
+            return 'hours_budget'
+
+        # Check if person already in any of these shifts (prevent duplicates)
+        assigned = self.assigned_shifts[person_id * len(self.day_names) + day_idx]
+        if self.combo_masks[combo_idx] & assigned:
+            return 'already_in_shift'
+
+        # Check for conflicting overlapping shifts (e.g. 0930/1030, 1300/1300F)
+        if self.combo_blocked_masks[combo_idx] & assigned:
+            return 'overlap'
+
+        # Check if all shifts have desk capacity
+        desks = self.candidate_desks[day_idx]
+        day_shifts = self.occupancy[day_idx]
+        if any(len(day_shifts[shift_idx]) >= desks for shift_idx in self.combo_shifts[combo_idx]):
+            return 'desk_capacity'
+
+        # With typed desks, there must be a desk the person is qualified for
+        if self.seating is not None:
+            day_seating = self.seating[day_idx]
+            if not all(day_seating[shift_idx].can_seat(person.qualifications)
+                       for shift_idx in self.combo_shifts[combo_idx]):
+                return 'desk_type'
+
+        # Check weekly variance constraint
+        # Week 1: days 0-3, Week 2: days 4-7
+        # Weekly target is half of preferred (preferred is for 2 weeks)
+        current_week_hours = self.week1_hours[person_id] if day_idx < 4 else self.week2_hours[person_id]
+        weekly_target = person.preferred_hours / 2
+        if current_week_hours + combo_hours > weekly_target + self.candidate_weekly_variance:
+            return 'weekly_variance'
+
+        return None
+
+    def invalidate_candidates(self, person, day_idx, combo_idx):
+        """Drop candidates that an assignment made permanently infeasible"""
+        rejections = self.stats.rejections if self.stats.enabled else None
+        trace = self.trace if self.trace.enabled else None
+
+        # Shifts that just reached their desk limit: drop them for everyone
+        desks = self.candidate_desks[day_idx]
+        for shift_idx in self.combo_shifts[combo_idx]:
+            if len(self.occupancy[day_idx][shift_idx]) < desks:
+                continue
+            for other_id in self.candidate_index.pop((day_idx, shift_idx), ()):
+                entries = self.candidates[other_id]
+                for other_combo in self.combos_by_shift[shift_idx]:
+                    if entries.pop((day_idx, other_combo), False) is None:
+                        if rejections is not None:
+                            rejections['desk_capacity'] += 1
+                        if trace is not None:
+                            trace.remove(other_id, day_idx, 'desk_capacity')
+            if self.candidate_classes is not None:
+                self.candidate_classes.pop((day_idx, shift_idx), None)
+
+        # Typed desks: qualification sets that can't be seated in these shifts any more.
+        # Seating only gets harder as a shift fills, so they're dropped for good.
+        if self.candidate_classes is not None:
+            for shift_idx in self.combo_shifts[combo_idx]:
+                classes = self.candidate_classes.get((day_idx, shift_idx))
+                if not classes:
+                    continue
+                seating = self.seating[day_idx][shift_idx]
+                for qualifications in [q for q in classes if not seating.can_seat(q)]:
+                    for other_id in classes.pop(qualifications):
+                        entries = self.candidates[other_id]
+                        for other_combo in self.combos_by_shift[shift_idx]:
+                            if entries.pop((day_idx, other_combo), False) is None:
+                                if rejections is not None:
+                                    rejections['desk_type'] += 1
+                                if trace is not None:
+                                    trace.remove(other_id, day_idx, 'desk_type')
+
+        # The person's budget, weekly room and day occupancy changed:
+        # re-check their own remaining candidates
+        entries = self.candidates[person.id]
+        if not entries:
+            return
+        for key in list(entries):
+            reason = self.candidate_rejection(person, *key)
+            if reason:
+                del entries[key]
+                if rejections is not None:
+                    rejections[reason] += 1
+                if trace is not None:
+                    trace.remove(person.id, key[0], reason)
+
+    def hours_budget(self, person, mode):
+        """Hours a person can still get in a phase ('initial', 'preferred', 'agreed' or 'max')"""
+        current_hours = self.hours_scheduled[person.id]
+        if mode == 'preferred' or mode == 'initial':
+            hours_budget = person.preferred_hours - current_hours
+        elif mode == 'agreed':
+            hours_budget = person.agreed_hours - current_hours
+        else:
+            hours_budget = person.max_hours - current_hours
+
+        # Never exceed max hours
+        return min(hours_budget, person.max_hours - current_hours)
+
+    def find_best_available_shift_combo(self, person, mode):
+        """
+        Find the best available shift combination for a person
+
+        Scans only the person's remaining candidates (see build_candidate_lists),
+        so capacity, overlap, max hours and weekly variance are already satisfied.
+        What's left to check depends on the phase: the mode's hours budget and,
+        in the initial phase, one combination per day.
+        """
+        best_combo = None
+        best_score = float('inf')
+
+        # Instrumentation: only count when enabled (checked once per call).
+        # With a decision trace, this call's rejections are counted on their own
+        # and added to the stats at the end.
+        rejections = self.stats.rejections if self.stats.enabled else None
+        if rejections is not None:
+            self.stats.counters['find_best_available_shift_combo'] += 1
+        trace = self.trace if self.trace.enabled else None
+        tally = defaultdict(int) if trace is not None else rejections
+
+        hours_budget = self.hours_budget(person, mode)
+        if hours_budget <= 0:
+            if trace is not None:
+                open_candidates = len(self.candidates[person.id])
+                trace.record(person.id, mode, None, None, open_candidates, {'hours_budget': open_candidates})
+            return None
+
+        day_count = len(self.day_names)
+        assigned_base = person.id * day_count
+
+        # The objective's parts that don't depend on the fill, for all candidates at once
+        fill_weight = self.objective.weights['fill_balance']
+        length_terms = self.objective.length_terms
+        person_terms = self.objective.person_terms(self, person)
+
+        for day_idx, combo_idx in self.candidates[person.id]:
+            if rejections is not None:
+                self.stats.counters['candidates_evaluated'] += 1
+
+            # Allow multiple shifts per day only in later phases
+            if mode == 'initial' and self.assigned_shifts[assigned_base + day_idx]:
+                if tally is not None:
+                    tally['day_already_scheduled'] += 1
+                continue
+
+            # Check if within budget
+            combo_hours = self.combo_hours[combo_idx]
+            if combo_hours > hours_budget:
+                if tally is not None:
+                    tally['hours_budget'] += 1
+                continue
+
+            if rejections is not None:
+                self.stats.counters['candidates_feasible'] += 1
+
+            # Calculate score - by default balanced distribution and longer shifts (see Objective)
+            day_shifts = self.occupancy[day_idx]
+            shift_indices = self.combo_shifts[combo_idx]
+            total_fill = sum(len(day_shifts[shift_idx]) for shift_idx in shift_indices)
+            avg_fill = total_fill / len(shift_indices) if shift_indices else 0
+
+            score = avg_fill * fill_weight + length_terms[combo_idx]
+            if person_terms is not None:
+                score += person_terms[day_idx][combo_idx]
+
+            if score < best_score:
+                best_score = score
+                best_combo = {
+                    'day_idx': day_idx,
+                    'combo_idx': combo_idx,
+                    'day': self.day_names[day_idx],
+                    'shifts': self.combo_priorities[combo_idx],
+                    'hours': combo_hours
+                }
+
+        if trace is not None:
+            if rejections is not None:
+                for reason, count in tally.items():
+                    rejections[reason] += count
+            trace.record(person.id, mode, best_combo, best_score, len(self.candidates[person.id]), tally)
+        return best_combo
+
+    def assign_shift_combo_to_person(self, person, shift_combo):
+        """Assign a shift combination to a person and update tracking"""
+        day_idx = shift_combo['day_idx']
+        combo_idx = shift_combo['combo_idx']
+        hours = shift_combo['hours']
+        person_id = person.id
+
+        # Add person to each shift (and seat them when desks are typed)
+        for shift_idx in self.combo_shifts[combo_idx]:
+            self.occupancy[day_idx][shift_idx].append(person_id)
+            if self.seating is not None:
+                self.seating[day_idx][shift_idx].seat(person_id)
+        self.assigned_shifts[person_id * len(self.day_names) + day_idx] |= self.combo_masks[combo_idx]
+
+        # Update person's scheduled hours, week totals and shift fill
+        self.index.add(person, day_idx, self.combo_shifts[combo_idx], hours)
+
+        # Shrink candidate lists
+        self.invalidate_candidates(person, day_idx, combo_idx)
+
+
+    def person_events(self, week_num, year=None):
+        """
+        Every person's shifts as dated events, in one pass over the schedule
+
+        Returns {person_name: [(start_datetime, end_datetime, shift_codes)]}.
+        Consecutive shifts are one event, like in the CSV export.
+        """
+        day_dates = get_day_dates(week_num, year)
+        intervals = self.shift_table.intervals
+        events = defaultdict(list)
+        for day_idx, day in enumerate(self.day_names):
+            midnight = day_dates[day_idx].replace(hour=0, minute=0, second=0, microsecond=0)
+            for person_name, person_data in self.schedule.get(day, {}).items():
+                for block in self.shift_table.group_blocks(person_data['shifts']):
+                    events[person_name].append((midnight + timedelta(minutes=intervals[block[0]][0]),
+                                                midnight + timedelta(minutes=intervals[block[-1]][1]),
+                                                block))
+        return events
+
+    def write_ics_files(self, output_dir, week_num, year=None, workers=8):
+        """
+        Write one .ics calendar per scheduled person into output_dir
+
+        The files are written by a pool of threads (the work is mostly file
+        I/O). Names that come out the same as a file name ("Anne/Marie" and
+        "Anne:Marie") get the person id added, so every person has their own
+        file. Returns the written paths.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        stamp = datetime.now(timezone.utc)
+        events = self.person_events(week_num, year)
+
+        # File names are picked up front so that no two threads write the same path
+        jobs = []
+        used = set()
+        for name in sorted(events):
+            person_id = self.name_to_id[name]
+            file_name = ics_file_name(name)
+            # Compared case-insensitively: Windows and macOS file names are
+            if file_name.lower() in used:
+                file_name = f"{file_name} ({person_id})"
+            used.add(file_name.lower())
+            jobs.append((os.path.join(output_dir, f"{file_name}.ics"), name, person_id))
+
+        def write(job):
+            file_path, name, person_id = job
+            with open(file_path, 'w', newline='', encoding='utf-8') as f:
+                f.write(format_ics(name, events[name], stamp, person_id))
+            return file_path
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            return list(executor.map(write, jobs))
+
+    def write_csv(self, f, week_num, year=None):
+        """Write the schedule as CSV with grouped dates (one row per person per day)"""
+        writer = csv.writer(f)
+        day_dates = get_day_dates(week_num, year)
+
+        # Write header
+        writer.writerow(['Date', 'Person', 'Shift Hours', 'Hours'])
+
+        # Process each day
+        for day_idx, day in enumerate(self.day_names):
+            if day in self.schedule and self.schedule[day]:
+                # Calculate the actual date for this day
+                current_date = day_dates[day_idx]
+                date_str = current_date.strftime('%A %d %b').lower()
+
+                # Get all people scheduled this day, sorted by name
+                people_this_day = sorted(self.schedule[day].items())
+
+                # Write first person with date
+                if people_this_day:
+                    first_person = True
+                    for person_name, person_data in people_this_day:
+                        shifts = person_data['shifts']
+                        hours = person_data['hours']
+
+                        # Format shift times (one range per block of consecutive shifts)
+                        shift_parts = []
+                        for block in self.shift_table.group_blocks(shifts):
+                            start = self.shift_definitions[block[0]]['start']
+                            end = self.shift_definitions[block[-1]]['end']
+                            shift_parts.append(f"{start}-{end}")
+
+                        shifts_str = ', '.join(shift_parts)
+
+                        # Format hours as hours:minutes
+                        hours_int = int(hours)
+                        minutes = int((hours - hours_int) * 60)
+                        hours_str = f"{hours_int}:{minutes:02d}"
+
+                        # Write row (date only for first person)
+                        if first_person:
+                            writer.writerow([date_str, person_name, shifts_str, hours_str])
+                            first_person = False
+                        else:
+                            writer.writerow(['', person_name, shifts_str, hours_str])
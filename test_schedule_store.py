@@ -0,0 +1,50 @@
+"""Tests for the SQLite schedule store"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from schedule_store import ScheduleStore
+from scheduler_headless import period_label, run_season_chain
+from scheduling_engine import DAY_NAMES, ShiftTable, load_roster_csv
+
+SAMPLE_ROSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_students_2weeks.csv")
+
+
+class ScheduleStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store_path = os.path.join(self.directory, "store.db")
+        self.shift_table = ShiftTable.load()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_roster_round_trip(self):
+        people = load_roster_csv(SAMPLE_ROSTER, self.shift_table)
+        with ScheduleStore(self.store_path) as store:
+            period_id = store.import_roster_csv(SAMPLE_ROSTER, "sample", 1, self.shift_table)
+            self.assertEqual(store.load_roster(period_id, self.shift_table), people)
+
+    def test_carry_over_matches_the_in_memory_season(self):
+        periods = [{'roster': SAMPLE_ROSTER, 'week': week, 'desks_per_day': [2] * len(DAY_NAMES),
+                    'rigidity': 50, 'variance': 1.0, 'target': 270, 'phase1': 'greedy', 'desk_types': {},
+                    'min_staff': {}, 'objective': {}}
+                   for week in (1, 3, 5)]
+        _, carry = run_season_chain(periods, None, os.path.join(self.directory, "plain"))
+
+        with ScheduleStore(self.store_path) as store:
+            for period in periods:
+                period['period_id'] = store.import_roster_csv(period['roster'], period_label(period['roster']),
+                                                              period['week'], self.shift_table)
+        _, stored_carry = run_season_chain(periods, None, os.path.join(self.directory, "stored"),
+                                           store_path=self.store_path)
+
+        self.assertTrue(any(carry.values()))
+        self.assertEqual(stored_carry, carry)
+        with ScheduleStore(self.store_path) as store:
+            self.assertEqual(store.hours_owed(), carry)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+"""Tests for the scheduling service's request handling"""
+import json
+import threading
+import unittest
+from concurrent.futures import Future
+
+from scheduler_service import SchedulingService, normalize_request
+
+
+class ImmediateExecutor:
+    """Runs submitted work right away, so the future is done before submit returns"""
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+class SubmitTest(unittest.TestCase):
+    def setUp(self):
+        self.service = SchedulingService(workers=1, timeout=10)
+        self.service.executor.shutdown()
+        self.service.executor = ImmediateExecutor()
+
+    def submit_with_deadline(self, request, seconds=5):
+        """submit() on a thread; fails the test instead of hanging if it never returns"""
+        outcome = []
+        thread = threading.Thread(target=lambda: outcome.append(self.service.submit(request)), daemon=True)
+        thread.start()
+        thread.join(seconds)
+        self.assertFalse(thread.is_alive(), "submit() deadlocked")
+        return outcome[0]
+
+    def test_request_that_finishes_immediately(self):
+        # No name column: run_solve answers 400 at once
+        request = normalize_request({'roster_csv': "who,what\nx,y\n"})
+        status, _, body = self.submit_with_deadline(request)
+        self.assertEqual(status, 400)
+        self.assertIn('error', json.loads(body))
+
+        # The service still answers afterwards and nothing is left in flight
+        self.assertEqual(self.service.status()['pending'], 0)
+        status, _, _ = self.submit_with_deadline(request)
+        self.assertEqual(status, 400)
+
+    def test_malformed_shifts_are_a_bad_request(self):
+        for shifts in ("bad", {'shifts': "bad"}, {'shifts': [{'code': 'A'}]}):
+            request = normalize_request({'roster_csv': "name\nx\n", 'shifts': shifts})
+            status, _, body = self.submit_with_deadline(request)
+            self.assertEqual(status, 400, shifts)
+            self.assertIn("Invalid roster, shifts or minimum staffing", json.loads(body)['error'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""Tests for the scheduling engine"""
+import copy
+import os
+import random
+import unittest
+from array import array
+
+from scheduling_engine import (
+    DAY_NAMES, FlowNetwork, Person, ScheduleEngine, ShiftTable, hopcroft_karp, load_roster_csv, validate_schedule
+)
+
+SAMPLE_ROSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sample_students_2weeks.csv")
+
+
+def sample_engine(shift_table):
+    return ScheduleEngine(load_roster_csv(SAMPLE_ROSTER, shift_table), shift_table)
+
+
+class FeasibilityTest(unittest.TestCase):
+    def setUp(self):
+        self.shift_table = ShiftTable.load()
+
+    def test_max_flow(self):
+        # The textbook network (CLRS 26.1): max flow 23
+        network = FlowNetwork(6)
+        for u, v, capacity in ((0, 1, 16), (0, 2, 13), (1, 3, 12), (2, 1, 4), (2, 4, 14),
+                               (3, 2, 9), (3, 5, 20), (4, 3, 7), (4, 5, 4)):
+            network.add_edge(u, v, capacity)
+        self.assertEqual(network.max_flow(0, 5), 23)
+
+    def test_bound_holds_for_the_solved_schedule(self):
+        for desks in (1, 3, 8):
+            engine = sample_engine(self.shift_table)
+            desks_per_day = {day: desks for day in DAY_NAMES}
+            report = engine.analyze_feasibility(desks_per_day, 1.0, 10000)
+            self.assertFalse(report['feasible'])
+
+            engine.solve(desks_per_day, 50, 1.0, 10000)
+            self.assertLessEqual(engine.index.total, report['upper_bound_hours'], desks)
+            self.assertTrue(engine.analyze_feasibility(desks_per_day, 1.0, engine.index.total)['feasible'])
+
+
+class CandidateListTest(unittest.TestCase):
+    def test_lists_match_a_fresh_check_after_solving(self):
+        shift_table = ShiftTable.load()
+        for desks in (2, 8):
+            engine = sample_engine(shift_table)
+            engine.solve({day: desks for day in DAY_NAMES}, 50, 4.0, 270)
+
+            # Whatever was dropped along the way must still be infeasible, and nothing feasible dropped
+            remaining = 0
+            for person in engine.people:
+                for day_idx in range(len(DAY_NAMES)):
+                    for combo_idx, mask in enumerate(engine.combo_masks):
+                        if mask & ~person.availability[day_idx]:
+                            continue
+                        kept = (day_idx, combo_idx) in engine.candidates[person.id]
+                        feasible = engine.candidate_rejection(person, day_idx, combo_idx) is None
+                        self.assertEqual(kept, feasible, (person.name, day_idx, combo_idx))
+                        remaining += kept
+            if desks == 8:
+                self.assertGreater(remaining, 0)
+
+
+def brute_force_matching_size(adjacency, taken=frozenset(), u=0):
+    """Largest matching by trying every choice for every left node"""
+    if u == len(adjacency):
+        return 0
+    best = brute_force_matching_size(adjacency, taken, u + 1)
+    for v in adjacency[u]:
+        if v not in taken:
+            best = max(best, 1 + brute_force_matching_size(adjacency, taken | {v}, u + 1))
+    return best
+
+
+class MatchingTest(unittest.TestCase):
+    def test_matching_is_maximum(self):
+        rng = random.Random(40)
+        for _ in range(200):
+            left, right = rng.randint(1, 7), rng.randint(1, 7)
+            adjacency = [rng.sample(range(right), rng.randint(0, right)) for _ in range(left)]
+            match_left, match_right = hopcroft_karp(adjacency, right)
+
+            # A valid matching: partners agree and every pair is an edge
+            pairs = [(u, v) for u, v in enumerate(match_left) if v != -1]
+            for u, v in pairs:
+                self.assertIn(v, adjacency[u])
+                self.assertEqual(match_right[v], u)
+            self.assertEqual(len(pairs), sum(u != -1 for u in match_right))
+            self.assertEqual(len(pairs), brute_force_matching_size(adjacency), adjacency)
+
+
+class ValidateScheduleTest(unittest.TestCase):
+    def setUp(self):
+        self.shift_table = ShiftTable.load()
+
+    def test_every_violation_kind(self):
+        bits = self.shift_table.bits
+        everything = self.shift_table.combo_mask(self.shift_table.codes)
+        monday_only = array('I', [bits['0930'] | bits['1300F']] + [0] * (len(DAY_NAMES) - 1))
+        people = [Person("Anne", 4, 4, 4, monday_only),
+                  Person("Bob", 40, 40, 40, array('I', [everything] * len(DAY_NAMES)))]
+        monday, tuesday = DAY_NAMES[0], DAY_NAMES[1]
+        schedule = {
+            'Funday': {},
+            # Anne: 1030 overlaps 0930 and she's not available for it; 5h is over her max
+            # and her week; three people for one 0930 desk
+            monday: {"Anne": {'shifts': ['0930', '1030']}, "Bob": {'shifts': ['0930']},
+                     "Zed": {'shifts': ['0930']}},
+            # Bob has no intake qualification
+            tuesday: {"Bob": {'shifts': ['NOPE', '1300']}}
+        }
+        violations = validate_schedule(schedule, people, self.shift_table, {day: 1 for day in DAY_NAMES}, 0,
+                                       {'intake': 1})
+        self.assertEqual({v['type'] for v in violations},
+                         {'unknown_day', 'unknown_person', 'unknown_shift', 'overlap', 'availability',
+                          'desk_capacity', 'desk_type', 'max_hours', 'weekly_variance'})
+        overlap = next(v for v in violations if v['type'] == 'overlap')
+        self.assertEqual((overlap['day'], overlap['person'], overlap['shifts']), (monday, "Anne", ['0930', '1030']))
+
+    def test_solved_schedule_round_trips(self):
+        engine = sample_engine(self.shift_table)
+        engine.solve({day: 3 for day in DAY_NAMES}, 50, 1.0, 270)
+        self.assertEqual(engine.validate(), [])
+
+        loaded = sample_engine(self.shift_table)
+        self.assertEqual(loaded.load_schedule(engine.to_dict()), [])
+        self.assertEqual(loaded.schedule, engine.schedule)
+        self.assertEqual(loaded.assigned_shifts, engine.assigned_shifts)
+        self.assertEqual(loaded.index.total, engine.index.total)
+
+
+def engine_state(engine):
+    """Everything a manual edit touches, copied"""
+    index = engine.index
+    return {
+        'schedule': copy.deepcopy(engine.schedule),
+        'assigned_shifts': list(engine.assigned_shifts),
+        'occupancy': [[sorted(people) for people in day] for day in engine.occupancy],
+        'total_hours': list(index.total_hours),
+        'week_hours': [list(hours) for hours in index.week_hours],
+        'day_hours': list(index.day_hours),
+        'shift_fill': [list(fill) for fill in index.shift_fill],
+        'summary': index.summary()
+    }
+
+
+class EditHistoryTest(unittest.TestCase):
+    def test_undo_then_redo_restores_each_state(self):
+        engine = sample_engine(ShiftTable.load())
+        engine.solve({day: 3 for day in DAY_NAMES}, 50, 1.0, 270)
+        day_count = len(DAY_NAMES)
+        states = [engine_state(engine)]
+
+        # Move some people's shifts to other days
+        rng = random.Random(43)
+        while len(states) < 10:
+            person_id = rng.randrange(len(engine.people))
+            from_day_idx, to_day_idx = rng.randrange(day_count), rng.randrange(day_count)
+            mask = engine.assigned_shifts[person_id * day_count + from_day_idx]
+            if not mask or from_day_idx == to_day_idx:
+                continue
+            engine.move_shifts(person_id, from_day_idx, mask, to_day_idx, mask)
+            states.append(engine_state(engine))
+
+        for state in reversed(states[:-1]):
+            self.assertIsNotNone(engine.undo())
+            self.assertEqual(engine_state(engine), state)
+        self.assertIsNone(engine.undo())
+
+        for state in states[1:]:
+            self.assertIsNotNone(engine.redo())
+            self.assertEqual(engine_state(engine), state)
+        self.assertIsNone(engine.redo())
+
+
+if __name__ == "__main__":
+    unittest.main()